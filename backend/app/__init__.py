@@ -1,8 +1,54 @@
 import logging
-from flask import Flask, abort, request
+import time
+from flask import Flask, Response, abort, g, request
 from flask_cors import CORS
 from app.config import get_config
-from app.extensions import limiter
+from app.extensions import (
+    generation_stats, inflight, jobs, limiter, llm_scheduler, metrics, micro_batcher, model_router, model_warmer,
+    ollama, ollama_health, parse_stats, profiler, response_cache, semantic_cache, task_store
+)
+from app.services import tracing
+
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+def _collect_component_metrics():
+    """Scheduler, cache, coalescing, batching, job, breaker and failover state for /api/metrics"""
+    scheduler = llm_scheduler.stats()
+    cache = response_cache.stats()
+    semantic = semantic_cache.stats()
+    coalescing = inflight.stats()
+    batching = micro_batcher.stats()
+    background = jobs.stats()
+    return {
+        ('taskmgr_scheduler_active', 'gauge', 'Generations holding a model slot'): scheduler['active'],
+        ('taskmgr_scheduler_queued', 'gauge', 'Requests waiting for a model slot'): scheduler['queued'],
+        ('taskmgr_scheduler_shed_total', 'counter', 'Requests shed by the scheduler'): scheduler['shed'],
+        ('taskmgr_cache_hits_total', 'counter', 'Response cache hits (memory and disk)'):
+            cache['hits'] + cache['disk_hits'],
+        ('taskmgr_cache_misses_total', 'counter', 'Response cache misses'): cache['misses'],
+        ('taskmgr_cache_entries', 'gauge', 'Response cache entries in memory'): cache['entries'],
+        ('taskmgr_semantic_cache_hits_total', 'counter', 'Brainstorms served from a similar context'):
+            semantic['hits'],
+        ('taskmgr_semantic_cache_misses_total', 'counter', 'Semantic cache lookups without a close match'):
+            semantic['misses'],
+        ('taskmgr_semantic_cache_errors_total', 'counter', 'Failed context embeddings'): semantic['errors'],
+        ('taskmgr_jobs_pending', 'gauge', 'Background jobs waiting or running'): background['pending'],
+        ('taskmgr_jobs_rejected_total', 'counter', 'Background jobs refused while the pool was full'):
+            background['rejected'],
+        ('taskmgr_coalesced_total', 'counter', 'Requests served by an identical in-flight generation'):
+            coalescing['coalesced'],
+        ('taskmgr_microbatch_batches_total', 'counter', 'Brainstorm generations shared by several requests'):
+            batching['batches'],
+        ('taskmgr_microbatch_requests_total', 'counter', 'Brainstorm requests answered by a shared generation'):
+            batching['batched'] - batching['fallbacks'],
+        ('taskmgr_microbatch_fallbacks_total', 'counter', 'Batched brainstorms generated alone after all'):
+            batching['fallbacks'],
+        ('taskmgr_ollama_circuit_state', 'gauge', 'Best Ollama backend circuit (0 closed, 1 half-open, 2 open)'):
+            CIRCUIT_STATES.get(ollama.circuit_snapshot()['state'], 0),
+        ('taskmgr_ollama_failovers_total', 'counter', 'Generations retried on another Ollama backend'):
+            ollama.failovers
+    }
 
 
 def create_app():
@@ -14,10 +60,9 @@ def create_app():
     app.config.from_object(config)
 
     # Configure logging early to ensure all modules use the same logger
-    logging.basicConfig(
-        level=getattr(logging, app.config['LOG_LEVEL'].upper(), logging.INFO),
-        format='%(asctime)s %(levelname)s %(name)s: %(message)s'
-    )
+    logging.basicConfig(level=getattr(logging, app.config['LOG_LEVEL'].upper(), logging.INFO))
+    # Request IDs on every line, as JSON with LOG_FORMAT=json
+    tracing.configure(app)
     logger = logging.getLogger(__name__)
     logger.info("Starting Task Manager API", extra={"env": app.config.get('FLASK_ENV')})
 
@@ -26,7 +71,10 @@ def create_app():
         r"/api/*": {
             "origins": app.config['CORS_ORIGINS'],
             "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-            "allow_headers": ["Content-Type"]
+            "allow_headers": ["Content-Type", "Cache-Control", "If-Match", "If-None-Match", "Idempotency-Key",
+                              "X-Request-ID"],
+            "expose_headers": ["X-Cache", "X-Plan-Mode", "X-Plan-Update", "X-Model", "Retry-After", "ETag",
+                               "Location", "X-Request-ID"]
         }
     })
 
@@ -34,6 +82,31 @@ def create_app():
     limiter.default_limits = [app.config['DEFAULT_RATE_LIMIT']]
     limiter.init_app(app)
 
+    # Pooled Ollama client shared by every request in this process
+    ollama.init_app(app)
+    # Registers with the health monitor before its first probe
+    model_warmer.init_app(app)
+    ollama_health.init_app(app)
+    response_cache.init_app(app)
+    semantic_cache.init_app(app)
+    llm_scheduler.init_app(app)
+    model_router.init_app(app)
+    micro_batcher.init_app(app)
+    task_store.init_app(app)
+    jobs.init_app(app)
+    profiler.init_app(app)
+
+    # Registered first so every response, including a 401, has a request ID
+    @app.before_request
+    def start_trace():
+        route = request.url_rule.rule if request.url_rule else request.path
+        trace = tracing.begin(
+            f'{request.method} {route}', tracing.request_id_from(request.headers.get('X-Request-ID'))
+        )
+        mode = profiler.requested_mode(request.headers)
+        if mode:
+            g.profile = profiler.start(mode, trace)
+
     # Simple API key gate (optional via env)
     @app.before_request
     def require_api_key():
@@ -47,6 +120,45 @@ def create_app():
             if provided != required_key:
                 abort(401, description="Unauthorized")
 
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.request_duration.observe(time.perf_counter() - started, route, request.method)
+        metrics.responses.inc(route, str(response.status_code))
+        if response.status_code == 429:
+            metrics.rate_limited.inc(route)
+        elif response.status_code == 503:
+            metrics.unavailable.inc(route)
+        return response
+
+    @app.after_request
+    def finish_trace(response):
+        request_id = tracing.current_request_id()
+        if request_id:
+            response.headers['X-Request-ID'] = request_id
+        handle = g.pop('profile', None)
+        artifact = profiler.finish(handle) if handle else None
+        if artifact:
+            response.headers['X-Profile-Artifact'] = artifact
+        # Streams are traced up to their first byte, like request_duration
+        tracing.end(force_log=artifact is not None, status=response.status_code, profile=artifact)
+        return response
+
+    @app.teardown_request
+    def discard_trace(exc):
+        # Only does something when finish_trace did not run
+        handle = g.pop('profile', None)
+        if handle:
+            profiler.finish(handle)
+        tracing.end()
+
     @app.errorhandler(429)
     def handle_rate_limit(e):
         return {"error": "Too many requests, please slow down."}, 429
@@ -54,6 +166,10 @@ def create_app():
     # Register blueprints
     from app.routes.brainstorm import bp as brainstorm_bp
     app.register_blueprint(brainstorm_bp)
+    from app.routes.tasks import bp as tasks_bp
+    app.register_blueprint(tasks_bp)
+    from app.routes.jobs import bp as jobs_bp
+    app.register_blueprint(jobs_bp)
 
     # Health check endpoint
     @app.route('/')
@@ -66,19 +182,37 @@ def create_app():
 
     @app.route('/api/health')
     def api_health():
-        import requests
-        ollama_running = False
-        try:
-            response = requests.get(f"{app.config['OLLAMA_URL']}/api/tags", timeout=2)
-            ollama_running = response.status_code == 200
-        except:
-            pass
-
+        # Cached by the background monitor; never blocks on Ollama
+        health = ollama_health.snapshot()
         return {
             'status': 'healthy',
             'ollama_url': app.config.get('OLLAMA_URL'),
             'ollama_model': app.config.get('OLLAMA_MODEL'),
-            'ollama_running': ollama_running
+            'model_routing': model_router.stats(),
+            'ollama_running': health['running'],
+            'ollama_checked_at': health['checked_at'],
+            'ollama_latency_ms': health['latency_ms'],
+            'ollama_circuit': health['circuit']['state'],
+            'ollama_backends': ollama.backend_stats(),
+            'ollama_failovers': ollama.failovers,
+            'generation_latency': generation_stats.stats(),
+            'structured_output': ollama.schema_stats(),
+            'parsing': parse_stats.stats(),
+            'response_cache': response_cache.stats(),
+            'semantic_cache': semantic_cache.stats(),
+            'inflight': inflight.stats(),
+            'micro_batching': micro_batcher.stats(),
+            'scheduler': llm_scheduler.stats(),
+            'jobs': jobs.stats(),
+            'profiler': profiler.stats()
         }
 
+    metrics.add_collector(_collect_component_metrics)
+
+    @app.route('/api/metrics')
+    @limiter.exempt
+    def api_metrics():
+        """Prometheus text exposition of this process's metrics"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
     return app
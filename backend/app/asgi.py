@@ -0,0 +1,270 @@
+"""
+ASGI serving mode
+
+The AI routes are served natively async so a pending generation costs a
+coroutine instead of a worker thread; every other request (health,
+streaming variants, ?async=1 jobs, CORS preflight) is delegated to the
+regular Flask app.
+"""
+import asyncio
+import functools
+import json
+import logging
+import math
+import time
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from flask import request as flask_request
+from limits import parse_many
+from werkzeug.exceptions import BadRequest
+from app import create_app
+from app.extensions import limiter, metrics, rate_limit_key
+from app.services import tracing
+from app.routes.brainstorm import (
+    _estimate_brainstorm_tokens, _estimate_plan_tokens, _model_headers, _plan_headers, _token_cost,
+    _validate_brainstorm_payload, _validate_plan_mode, _validate_plan_payload, _validate_replan_payload
+)
+from app.services.ai_service import cache_mode_for
+from app.services.async_ai_service import AsyncAIService, async_ollama, off_loop
+from app.services.health import OllamaUnavailableError
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class _Request:
+    """Minimal view of an ASGI HTTP request"""
+
+    def __init__(self, scope, body):
+        self.scope = scope
+        self.path = scope['path']
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+        self.remote_addr = (scope.get('client') or ('127.0.0.1', 0))[0]
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode('latin-1')).items()}
+        # A plan's validated tasks, or the BadRequest to answer with,
+        # resolved once by AsyncAIApp._within_limits
+        self.plan_tasks = None
+        self.plan_error = None
+        try:
+            data = json.loads(body) if body else {}
+        except (ValueError, UnicodeDecodeError):
+            data = {}
+        self.json = data if isinstance(data, dict) else {}
+
+
+def _wants_job(scope):
+    query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+    return query.get('async', [''])[0].lower() in ('1', 'true')
+
+
+class AsyncAIApp:
+    """ASGI application wrapping the Flask app with async AI routes"""
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {
+            '/api/brainstorm': self.brainstorm,
+            '/api/generate-plan': self.generate_plan
+        }
+        self.token_estimates = {
+            '/api/brainstorm': _estimate_brainstorm_tokens,
+            '/api/generate-plan': _estimate_plan_tokens
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        handler = self.routes.get(scope.get('path'))
+        # Background jobs (?async=1) run on the Flask app's job pool
+        if scope['type'] == 'http' and scope['method'] == 'POST' and handler is not None and not _wants_job(scope):
+            return await self._dispatch(handler, scope, receive, send)
+        return await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await async_ollama.aclose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _dispatch(self, handler, scope, receive, send):
+        started = time.perf_counter()
+        # Each ASGI request runs in its own task, so the trace stays with it
+        header = dict(scope.get('headers', [])).get(b'x-request-id', b'').decode('latin-1')
+        tracing.begin(f"{scope['method']} {scope['path']}", tracing.request_id_from(header))
+        status = None
+        try:
+            status = await self._respond(handler, scope, receive, send)
+        finally:
+            tracing.end(status=status)
+        if status is None:
+            return
+        route = scope['path']
+        metrics.request_duration.observe(time.perf_counter() - started, route, scope['method'])
+        metrics.responses.inc(route, str(status))
+        if status == 429:
+            metrics.rate_limited.inc(route)
+        elif status == 503:
+            metrics.unavailable.inc(route)
+
+    async def _respond(self, handler, scope, receive, send):
+        """Run `handler` and send its response; returns the status sent"""
+        body = b''
+        more = True
+        while more:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body += message.get('body', b'')
+            more = message.get('more_body', False)
+            if len(body) > MAX_BODY_BYTES:
+                return await self._send(send, scope, 413, {'error': 'Payload too large'})
+
+        request = _Request(scope, body)
+        required_key = self.flask_app.config.get('API_KEY')
+        if required_key and request.headers.get('x-api-key') != required_key:
+            return await self._send(send, scope, 401, {'error': 'Unauthorized'})
+        # The limiter's storage and plan validation (which may read the task
+        # store) are blocking I/O
+        if not await off_loop(self._within_limits, request):
+            return await self._send(send, scope, 429, {'error': 'Too many requests, please slow down.'})
+
+        status, payload, headers = await handler(request)
+        return await self._send(send, scope, status, payload, headers)
+
+    def _within_limits(self, request):
+        """Same limits the Flask app applies: the AI route limit, then the token budget
+
+        Counters are filed under the Flask limiter's keys, so a client's
+        requests to either app draw on one allowance. A plan is validated
+        here, once, for both the token estimate and generate_plan.
+        """
+        config = self.flask_app.config
+        key, scope = self._limit_key(request)
+        for item in parse_many(config['AI_ROUTE_RATE_LIMIT']):
+            if not limiter.limiter.hit(item, key, scope):
+                return False
+        estimate = self.token_estimates[request.path]
+        if request.path == '/api/generate-plan':
+            # Reads the task store when the plan names tasks by id or filter
+            try:
+                request.plan_tasks = _validate_plan_payload(request.json, self._tenant(request))
+                estimate = functools.partial(_estimate_plan_tokens, tasks=request.plan_tasks)
+            except BadRequest as e:
+                request.plan_error = e
+        # Invalid payloads are left to the request-count limit, as in Flask
+        if config['AI_TOKEN_BUDGET'] and request.plan_error is None:
+            cost = _token_cost(estimate, request.json, request.args.get('mode'), config, self._tenant(request))
+            for item in parse_many(config['AI_TOKEN_BUDGET']) if cost else ():
+                # The scope of the Flask routes' shared_limit
+                if not limiter.limiter.hit(item, key, 'ai_tokens', cost=cost):
+                    return False
+        return True
+
+    def _limit_key(self, request):
+        """(key, scope) the Flask limiter counts this route's requests under:
+        its key function's value and the Flask endpoint"""
+        with self.flask_app.test_request_context(
+            request.path, method='POST', headers=request.headers, environ_base={'REMOTE_ADDR': request.remote_addr}
+        ):
+            return rate_limit_key(), flask_request.endpoint
+
+    async def brainstorm(self, request):
+        """Async POST /api/brainstorm (same contract as the Flask route)"""
+        try:
+            context, task_type = _validate_brainstorm_payload(request.json)
+            ai_service = AsyncAIService(tenant=self._tenant(request))
+            suggestions = await ai_service.generate_brainstorm(
+                context, task_type, cache_mode=cache_mode_for(request.headers.get('cache-control'))
+            )
+            headers = {'X-Cache': ai_service.cache_status or 'MISS'}
+            headers.update(_model_headers(ai_service))
+            return 200, {'suggestions': suggestions}, headers
+        except BadRequest as e:
+            return 400, {'error': str(e)}, {}
+        except OllamaUnavailableError as e:
+            return 503, {'error': str(e)}, {'Retry-After': str(math.ceil(e.retry_after))}
+        except ValueError as e:
+            logger.exception("ValueError in async brainstorm endpoint")
+            return 503, {'error': str(e)}, {}
+        except Exception:
+            logger.exception("Error in async brainstorm endpoint")
+            return 500, {'error': 'An error occurred while generating suggestions. Please try again.'}, {}
+
+    async def generate_plan(self, request):
+        """Async POST /api/generate-plan (same contract as the Flask route)"""
+        try:
+            if request.plan_error is not None:
+                raise request.plan_error
+            tasks = request.plan_tasks
+            tenant = self._tenant(request)
+            replan = _validate_replan_payload(request.json)
+            mode = _validate_plan_mode(request.json, request.args.get('mode'))
+            config = self.flask_app.config
+            ai_service = AsyncAIService(
+                tenant=tenant,
+                latency_budget=config['PLAN_LATENCY_BUDGET'],
+                prompt_budget=config['PLAN_PROMPT_TOKEN_BUDGET'],
+                chunk_size=config['PLAN_CHUNK_SIZE'],
+                replan_max_changes=config['REPLAN_MAX_CHANGES'],
+                replan_max_ratio=config['REPLAN_MAX_CHANGE_RATIO']
+            )
+            cache_mode = cache_mode_for(request.headers.get('cache-control'))
+            if replan:
+                plan = await ai_service.replan_daily_plan(tasks, *replan, cache_mode=cache_mode, mode=mode)
+            else:
+                plan = await ai_service.generate_daily_plan(tasks, cache_mode=cache_mode, mode=mode)
+            return 200, plan, _plan_headers(ai_service)
+        except BadRequest as e:
+            return 400, {'error': str(e)}, {}
+        except OllamaUnavailableError as e:
+            return 503, {'error': str(e)}, {'Retry-After': str(math.ceil(e.retry_after))}
+        except ValueError as e:
+            logger.exception("ValueError in async generate-plan endpoint")
+            return 503, {'error': str(e)}, {}
+        except Exception:
+            logger.exception("Error in async generate-plan endpoint")
+            return 500, {'error': 'An error occurred while generating the daily plan. Please try again.'}, {}
+
+    @staticmethod
+    def _tenant(request):
+        return request.headers.get('x-api-key') or request.remote_addr
+
+    async def _send(self, send, scope, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        response_headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode('latin-1'))
+        ]
+        for name, value in (headers or {}).items():
+            response_headers.append((name.lower().encode('latin-1'), value.encode('latin-1')))
+        request_id = tracing.current_request_id()
+        if request_id:
+            response_headers.append((b'x-request-id', request_id.encode('latin-1')))
+        response_headers.extend(self._cors_headers(scope))
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        await send({'type': 'http.response.body', 'body': body})
+        return status
+
+    def _cors_headers(self, scope):
+        origin = None
+        for name, value in scope.get('headers', []):
+            if name.lower() == b'origin':
+                origin = value.decode('latin-1')
+        if not origin or origin not in self.flask_app.config['CORS_ORIGINS']:
+            return []
+        return [
+            (b'access-control-allow-origin', origin.encode('latin-1')),
+            (b'access-control-expose-headers', b'X-Cache, X-Plan-Mode, X-Plan-Update, X-Model, Retry-After, X-Request-ID'),
+            (b'vary', b'Origin')
+        ]
+
+
+def create_asgi_app():
+    """Build the Flask app and wrap it for ASGI servers (uvicorn asgi:app)"""
+    return AsyncAIApp(create_app())
@@ -12,6 +12,102 @@ class Config:
     # Ollama configuration
     OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434')
     OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'llama3.2:latest')
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', 5))
+    OLLAMA_READ_TIMEOUT = float(os.getenv('OLLAMA_READ_TIMEOUT', 30))
+    OLLAMA_PROBE_TIMEOUT = float(os.getenv('OLLAMA_PROBE_TIMEOUT', 2))
+    # Keep-alive pool shared by all requests in this process
+    OLLAMA_POOL_CONNECTIONS = int(os.getenv('OLLAMA_POOL_CONNECTIONS', 4))
+    OLLAMA_POOL_MAXSIZE = int(os.getenv('OLLAMA_POOL_MAXSIZE', 16))
+    # Constrain generations to JSON Schemas via Ollama's `format` (Ollama >= 0.5);
+    # models that reject it fall back to prompt-only JSON automatically
+    OLLAMA_STRUCTURED_OUTPUT = os.getenv('OLLAMA_STRUCTURED_OUTPUT', 'True').lower() == 'true'
+    # How long Ollama keeps the model loaded after each call ('30m', seconds,
+    # or a negative value to pin it); empty uses Ollama's 5 minute default
+    OLLAMA_KEEP_ALIVE = os.getenv('OLLAMA_KEEP_ALIVE', '30m')
+    # Load the model at startup and whenever Ollama comes back up
+    OLLAMA_WARMUP = os.getenv('OLLAMA_WARMUP', 'True').lower() == 'true'
+    # Background health probing and circuit breaker
+    OLLAMA_HEALTH_MONITOR = os.getenv('OLLAMA_HEALTH_MONITOR', 'True').lower() == 'true'
+    OLLAMA_HEALTH_INTERVAL = float(os.getenv('OLLAMA_HEALTH_INTERVAL', 10))
+    OLLAMA_BREAKER_FAILURES = int(os.getenv('OLLAMA_BREAKER_FAILURES', 3))
+    OLLAMA_BREAKER_RESET = float(os.getenv('OLLAMA_BREAKER_RESET', 30))
+
+    # LLM scheduler: concurrent generations (match Ollama's OLLAMA_NUM_PARALLEL),
+    # queue bound, and the longest estimated wait accepted before shedding
+    LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 2))
+    LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', 32))
+    LLM_MAX_QUEUE_WAIT = float(os.getenv('LLM_MAX_QUEUE_WAIT', 20))
+
+    # Model tiers, largest first (name=model,...; empty = OLLAMA_MODEL for
+    # everything) and routing rules operation[:max_tokens]=tier, first match
+    # wins, e.g. brainstorm:1500=small,enrich=small,*=large
+    MODEL_TIERS = os.getenv('MODEL_TIERS', '')
+    MODEL_ROUTES = os.getenv('MODEL_ROUTES', '')
+    # Adaptive downgrade: skip a tier whose p95 generation seconds over the
+    # last MODEL_SLO_WINDOW seconds exceed MODEL_SLO_P95, and go one tier
+    # down while MODEL_SLO_QUEUE requests are queued (0 disables either)
+    MODEL_SLO_P95 = float(os.getenv('MODEL_SLO_P95', 0))
+    MODEL_SLO_QUEUE = int(os.getenv('MODEL_SLO_QUEUE', 0))
+    MODEL_SLO_WINDOW = float(os.getenv('MODEL_SLO_WINDOW', 300))
+
+    # Expected LLM latency (queue wait + generation, seconds) above which
+    # mode=auto plans are produced by the deterministic planner instead
+    PLAN_LATENCY_BUDGET = float(os.getenv('PLAN_LATENCY_BUDGET', 30))
+
+    # Estimated prompt tokens allowed for the plan's task list (lowest-ranked
+    # tasks are left out beyond it) and tasks per concurrently planned chunk
+    PLAN_PROMPT_TOKEN_BUDGET = int(os.getenv('PLAN_PROMPT_TOKEN_BUDGET', 1500))
+    PLAN_CHUNK_SIZE = int(os.getenv('PLAN_CHUNK_SIZE', 6))
+
+    # Re-plans with previousPlan: diffs larger than this many tasks, or than
+    # this share of the previous plan's entries, are planned from scratch
+    REPLAN_MAX_CHANGES = int(os.getenv('REPLAN_MAX_CHANGES', 5))
+    REPLAN_MAX_CHANGE_RATIO = float(os.getenv('REPLAN_MAX_CHANGE_RATIO', 0.5))
+
+    # Batch brainstorm: items per request and how many run at once
+    BRAINSTORM_BATCH_MAX_ITEMS = int(os.getenv('BRAINSTORM_BATCH_MAX_ITEMS', 10))
+    BRAINSTORM_BATCH_PARALLELISM = int(os.getenv('BRAINSTORM_BATCH_PARALLELISM', 4))
+
+    # Micro-batching: brainstorms for the same model arriving within the
+    # window (up to MAX_SIZE of them) share one generation
+    MICROBATCH_ENABLED = os.getenv('MICROBATCH_ENABLED', 'False').lower() == 'true'
+    MICROBATCH_WINDOW_MS = float(os.getenv('MICROBATCH_WINDOW_MS', 10))
+    MICROBATCH_MAX_SIZE = int(os.getenv('MICROBATCH_MAX_SIZE', 4))
+
+    # Response cache (set RESPONSE_CACHE_PATH to add a shared SQLite tier)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() == 'true'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 256))
+    RESPONSE_CACHE_TTL_BRAINSTORM = int(os.getenv('RESPONSE_CACHE_TTL_BRAINSTORM', 3600))
+    RESPONSE_CACHE_TTL_PLAN = int(os.getenv('RESPONSE_CACHE_TTL_PLAN', 600))
+    RESPONSE_CACHE_PATH = os.getenv('RESPONSE_CACHE_PATH', '')
+    RESPONSE_CACHE_DISK_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_DISK_MAX_ENTRIES', 5000))
+
+    # Brainstorm semantic cache (needs numpy): contexts embedded with
+    # SEMANTIC_CACHE_MODEL reuse suggestions of one at least THRESHOLD
+    # cosine-similar; MAX_ENTRIES per task type, entries live as long as
+    # RESPONSE_CACHE_TTL_BRAINSTORM, TIMEOUT caps the embedding call
+    SEMANTIC_CACHE_ENABLED = os.getenv('SEMANTIC_CACHE_ENABLED', 'False').lower() == 'true'
+    SEMANTIC_CACHE_MODEL = os.getenv('SEMANTIC_CACHE_MODEL', 'nomic-embed-text')
+    SEMANTIC_CACHE_THRESHOLD = float(os.getenv('SEMANTIC_CACHE_THRESHOLD', 0.92))
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv('SEMANTIC_CACHE_MAX_ENTRIES', 256))
+    SEMANTIC_CACHE_TIMEOUT = float(os.getenv('SEMANTIC_CACHE_TIMEOUT', 2))
+
+    # Server-side task store: SQLite file, page size for delta sync (also
+    # the most changes accepted per sync), and how long deletions are kept
+    # for clients that have not synced since
+    TASK_STORE_PATH = os.getenv('TASK_STORE_PATH', 'tasks.db')
+    TASK_SYNC_PAGE_SIZE = int(os.getenv('TASK_SYNC_PAGE_SIZE', 500))
+    TASK_TOMBSTONE_TTL = int(os.getenv('TASK_TOMBSTONE_TTL', 30 * 86400))
+
+    # Background AI jobs (?async=1): SQLite file shared by the workers, jobs
+    # waiting or running per process (0 = LLM_MAX_CONCURRENCY +
+    # LLM_MAX_QUEUE), seconds results are kept, seconds after which an
+    # unfinished job counts as lost, and the polling limit per client
+    JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', 'jobs.db')
+    JOB_MAX_PENDING = int(os.getenv('JOB_MAX_PENDING', 0))
+    JOB_RESULT_TTL = int(os.getenv('JOB_RESULT_TTL', 600))
+    JOB_TIMEOUT = int(os.getenv('JOB_TIMEOUT', 300))
+    JOB_POLL_RATE_LIMIT = os.getenv('JOB_POLL_RATE_LIMIT', '300/minute')
 
     # CORS settings
     CORS_ORIGINS = [origin.strip() for origin in os.getenv('CORS_ORIGINS', 'http://localhost:4000,http://localhost:4002').split(',') if origin.strip()] or ['http://localhost:4000', 'http://localhost:4002']
@@ -19,21 +115,57 @@ class Config:
     # Rate limiting
     DEFAULT_RATE_LIMIT = os.getenv('DEFAULT_RATE_LIMIT', '60/minute')
     AI_ROUTE_RATE_LIMIT = os.getenv('AI_ROUTE_RATE_LIMIT', '20/hour')
+    # Per-client budget of estimated prompt + output tokens across all AI
+    # routes, so large plans use up more quota than short brainstorms;
+    # empty disables it
+    AI_TOKEN_BUDGET = os.getenv('AI_TOKEN_BUDGET', '100000/hour')
+    # Counter storage read by flask-limiter. memory:// is per process;
+    # sqlite:///path/to/file.db shares limits between worker processes
+    RATELIMIT_STORAGE_URI = os.getenv('RATE_LIMIT_STORAGE_URI', 'memory://')
 
-    # Logging
+    # Logging: text lines, or one JSON object per line (LOG_FORMAT=json);
+    # both carry the request ID
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+
+    # Trace spans per request, logged as JSON for requests (and background
+    # jobs, slow probe rounds) taking at least TRACE_LOG_THRESHOLD_MS;
+    # 0 logs every one
+    TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'True').lower() == 'true'
+    TRACE_LOG_THRESHOLD_MS = float(os.getenv('TRACE_LOG_THRESHOLD_MS', 1000))
+
+    # Per-request profiling, off by default. With PROFILE_KEY set, requests
+    # sending X-Profile: sample|pstats and X-Profile-Key: <key> are profiled;
+    # PROFILE_SAMPLE_RATE profiles that share of all requests in PROFILE_MODE.
+    # Artifacts go to PROFILE_DIR; the sampler reads stacks every
+    # PROFILE_INTERVAL_MS
+    PROFILE_KEY = os.getenv('PROFILE_KEY', '')
+    PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_MODE = os.getenv('PROFILE_MODE', 'sample')
+    PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+    PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', 5))
+
+    # Production server (FLASK_ENV=production); gunicorn.conf.py reads the
+    # same variables. SERVER_THREADS=0 sizes threads from the LLM limits.
+    PORT = int(os.getenv('PORT', 4001))
+    SERVER_THREADS = int(os.getenv('SERVER_THREADS', 0))
+    # Seconds in-flight requests get to finish after SIGTERM
+    SERVER_GRACEFUL_TIMEOUT = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 90))
 
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     FLASK_ENV = 'development'
+    PRODUCTION_SERVER = False
 
 
 class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     FLASK_ENV = 'production'
+    # run.py serves through gunicorn (waitress on Windows), see app/server.py
+    PRODUCTION_SERVER = True
 
 
 # Configuration dictionary
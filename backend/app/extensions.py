@@ -1,9 +1,73 @@
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from app.services.health import OllamaHealthMonitor
+from app.services.generation_stats import GenerationStats
+from app.services.jobs import JobStore
+from app.services.micro_batch import MicroBatcher
+from app.services.model_router import ModelRouter
+# Prometheus-style metrics; the registry lives in its module so the
+# scheduler and health monitor below can record into it as well
+from app.services.metrics import metrics
+from app.services.ollama_client import OllamaClient
+from app.services.parse_stats import ParseStats
+from app.services.profiling import Profiler
+# Registers the sqlite:// scheme used by RATE_LIMIT_STORAGE_URI
+from app.services.rate_limit_storage import SQLiteStorage  # noqa: F401
+from app.services.response_cache import ResponseCache
+from app.services.scheduler import LLMScheduler
+from app.services.semantic_cache import SemanticCache
+from app.services.singleflight import SingleFlight
+from app.services.task_store import TaskStore
+from app.services.warmup import ModelWarmer
 
-# Shared extensions (init in app factory)
+# Rate-limit key; the ASGI app keys its limits with it too
+rate_limit_key = get_remote_address
+
+# Shared extensions (init in app factory); storage comes from
+# RATELIMIT_STORAGE_URI
 limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=[],
-    storage_uri="memory://"
+    key_func=rate_limit_key,
+    default_limits=[]
 )
+
+# Process-wide pooled Ollama client
+ollama = OllamaClient()
+
+# Background prober caching Ollama's health for /api/health and the breaker
+ollama_health = OllamaHealthMonitor(ollama)
+
+# Cold vs warm generation latency
+generation_stats = GenerationStats()
+
+# Loads the model at startup and after Ollama restarts
+model_warmer = ModelWarmer(ollama, ollama_health, generation_stats)
+
+# LRU+TTL cache of generated brainstorm/plan results
+response_cache = ResponseCache()
+
+# Brainstorm results looked up by embedding similarity
+semantic_cache = SemanticCache()
+
+# Coalesces identical in-flight generations
+inflight = SingleFlight()
+
+# Admission control and fair queuing in front of Ollama
+llm_scheduler = LLMScheduler()
+
+# Model tier per generation, downgraded when the latency or queue SLO is missed
+model_router = ModelRouter(llm_scheduler)
+
+# Groups brainstorms queued behind busy model slots into shared generations
+micro_batcher = MicroBatcher(llm_scheduler)
+
+# Parse failure and retry counters for model output
+parse_stats = ParseStats()
+
+# SQLite-backed tasks with versioned delta sync
+task_store = TaskStore()
+
+# Background AI jobs for ?async=1, shared by worker processes through SQLite
+jobs = JobStore()
+
+# Opt-in per-request profiles (PROFILE_KEY / PROFILE_SAMPLE_RATE)
+profiler = Profiler()
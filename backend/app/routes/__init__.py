@@ -1 +1,11 @@
 # Routes package
+from flask import request
+from flask_limiter.util import get_remote_address
+
+
+def request_tenant():
+    """Identity of the caller: its API key, or its address without one
+
+    Used for fair queuing in the LLM scheduler and to scope stored jobs.
+    """
+    return request.headers.get('X-API-Key') or get_remote_address()
@@ -1,15 +1,29 @@
+import json
 import logging
-from flask import Blueprint, request, jsonify, current_app
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import Blueprint, Response, request, jsonify, current_app, g, stream_with_context, url_for
 from werkzeug.exceptions import BadRequest
-from app.services.ai_service import AIService
-from app.extensions import limiter
+from app.routes import request_tenant
+from app.routes.jobs import POLL_INTERVAL
+from app.services import tracing
+from app.services.ai_service import AIService, PLAN_AUTO, PLAN_MODES, cache_mode_for
+from app.services.health import OllamaUnavailableError
+from app.services.jobs import (
+    MAX_IDEMPOTENCY_KEY_LENGTH, IdempotencyConflictError, JobQueueFullError, request_fingerprint
+)
+from app.services.task_store import parse_filter
+from app.extensions import jobs, limiter, metrics, task_store
 
 bp = Blueprint('brainstorm', __name__, url_prefix='/api')
 
+MAX_PLAN_TASKS = 200
+
 
 logger = logging.getLogger(__name__)
 
 
+@metrics.timed_stage('brainstorm', 'validation')
 def _validate_brainstorm_payload(data: dict):
     if not data or 'context' not in data:
         raise BadRequest('Missing required field: context')
@@ -31,32 +45,306 @@ def _validate_brainstorm_payload(data: dict):
     return context, task_type
 
 
-def _validate_plan_payload(data: dict):
-    if not data or 'tasks' not in data:
-        raise BadRequest('Missing required field: tasks')
+@metrics.timed_stage('plan', 'validation')
+def _validate_plan_payload(data: dict, tenant):
+    if not data or not any(field in data for field in ('tasks', 'taskIds', 'filter')):
+        raise BadRequest('Missing required field: tasks, taskIds or filter')
+
+    if 'tasks' in data:
+        tasks = data.get('tasks', [])
+        if not isinstance(tasks, list):
+            raise BadRequest('Tasks must be an array')
+        if len(tasks) > MAX_PLAN_TASKS:
+            raise BadRequest(f'Too many tasks in payload (max {MAX_PLAN_TASKS})')
+    else:
+        tasks = _stored_plan_tasks(data, tenant)
+
+    return [_sanitize_plan_task(task) for task in tasks if isinstance(task, dict)]
+
+
+def _sanitize_plan_task(task: dict):
+    return {
+        'id': task.get('id'),
+        'title': str(task.get('title', 'Untitled'))[:120],
+        'priority': task.get('priority', 'medium'),
+        'dueDate': task.get('dueDate'),
+        'category': task.get('category')
+    }
+
+
+def _validate_replan_payload(data: dict):
+    """(previousPlan, changes) for an incremental re-plan, or None
+
+    `changes.added` holds new or edited tasks (same fields as `tasks`);
+    `changes.removed` holds titles (or task objects) whose entries go.
+    """
+    previous_plan = (data or {}).get('previousPlan')
+    if previous_plan is None:
+        return None
+    if not isinstance(previous_plan, dict) or not isinstance(previous_plan.get('tasks'), list):
+        raise BadRequest('previousPlan must be a plan object')
+    if len(previous_plan['tasks']) > MAX_PLAN_TASKS:
+        raise BadRequest(f'Too many tasks in previousPlan (max {MAX_PLAN_TASKS})')
+
+    changes = data.get('changes') or {}
+    if not isinstance(changes, dict):
+        raise BadRequest('changes must be an object')
+    added = changes.get('added', [])
+    removed = changes.get('removed', [])
+    if not isinstance(added, list) or not isinstance(removed, list):
+        raise BadRequest('changes.added and changes.removed must be arrays')
+    if len(added) + len(removed) > MAX_PLAN_TASKS:
+        raise BadRequest(f'Too many changes (max {MAX_PLAN_TASKS})')
+    return previous_plan, {
+        'added': [_sanitize_plan_task(task) for task in added if isinstance(task, dict)],
+        'removed': [str(item.get('title', '') if isinstance(item, dict) else item)[:120] for item in removed]
+    }
+
+
+def _stored_plan_tasks(data: dict, tenant):
+    """The tenant's tasks for a plan, named by id and/or filter, from the task store
+
+    A filter selects at most MAX_PLAN_TASKS tasks, nearest due date first.
+    """
+    task_ids = data.get('taskIds')
+    if task_ids is not None:
+        if not isinstance(task_ids, list):
+            raise BadRequest('taskIds must be an array')
+        if len(task_ids) > MAX_PLAN_TASKS:
+            raise BadRequest(f'Too many taskIds (max {MAX_PLAN_TASKS})')
+    try:
+        filters = parse_filter(data['filter']) if data.get('filter') is not None else None
+        return task_store.select(tenant, task_ids=task_ids, filters=filters, limit=MAX_PLAN_TASKS)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+def _validate_plan_mode(data: dict, query_mode=None):
+    mode = query_mode or (data or {}).get('mode') or PLAN_AUTO
+    if mode not in PLAN_MODES:
+        raise BadRequest('Invalid mode (expected auto, fast, llm or enrich)')
+    return mode
+
+
+@metrics.timed_stage('batch', 'validation')
+def _validate_batch_payload(data: dict):
+    if not data or 'items' not in data:
+        raise BadRequest('Missing required field: items')
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise BadRequest('Items must be a non-empty array')
+    max_items = current_app.config['BRAINSTORM_BATCH_MAX_ITEMS']
+    if len(items) > max_items:
+        raise BadRequest(f'Too many items in batch (max {max_items})')
+    return items
+
+
+def _cache_mode():
+    """Response cache mode requested via the Cache-Control header"""
+    return cache_mode_for(request.headers.get('Cache-Control'))
+
+
+def _plan_service():
+    config = current_app.config
+    return AIService(
+        tenant=request_tenant(),
+        latency_budget=config['PLAN_LATENCY_BUDGET'],
+        prompt_budget=config['PLAN_PROMPT_TOKEN_BUDGET'],
+        chunk_size=config['PLAN_CHUNK_SIZE'],
+        replan_max_changes=config['REPLAN_MAX_CHANGES'],
+        replan_max_ratio=config['REPLAN_MAX_CHANGE_RATIO']
+    )
+
+
+def _model_headers(ai_service):
+    """X-Model: the model(s) the response came from; absent when none did"""
+    models = list(dict.fromkeys(ai_service.models))
+    return {'X-Model': ', '.join(models)} if models else {}
+
+
+def _plan_headers(ai_service):
+    headers = {
+        'X-Cache': ai_service.cache_status or 'MISS',
+        'X-Plan-Mode': ai_service.plan_mode or 'fast'
+    }
+    if ai_service.plan_update:
+        headers['X-Plan-Update'] = ai_service.plan_update
+    headers.update(_model_headers(ai_service))
+    return headers
 
-    tasks = data.get('tasks', [])
-    if not isinstance(tasks, list):
-        raise BadRequest('Tasks must be an array')
-    if len(tasks) > 200:
-        raise BadRequest('Too many tasks in payload (max 200)')
 
-    sanitized = []
-    for task in tasks:
-        if not isinstance(task, dict):
+def _unavailable(e):
+    """503 with Retry-After while Ollama is down or the scheduler sheds load"""
+    response = jsonify({'error': str(e)})
+    response.headers['Retry-After'] = str(math.ceil(e.retry_after))
+    return response, 503
+
+
+def _async_requested():
+    return request.args.get('async', '').lower() in ('1', 'true')
+
+
+def _job_outcome(run, label, error_message):
+    """Run a background job's AI call, mapping errors as the routes do"""
+    try:
+        return run()
+    except OllamaUnavailableError as e:
+        return 503, {'error': str(e)}, {'Retry-After': str(math.ceil(e.retry_after))}
+    except ValueError as e:
+        logger.exception("ValueError in %s job", label)
+        return 503, {'error': str(e)}, {}
+    except Exception:
+        logger.exception("Error in %s job", label)
+        return 500, {'error': error_message}, {}
+
+
+def _submit_job(kind, run, error_message):
+    """202 with a background job for `run`, which returns (status, body, headers)
+
+    A reused Idempotency-Key returns its existing job instead, unless the
+    request differs (422).
+    """
+    key = request.headers.get('Idempotency-Key') or None
+    if key is not None and len(key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise BadRequest(f'Idempotency-Key is too long ({MAX_IDEMPOTENCY_KEY_LENGTH} char max)')
+    fingerprint = request_fingerprint(
+        request.path,
+        sorted((name, value) for name, value in request.args.items() if name != 'async'),
+        request.headers.get('Cache-Control'),
+        request.get_json(silent=True)
+    )
+    try:
+        job, _ = jobs.submit(kind, request_tenant(), lambda: _job_outcome(run, kind, error_message), key, fingerprint)
+    except IdempotencyConflictError as e:
+        return jsonify({'error': str(e)}), 422
+    except JobQueueFullError as e:
+        return _unavailable(e)
+    return jsonify(job), 202, {
+        'Location': url_for('jobs.get_job', job_id=job['id']),
+        'Retry-After': str(POLL_INTERVAL)
+    }
+
+
+# Token estimators take (payload, ?mode= value, app config, tenant) so the
+# ASGI app can charge the same costs outside a Flask request. They call the
+# undecorated validators: estimating is not a request's validation stage.
+
+def _estimate_brainstorm_tokens(data, query_mode, config, tenant):
+    context, task_type = _validate_brainstorm_payload.__wrapped__(data)
+    return AIService().estimate_brainstorm_tokens(context, task_type)
+
+
+def _estimate_plan_tokens(data, query_mode, config, tenant, tasks=None):
+    """`tasks` are the plan's already validated tasks, if the caller has them"""
+    if tasks is None:
+        tasks = _validate_plan_payload.__wrapped__(data, tenant)
+    replan = _validate_replan_payload(data)
+    mode = _validate_plan_mode(data, query_mode)
+    ai_service = AIService(
+        prompt_budget=config['PLAN_PROMPT_TOKEN_BUDGET'],
+        chunk_size=config['PLAN_CHUNK_SIZE'],
+        replan_max_changes=config['REPLAN_MAX_CHANGES'],
+        replan_max_ratio=config['REPLAN_MAX_CHANGE_RATIO']
+    )
+    if replan:
+        return ai_service.estimate_replan_tokens(tasks, *replan, mode=mode)
+    return ai_service.estimate_plan_tokens(tasks, mode)
+
+
+def _estimate_batch_tokens(data, query_mode, config, tenant):
+    total = 0
+    for item in _validate_batch_payload.__wrapped__(data):
+        try:
+            total += _estimate_brainstorm_tokens(item if isinstance(item, dict) else {}, query_mode, config, tenant)
+        except BadRequest:
             continue
-        sanitized.append({
-            'id': task.get('id'),
-            'title': str(task.get('title', 'Untitled'))[:120],
-            'priority': task.get('priority', 'medium'),
-            'dueDate': task.get('dueDate'),
-            'category': task.get('category')
-        })
-    return sanitized
+    return total
+
+
+def _token_cost(estimate, data, query_mode, config, tenant):
+    """Tokens to charge against AI_TOKEN_BUDGET; 0 for invalid payloads
+
+    Invalid requests are rejected before reaching the model, so they are
+    left to the request-count limit.
+    """
+    try:
+        return estimate(data or {}, query_mode, config, tenant)
+    except BadRequest:
+        return 0
+
+
+def _token_budget(estimate):
+    """Charge the request's estimated tokens to the client's AI_TOKEN_BUDGET
+
+    The budget is shared by every AI route. Requests costing nothing
+    (fast plans, invalid payloads) are exempt, so they still go through
+    once the budget is spent.
+    """
+    def cost():
+        if 'token_cost' not in g:
+            g.token_cost = _token_cost(
+                estimate, request.get_json(silent=True), request.args.get('mode'), current_app.config,
+                request_tenant()
+            )
+        return g.token_cost
+
+    return limiter.shared_limit(
+        lambda: current_app.config['AI_TOKEN_BUDGET'],
+        scope='ai_tokens',
+        cost=cost,
+        exempt_when=lambda: not current_app.config['AI_TOKEN_BUDGET'] or cost() == 0
+    )
+
+
+def _brainstorm_item(index, item, tenant, cache_mode):
+    """Run one batch item; failures are reported in the result, never raised"""
+    try:
+        context, task_type = _validate_brainstorm_payload(item if isinstance(item, dict) else {})
+        ai_service = AIService(tenant=tenant)
+        suggestions = ai_service.generate_brainstorm(context, task_type, cache_mode=cache_mode)
+        return {'index': index, 'status': 200, 'suggestions': suggestions, 'cache': ai_service.cache_status,
+                'model': _model_headers(ai_service).get('X-Model')}
+    except BadRequest as e:
+        return {'index': index, 'status': 400, 'error': str(e)}
+    except OllamaUnavailableError as e:
+        return {'index': index, 'status': 503, 'error': str(e), 'retryAfter': math.ceil(e.retry_after)}
+    except ValueError as e:
+        logger.exception("ValueError in brainstorm batch item")
+        return {'index': index, 'status': 503, 'error': str(e)}
+    except Exception:
+        logger.exception("Error in brainstorm batch item")
+        return {'index': index, 'status': 500, 'error': 'An error occurred while generating suggestions. Please try again.'}
+
+
+def _sse(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _sse_response(events, label, cache_status=None):
+    """Wrap an iterator of (event, data) pairs in a streaming SSE response"""
+    def generate():
+        try:
+            for event, data in events:
+                yield _sse(event, data)
+        except ValueError as e:
+            logger.exception("ValueError in %s stream", label)
+            yield _sse('error', {'error': str(e)})
+        except Exception:
+            logger.exception("Error in %s stream", label)
+            yield _sse('error', {'error': 'An error occurred while streaming. Please try again.'})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'X-Cache': cache_status or 'MISS'}
+    )
 
 
 @bp.route('/brainstorm', methods=['POST'])
 @limiter.limit(lambda: current_app.config['AI_ROUTE_RATE_LIMIT'])
+@_token_budget(_estimate_brainstorm_tokens)
 def brainstorm():
     """
     Generate AI-powered task suggestions
@@ -77,21 +365,34 @@ def brainstorm():
             }
         ]
     }
+
+    With ?async=1 the response is 202 with a job to poll at
+    /api/jobs/<id> (see the Location header). Send an Idempotency-Key to
+    make retried submissions return the same job.
     """
     try:
         data = request.get_json(silent=True) or {}
         context, task_type = _validate_brainstorm_payload(data)
 
         # Generate suggestions using AI service (Ollama)
-        ai_service = AIService()
-        suggestions = ai_service.generate_brainstorm(context, task_type)
+        ai_service = AIService(tenant=request_tenant())
+        cache_mode = _cache_mode()
 
-        return jsonify({
-            'suggestions': suggestions
-        }), 200
+        def run():
+            suggestions = ai_service.generate_brainstorm(context, task_type, cache_mode=cache_mode)
+            headers = {'X-Cache': ai_service.cache_status or 'MISS'}
+            headers.update(_model_headers(ai_service))
+            return 200, {'suggestions': suggestions}, headers
+
+        if _async_requested():
+            return _submit_job('brainstorm', run, 'An error occurred while generating suggestions. Please try again.')
+        status, body, headers = run()
+        return jsonify(body), status, headers
 
     except BadRequest as e:
         return jsonify({'error': str(e)}), 400
+    except OllamaUnavailableError as e:
+        return _unavailable(e)
     except ValueError as e:
         logger.exception("ValueError in brainstorm endpoint")
         return jsonify({
@@ -107,6 +408,7 @@ def brainstorm():
 
 @bp.route('/generate-plan', methods=['POST'])
 @limiter.limit(lambda: current_app.config['AI_ROUTE_RATE_LIMIT'])
+@_token_budget(_estimate_plan_tokens)
 def generate_plan():
     """
     Generate an optimized daily plan from tasks
@@ -121,9 +423,27 @@ def generate_plan():
                 "dueDate": "2024-01-01",
                 "category": "Work"
             }
-        ]
+        ],
+        "mode": "auto|fast|llm|enrich"
     }
 
+    Instead of `tasks`, clients that sync with /api/tasks can send
+    `taskIds` and/or a `filter` (status, excludeStatus, category,
+    dueBefore, dueAfter) and the tasks are read from the task store.
+
+    `mode` (also accepted as ?mode=) defaults to auto: the LLM plans the day
+    and the deterministic planner answers instead when Ollama is down, fails
+    or is expected to exceed PLAN_LATENCY_BUDGET. X-Plan-Mode reports which
+    path produced the response.
+
+    To update an earlier plan, also send it as `previousPlan` with
+    `changes: {"added": [task, ...], "removed": ["Old title", ...]}` (an
+    edited task is removed under its old title and added). Entries of
+    unchanged tasks keep their slots and only the added tasks are
+    scheduled; a diff over REPLAN_MAX_CHANGES or REPLAN_MAX_CHANGE_RATIO of
+    the plan is planned from scratch. X-Plan-Update reports incremental or
+    full.
+
     Response JSON:
     {
         "suggestion": "Overall plan description",
@@ -135,19 +455,36 @@ def generate_plan():
             }
         ]
     }
+
+    ?async=1 and Idempotency-Key work as for /api/brainstorm.
     """
     try:
         data = request.get_json(silent=True) or {}
-        tasks = _validate_plan_payload(data)
+        tasks = _validate_plan_payload(data, request_tenant())
+        replan = _validate_replan_payload(data)
+        mode = _validate_plan_mode(data, request.args.get('mode'))
 
-        # Generate daily plan using AI service (Ollama)
-        ai_service = AIService()
-        plan = ai_service.generate_daily_plan(tasks)
+        # Generate daily plan using AI service (Ollama), or the local planner
+        ai_service = _plan_service()
+        cache_mode = _cache_mode()
 
-        return jsonify(plan), 200
+        def run():
+            if replan:
+                plan = ai_service.replan_daily_plan(tasks, *replan, cache_mode=cache_mode, mode=mode)
+            else:
+                plan = ai_service.generate_daily_plan(tasks, cache_mode=cache_mode, mode=mode)
+            return 200, plan, _plan_headers(ai_service)
+
+        if _async_requested():
+            return _submit_job('generate-plan', run,
+                               'An error occurred while generating the daily plan. Please try again.')
+        status, body, headers = run()
+        return jsonify(body), status, headers
 
     except BadRequest as e:
         return jsonify({'error': str(e)}), 400
+    except OllamaUnavailableError as e:
+        return _unavailable(e)
     except ValueError as e:
         logger.exception("ValueError in generate-plan endpoint")
         return jsonify({
@@ -159,3 +496,137 @@ def generate_plan():
         return jsonify({
             'error': 'An error occurred while generating the daily plan. Please try again.'
         }), 500
+
+
+@bp.route('/brainstorm/stream', methods=['POST'])
+@limiter.limit(lambda: current_app.config['AI_ROUTE_RATE_LIMIT'])
+@_token_budget(_estimate_brainstorm_tokens)
+def brainstorm_stream():
+    """
+    Stream AI-powered task suggestions as Server-Sent Events
+
+    Takes the same request JSON as /brainstorm. Emits one `suggestion`
+    event per task as soon as the model closes it, then a `done` event
+    with the total count. Failures after the stream has started are
+    reported as an `error` event.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        context, task_type = _validate_brainstorm_payload(data)
+
+        ai_service = AIService(tenant=request_tenant())
+        suggestions = ai_service.stream_brainstorm(context, task_type, cache_mode=_cache_mode())
+    except BadRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except OllamaUnavailableError as e:
+        return _unavailable(e)
+    except ValueError as e:
+        logger.exception("ValueError in brainstorm stream endpoint")
+        return jsonify({'error': str(e)}), 503
+
+    def events():
+        count = 0
+        for suggestion in suggestions:
+            count += 1
+            yield 'suggestion', suggestion
+        yield 'done', {'count': count}
+
+    response = _sse_response(events(), 'brainstorm', ai_service.cache_status)
+    response.call_on_close(ai_service.close)
+    response.headers.update(_model_headers(ai_service))
+    return response
+
+
+@bp.route('/generate-plan/stream', methods=['POST'])
+@limiter.limit(lambda: current_app.config['AI_ROUTE_RATE_LIMIT'])
+@_token_budget(_estimate_plan_tokens)
+def generate_plan_stream():
+    """
+    Stream a daily plan as Server-Sent Events
+
+    Takes the same request JSON as /generate-plan. Emits one `task` event
+    per scheduled task as soon as the model closes it, then a `done` event
+    carrying the overall `suggestion`. A re-plan (`previousPlan`) is
+    computed first and then sent as events.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        tasks = _validate_plan_payload(data, request_tenant())
+        replan = _validate_replan_payload(data)
+        mode = _validate_plan_mode(data, request.args.get('mode'))
+
+        ai_service = _plan_service()
+        if replan:
+            events = ai_service.stream_replan_daily_plan(tasks, *replan, cache_mode=_cache_mode(), mode=mode)
+        else:
+            events = ai_service.stream_daily_plan(tasks, cache_mode=_cache_mode(), mode=mode)
+    except BadRequest as e:
+        return jsonify({'error': str(e)}), 400
+    except OllamaUnavailableError as e:
+        return _unavailable(e)
+    except ValueError as e:
+        logger.exception("ValueError in generate-plan stream endpoint")
+        return jsonify({'error': str(e)}), 503
+
+    response = _sse_response(events, 'generate-plan', ai_service.cache_status)
+    response.call_on_close(ai_service.close)
+    response.headers['X-Plan-Mode'] = ai_service.plan_mode or 'fast'
+    if ai_service.plan_update:
+        response.headers['X-Plan-Update'] = ai_service.plan_update
+    response.headers.update(_model_headers(ai_service))
+    return response
+
+
+@bp.route('/brainstorm/batch', methods=['POST'])
+@limiter.limit(lambda: current_app.config['AI_ROUTE_RATE_LIMIT'])
+@_token_budget(_estimate_batch_tokens)
+def brainstorm_batch():
+    """
+    Brainstorm several contexts in one call
+
+    Request JSON:
+    {
+        "items": [
+            {"context": "User's goal or context", "taskType": "general"}
+        ],
+        "stream": false
+    }
+
+    Items run concurrently (up to BRAINSTORM_BATCH_PARALLELISM at a time).
+    Each result carries its `index`, a per-item `status` and either
+    `suggestions` or `error`, so one failing item does not fail the batch.
+    With "stream": true (or ?stream=1) results are sent as `result`
+    Server-Sent Events in completion order, followed by `done`.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        items = _validate_batch_payload(data)
+    except BadRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+    cache_mode = _cache_mode()
+    tenant = request_tenant()
+    stream = data.get('stream') is True or request.args.get('stream') == '1'
+    workers = min(current_app.config['BRAINSTORM_BATCH_PARALLELISM'], len(items))
+    executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='brainstorm-batch')
+    futures = [
+        executor.submit(tracing.bind(_brainstorm_item), index, item, tenant, cache_mode)
+        for index, item in enumerate(items)
+    ]
+
+    if not stream:
+        try:
+            results = [future.result() for future in futures]
+        finally:
+            executor.shutdown(wait=False)
+        return jsonify({'results': results}), 200
+
+    def events():
+        try:
+            for future in as_completed(futures):
+                yield 'result', future.result()
+            yield 'done', {'count': len(futures)}
+        finally:
+            executor.shutdown(wait=False)
+
+    return _sse_response(events(), 'brainstorm-batch')
@@ -0,0 +1,39 @@
+from flask import Blueprint, jsonify, current_app
+from app.extensions import jobs, limiter
+from app.routes import request_tenant
+from app.services.jobs import QUEUED, RUNNING
+
+bp = Blueprint('jobs', __name__, url_prefix='/api')
+
+# Seconds clients are asked to wait between polls of an unfinished job
+POLL_INTERVAL = 1
+
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@limiter.limit(lambda: current_app.config['JOB_POLL_RATE_LIMIT'])
+def get_job(job_id):
+    """
+    Status and result of a job started with ?async=1
+
+    Response JSON:
+    {
+        "id": "3f2c...",
+        "kind": "brainstorm|generate-plan",
+        "status": "queued|running|succeeded|failed",
+        "statusCode": 200,
+        "result": {...},
+        "error": "...",
+        "headers": {"X-Cache": "MISS"}
+    }
+
+    `result` is the body the synchronous route would have returned and
+    `headers` its X-Cache/X-Plan-Mode headers; a failed job has `error`
+    and the status code instead. Unfinished jobs answer with Retry-After.
+    Unknown and expired jobs, and jobs another tenant (API key, or client
+    address without one) submitted, are 404.
+    """
+    job = jobs.get(job_id, request_tenant())
+    if job is None:
+        return jsonify({'error': 'Job not found or expired'}), 404
+    headers = {'Retry-After': str(POLL_INTERVAL)} if job['status'] in (QUEUED, RUNNING) else {}
+    return jsonify(job), 200, headers
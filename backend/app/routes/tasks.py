@@ -0,0 +1,210 @@
+import logging
+from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import BadRequest
+from app.extensions import task_store
+from app.routes import request_tenant
+from app.services.task_store import TaskConflictError, UnknownCursorError, parse_filter, task_key
+
+bp = Blueprint('tasks', __name__, url_prefix='/api')
+
+
+logger = logging.getLogger(__name__)
+
+
+def _etag(version):
+    return f'"{version}"'
+
+
+def _if_match_version(header):
+    """Version named by an If-Match header, or None when absent"""
+    value = (header or '').strip()
+    if not value or value == '*':
+        return None
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise BadRequest('If-Match must be a task ETag')
+
+
+def _int_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f'{name} must be an integer')
+    if number < 0:
+        raise BadRequest(f'{name} must not be negative')
+    return number
+
+
+def _query_filter():
+    raw = {key: request.args.getlist(key) for key in request.args if key not in ('since', 'limit')}
+    raw = {key: values if key in ('status', 'excludeStatus') else values[-1] for key, values in raw.items()}
+    try:
+        return parse_filter(raw)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+
+@bp.route('/tasks', methods=['GET'])
+def list_tasks():
+    """
+    List tasks, or the changes since a sync cursor
+
+    Query parameters:
+        since    - cursor from a previous response; only tasks written and
+                   ids deleted after it are returned
+        limit    - page size (capped at TASK_SYNC_PAGE_SIZE)
+        status, excludeStatus, category, dueBefore, dueAfter
+                 - filters for a plain listing (not combinable with since)
+
+    Response JSON:
+    {
+        "tasks": [{...}],
+        "deleted": [123],
+        "cursor": 42,
+        "hasMore": false,
+        "reset": false
+    }
+
+    Tasks are scoped to the caller's tenant (its API key, or its address
+    without one). The ETag is the tenant's version, so `If-None-Match`
+    answers 304 while none of its tasks has changed.
+    """
+    try:
+        since = _int_arg('since')
+        limit = _int_arg('limit')
+        filters = _query_filter()
+        if filters and since is not None:
+            raise BadRequest('Filters cannot be combined with since')
+
+        tenant = request_tenant()
+        if filters:
+            version = task_store.version(tenant)
+            if request.if_none_match.contains(str(version)):
+                return '', 304, {'ETag': _etag(version)}
+            tasks = task_store.select(tenant, filters=filters, limit=limit or current_app.config['TASK_SYNC_PAGE_SIZE'])
+            return jsonify({'tasks': tasks, 'version': version}), 200, {'ETag': _etag(version)}
+
+        result = task_store.changes(tenant, since, limit)
+        version = result.pop('version')
+        if request.if_none_match.contains(str(version)):
+            return '', 304, {'ETag': _etag(version)}
+        return jsonify(result), 200, {'ETag': _etag(version)}
+
+    except UnknownCursorError as e:
+        return jsonify({'error': str(e)}), 409
+    except BadRequest as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """Return one of the caller's tasks; its ETag is the task's version"""
+    found = task_store.get(request_tenant(), task_id)
+    if found is None:
+        return jsonify({'error': 'Task not found'}), 404
+    task, version = found
+    if request.if_none_match.contains(str(version)):
+        return '', 304, {'ETag': _etag(version)}
+    return jsonify(task), 200, {'ETag': _etag(version)}
+
+
+@bp.route('/tasks/<task_id>', methods=['PUT'])
+def put_task(task_id):
+    """
+    Create or replace a task
+
+    The body is the task object; its `id` must match the URL. Send
+    `If-Match` with the task's ETag to fail with 412 instead of
+    overwriting someone else's change.
+    """
+    try:
+        task = request.get_json(silent=True)
+        if not isinstance(task, dict):
+            raise BadRequest('Request body must be a task object')
+        key = task_key(task.get('id'))
+        if key != task_id:
+            raise BadRequest('Task id does not match the URL')
+        expected = _if_match_version(request.headers.get('If-Match'))
+        version = task_store.apply(
+            request_tenant(),
+            upserts=[task],
+            expected={key: expected} if expected is not None else None
+        )
+        return jsonify({'task': task, 'version': version}), 200, {'ETag': _etag(version)}
+
+    except TaskConflictError as e:
+        return jsonify({'error': str(e), 'version': e.version}), 412
+    except (BadRequest, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/tasks/<task_id>', methods=['DELETE'])
+def delete_task(task_id):
+    """Delete a task, leaving a tombstone for delta sync"""
+    try:
+        tenant = request_tenant()
+        found = task_store.get(tenant, task_id)
+        expected = _if_match_version(request.headers.get('If-Match'))
+        # Keep the id's original type (the frontend uses numbers)
+        original_id = found[0]['id'] if found else task_id
+        version = task_store.apply(
+            tenant,
+            deletes=[original_id],
+            expected={task_id: expected} if expected is not None else None
+        )
+        return jsonify({'version': version}), 200
+
+    except TaskConflictError as e:
+        return jsonify({'error': str(e), 'version': e.version}), 412
+    except (BadRequest, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+
+@bp.route('/tasks/sync', methods=['POST'])
+def sync_tasks():
+    """
+    Push local changes and pull everything changed since a cursor
+
+    Request JSON:
+    {
+        "since": 42,
+        "upserts": [{"id": 123, "title": "...", ...}],
+        "deletes": [456]
+    }
+
+    Writes are applied in one transaction (last writer wins), then the
+    response is the same delta as GET /api/tasks?since=42, including the
+    pushed changes. Omit `since` on first sync to get a full snapshot. A
+    `since` the store never issued to this tenant (it was recreated)
+    answers 409: push every task again without `since`.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        since = data.get('since')
+        if since is not None and (isinstance(since, bool) or not isinstance(since, int) or since < 0):
+            raise BadRequest('since must be a non-negative integer')
+        upserts = data.get('upserts', [])
+        deletes = data.get('deletes', [])
+        if not isinstance(upserts, list) or not isinstance(deletes, list):
+            raise BadRequest('upserts and deletes must be arrays')
+        max_changes = current_app.config['TASK_SYNC_PAGE_SIZE']
+        if len(upserts) + len(deletes) > max_changes:
+            raise BadRequest(f'Too many changes in one sync (max {max_changes})')
+
+        tenant = request_tenant()
+        if upserts or deletes:
+            task_store.apply(tenant, upserts=upserts, deletes=deletes)
+        result = task_store.changes(tenant, since, _int_arg('limit'))
+        version = result.pop('version')
+        return jsonify(result), 200, {'ETag': _etag(version)}
+
+    except UnknownCursorError as e:
+        return jsonify({'error': str(e)}), 409
+    except (BadRequest, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
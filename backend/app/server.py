@@ -0,0 +1,92 @@
+"""
+Production serving
+
+`run.py` hands over to `serve()` when `FLASK_ENV=production`, before it
+creates the app. On platforms with gunicorn, the process is replaced by
+gunicorn using `gunicorn.conf.py`, which sizes the workers, preloads the app
+and drains on SIGTERM. Elsewhere (Windows) the app is created and served by
+waitress in one process, with the same drain on SIGTERM/SIGINT.
+"""
+import _thread
+import importlib.util
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GUNICORN_CONFIG = os.path.join(BACKEND_DIR, 'gunicorn.conf.py')
+# Threads kept for health checks and other non-AI routes
+HEADROOM_THREADS = 4
+DRAIN_POLL_SECONDS = 0.2
+
+
+def serve(create_app):
+    """Serve the app built by `create_app` with the production server for this platform
+
+    Does not return.
+    """
+    if importlib.util.find_spec('gunicorn') is not None:
+        # gunicorn loads and preloads the app itself, after sizing workers
+        os.chdir(BACKEND_DIR)
+        os.execv(sys.executable, [sys.executable, '-m', 'gunicorn', '--config', GUNICORN_CONFIG])
+
+    try:
+        import waitress
+    except ImportError:
+        raise SystemExit("FLASK_ENV=production needs gunicorn or waitress: pip install -r requirements.txt")
+    _serve_waitress(create_app(), waitress)
+    sys.exit(0)
+
+
+def _serve_waitress(app, waitress):
+    # BaseWSGIServer.close would also close the loop's trigger; only the
+    # listening socket is closed when draining
+    from waitress import wasyncore
+
+    config = app.config
+    threads = config['SERVER_THREADS'] or (
+        config['LLM_MAX_CONCURRENCY'] + config['LLM_MAX_QUEUE'] + HEADROOM_THREADS
+    )
+    server = waitress.create_server(app, host='0.0.0.0', port=config['PORT'], threads=threads)
+    drain = threading.Event()
+
+    def on_signal(signum, frame):
+        if drain.is_set():
+            raise KeyboardInterrupt
+        drain.set()
+        logger.info("Draining: no new connections, waiting up to %ss for in-flight requests",
+                    config['SERVER_GRACEFUL_TIMEOUT'])
+        # Stop accepting, but keep serving the connections already open.
+        # The listener is closed from the server loop, not mid-select.
+        server.accepting = False
+        server.trigger.pull_trigger(lambda: wasyncore.dispatcher.close(server))
+        threading.Thread(target=_wait_for_idle, args=(server, config['SERVER_GRACEFUL_TIMEOUT']),
+                         name='drain', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, on_signal)
+    signal.signal(signal.SIGINT, on_signal)
+    logger.info("Serving on port %s with waitress (%s threads)", config['PORT'], threads)
+    server.run()
+    logger.info("Server stopped")
+
+
+def _wait_for_idle(server, timeout):
+    """Stop the server loop once no request is running or unsent, or on timeout"""
+    deadline = time.monotonic() + timeout
+    dispatcher = server.task_dispatcher
+    while time.monotonic() < deadline:
+        busy = dispatcher.active_count or dispatcher.queue or any(
+            getattr(channel, 'total_outbufs_len', 0) for channel in list(server._map.values())
+        )
+        if not busy:
+            break
+        time.sleep(DRAIN_POLL_SECONDS)
+    else:
+        logger.warning("Drain timed out with requests still in flight")
+    # Raises KeyboardInterrupt in the main thread, which ends server.run()
+    _thread.interrupt_main()
@@ -1,69 +1,654 @@
-import os
 import json
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 import requests
+from app.extensions import (
+    generation_stats, inflight, llm_scheduler, metrics, micro_batcher, model_router, ollama, parse_stats,
+    response_cache, semantic_cache
+)
+from app.services import tracing
+from app.services.health import OllamaUnavailableError
+from app.services.json_stream import JSONItemStream, extract_json
+from app.services.llm_schemas import (
+    ENRICH_SCHEMA, PLAN_SCHEMA, SUGGESTIONS_SCHEMA,
+    clean_plan, clean_plan_task, clean_suggestion, clean_suggestions, keyed_schema
+)
+from app.services.planner import (
+    DAY_END, DAY_START, fits, format_clock, free_gaps, parse_clock, plan_day, reserve, schedule, scheduled_entry
+)
+from app.services.prompt_budget import compact_task_line, compact_title, estimate_tokens, fit_to_budget
 
 logger = logging.getLogger(__name__)
 
 
+BRAINSTORM_SYSTEM_PROMPT = "You are a helpful task planning assistant. Generate practical, actionable task suggestions in JSON format."
+PLAN_SYSTEM_PROMPT = "You are a productivity coach. Create optimized daily plans that prioritize tasks effectively based on urgency, importance, and effort."
+
+# Cache modes derived from the request's Cache-Control header
+CACHE_DEFAULT = 'default'   # read and write
+CACHE_REFRESH = 'refresh'   # skip the lookup, store the fresh result (no-cache)
+CACHE_BYPASS = 'bypass'     # neither read nor write (no-store)
+
+# Daily plan modes
+PLAN_AUTO = 'auto'      # LLM, falling back to the deterministic planner
+PLAN_FAST = 'fast'      # deterministic planner only
+PLAN_LLM = 'llm'        # LLM only; errors are returned to the caller
+PLAN_ENRICH = 'enrich'  # deterministic schedule, LLM adds reasons and subtasks
+PLAN_MODES = {PLAN_AUTO, PLAN_FAST, PLAN_LLM, PLAN_ENRICH}
+
+# Daily plan prompts: estimated tokens allowed for the task list, tasks per
+# concurrently planned chunk, and output tokens reserved per planned task
+DEFAULT_PLAN_PROMPT_BUDGET = 1500
+DEFAULT_PLAN_CHUNK_SIZE = 6
+PLAN_PREDICT_BASE = 200
+PLAN_PREDICT_PER_TASK = 160
+
+# Incremental re-plans: a diff touching more tasks than this, or more than
+# this share of the previous plan's entries, is planned from scratch
+DEFAULT_REPLAN_MAX_CHANGES = 5
+DEFAULT_REPLAN_MAX_RATIO = 0.5
+
+
+def _title_key(title):
+    """Case- and whitespace-insensitive title for matching plan entries to tasks"""
+    return ' '.join(str(title or '').split()).casefold()
+
+
+def cache_mode_for(cache_control):
+    """Map a Cache-Control request header onto a response cache mode"""
+    directives = {d.strip().lower() for d in (cache_control or '').split(',')}
+    if 'no-store' in directives:
+        return CACHE_BYPASS
+    if 'no-cache' in directives or 'max-age=0' in directives:
+        return CACHE_REFRESH
+    return CACHE_DEFAULT
+
+
 class AIService:
     """Service for AI-powered features using Ollama"""
 
-    def __init__(self):
-        self.base_url = os.getenv('OLLAMA_URL', 'http://localhost:11434')
-        self.model = os.getenv('OLLAMA_MODEL', 'llama2')
-        self.connect_timeout = float(os.getenv('OLLAMA_CONNECT_TIMEOUT', 5))
-        self.read_timeout = float(os.getenv('OLLAMA_READ_TIMEOUT', 30))
+    def __init__(self, client=None, cache=None, tenant='anonymous', latency_budget=None,
+                 prompt_budget=None, chunk_size=None, replan_max_changes=None, replan_max_ratio=None):
+        self.client = client or ollama
+        self.cache = cache or response_cache
+        self.semantic_cache = semantic_cache
+        self.inflight = inflight
+        self.batcher = micro_batcher
+        self.scheduler = llm_scheduler
+        self.router = model_router
+        self.parse_stats = parse_stats
+        self.generation_stats = generation_stats
+        self.metrics = metrics
+        # Fair-queuing identity (API key or client address)
+        self.tenant = tenant
+        # Seconds a PLAN_AUTO request may expect to wait on the LLM
+        self.latency_budget = latency_budget
+        self.prompt_budget = prompt_budget or DEFAULT_PLAN_PROMPT_BUDGET
+        self.chunk_size = max(chunk_size or DEFAULT_PLAN_CHUNK_SIZE, 1)
+        self.replan_max_changes = DEFAULT_REPLAN_MAX_CHANGES if replan_max_changes is None else replan_max_changes
+        self.replan_max_ratio = DEFAULT_REPLAN_MAX_RATIO if replan_max_ratio is None else replan_max_ratio
+        # Models that generated (or whose cached results served) the last
+        # generate_* call, reported as X-Model
+        self.models = []
+        # HIT, MISS or BYPASS for the last generate_* call, reported as X-Cache
+        self.cache_status = None
+        # llm, fast, enrich or fallback for the last plan, reported as X-Plan-Mode
+        self.plan_mode = None
+        # incremental or full for the last re-plan, reported as X-Plan-Update
+        self.plan_update = None
+        # Slot releases of streams opened by stream_*, run by close()
+        self._stream_closers = []
 
-        # Verify Ollama is running
-        try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=2)
-            if response.status_code != 200:
-                logger.warning("Ollama may not be running", extra={"base_url": self.base_url})
-        except requests.exceptions.RequestException:
-            logger.warning("Could not connect to Ollama", extra={"base_url": self.base_url})
-
-    def generate_brainstorm(self, context, task_type='general'):
+    def generate_brainstorm(self, context, task_type='general', cache_mode=CACHE_DEFAULT):
         """
         Generate task suggestions based on user context
 
         Args:
             context (str): User's goal or context
             task_type (str): Type of tasks (general, project, creative, research, business)
+            cache_mode (str): CACHE_DEFAULT, CACHE_REFRESH or CACHE_BYPASS
 
         Returns:
             list: List of suggested tasks with title, description, and priority
         """
-        self._check_ollama_available()
-        system_prompt = "You are a helpful task planning assistant. Generate practical, actionable task suggestions in JSON format."
-        user_prompt = self._build_brainstorm_prompt(context, task_type)
+        payload = self._route('brainstorm', self._brainstorm_payload(context, task_type))
+        key = self.cache.make_key('brainstorm', payload['model'], payload)
+        cached = self._cache_lookup(key, cache_mode)
+        if cached is not None:
+            return cached
+
+        # Identical requests in flight share one embedding, lookup and generation
+        suggestions, status = self.inflight.do(
+            key, lambda: self._brainstorm_miss(key, payload, cache_mode, context, task_type)
+        )
+        self.cache_status = status or self.cache_status
+        return suggestions
+
+    def generate_daily_plan(self, tasks, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """
+        Generate an optimized daily plan from tasks
+
+        Args:
+            tasks (list): List of task objects
+            cache_mode (str): CACHE_DEFAULT, CACHE_REFRESH or CACHE_BYPASS
+            mode (str): PLAN_AUTO, PLAN_FAST, PLAN_LLM or PLAN_ENRICH
+
+        Returns:
+            dict: Daily plan with prioritized tasks and suggestions
+        """
+        if not tasks:
+            return {
+                'suggestion': 'No tasks to plan. Add some tasks to get started!',
+                'tasks': []
+            }
+
+        shortcut = self._plan_shortcut(tasks, mode)
+        if shortcut is not None:
+            return shortcut
+        if mode == PLAN_ENRICH:
+            return self._enrich_plan(plan_day(tasks), cache_mode)
+        return self._llm_daily_plan(tasks, cache_mode, mode)
+
+    def replan_daily_plan(self, tasks, previous_plan, changes, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """
+        Update a previous daily plan for a task diff
+
+        Entries of unaffected tasks keep their time slots. Only the added
+        tasks are scheduled, into the free time around the kept entries,
+        with a prompt listing just those tasks, so the cost follows the size
+        of the change. A diff too large for that is planned from scratch.
+
+        Args:
+            tasks (list): All tasks to plan, used for a full regeneration
+            previous_plan (dict): A plan returned by an earlier call
+            changes (dict): {'added': [task, ...], 'removed': [title, ...]};
+                an edited task is removed under its old title and added again
+            cache_mode (str): CACHE_DEFAULT, CACHE_REFRESH or CACHE_BYPASS
+            mode (str): PLAN_AUTO, PLAN_FAST, PLAN_LLM or PLAN_ENRICH
+
+        Returns:
+            dict: Daily plan with prioritized tasks and suggestions
+        """
+        update = self._replan_scope(previous_plan, changes)
+        if update is None:
+            self.plan_update = 'full'
+            return self.generate_daily_plan(tasks, cache_mode=cache_mode, mode=mode)
+        self.plan_update = 'incremental'
+
+        shortcut = self._replan_shortcut(update, mode)
+        if shortcut is not None:
+            return shortcut
+        if mode == PLAN_ENRICH:
+            enriched = self._enrich_plan({'suggestion': '', 'tasks': update['entries']}, cache_mode)
+            return self._replan_result(update, enriched['tasks'])
+        result = self._try_plan_chunk(update['chunk'], cache_mode, mode)
+        return self._merge_replan(update, result, cache_mode, mode)
+
+    def stream_replan_daily_plan(self, tasks, previous_plan, changes, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """replan_daily_plan as stream_daily_plan events"""
+        return self._replay_plan(self.replan_daily_plan(tasks, previous_plan, changes, cache_mode, mode))
+
+    def estimate_brainstorm_tokens(self, context, task_type='general'):
+        """Prompt + output tokens a brainstorm may cost, for the token budget"""
+        return self._payload_tokens(self._brainstorm_payload(context, task_type))
+
+    def estimate_plan_tokens(self, tasks, mode=PLAN_AUTO):
+        """Prompt + output tokens a plan may cost, for the token budget
+
+        Fast plans never reach the model and cost nothing. Auto plans are
+        charged as LLM plans, although they may end up on the local planner.
+        """
+        if not tasks or mode == PLAN_FAST:
+            return 0
+        if mode == PLAN_ENRICH:
+            return self._payload_tokens(self._enrich_payload(plan_day(tasks)['tasks']))
+        chunks, _ = self._plan_chunks(tasks)
+        return sum(self._payload_tokens(chunk['payload']) for chunk in chunks)
+
+    def estimate_replan_tokens(self, tasks, previous_plan, changes, mode=PLAN_AUTO):
+        """Prompt + output tokens a re-plan may cost: only the added tasks' prompt
+        when it is incremental"""
+        update = self._replan_scope(previous_plan, changes)
+        if update is None:
+            return self.estimate_plan_tokens(tasks, mode)
+        if not update['added'] or mode == PLAN_FAST:
+            return 0
+        if mode == PLAN_ENRICH:
+            return self._payload_tokens(self._enrich_payload(update['entries']))
+        return self._payload_tokens(update['chunk']['payload'])
+
+    @staticmethod
+    def _payload_tokens(payload):
+        """Estimated prompt tokens plus the output cap (num_predict)"""
+        prompt = payload.get('system', '') + payload['prompt']
+        return estimate_tokens(prompt) + payload['options']['num_predict']
+
+    def stream_brainstorm(self, context, task_type='general', cache_mode=CACHE_DEFAULT):
+        """
+        Stream task suggestions as the model generates them
+
+        The generation request is opened eagerly so connection problems
+        surface before the caller starts its response. A cached result is
+        replayed immediately.
+
+        Args:
+            context (str): User's goal or context
+            task_type (str): Type of tasks (general, project, creative, research, business)
+            cache_mode (str): CACHE_DEFAULT, CACHE_REFRESH or CACHE_BYPASS
+
+        Returns:
+            generator: Yields each suggestion dict as soon as it is complete
+        """
+        payload = self._route('brainstorm', self._brainstorm_payload(context, task_type))
+        key = self.cache.make_key('brainstorm', payload['model'], payload)
+        cached = self._cache_lookup(key, cache_mode)
+        if cached is not None:
+            return iter(cached)
+
+        chunks = self._stream_generate(payload, 'brainstorm')
+
+        def items():
+            parser = JSONItemStream()
+            suggestions = []
+            for chunk in chunks:
+                for item in parser.feed(chunk):
+                    suggestion = clean_suggestion(item)
+                    if suggestion is not None:
+                        suggestions.append(suggestion)
+                        yield suggestion
+            self._record_parse('brainstorm', key, bool(suggestions))
+            if suggestions:
+                self._cache_store('brainstorm', key, suggestions, cache_mode)
+
+        return items()
+
+    def stream_daily_plan(self, tasks, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """
+        Stream a daily plan task by task
+
+        Args:
+            tasks (list): List of task objects
+            cache_mode (str): CACHE_DEFAULT, CACHE_REFRESH or CACHE_BYPASS
+            mode (str): PLAN_AUTO, PLAN_FAST, PLAN_LLM or PLAN_ENRICH
 
-        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        Returns:
+            generator: Yields ('task', dict) for each scheduled task and a
+            final ('done', {'suggestion': str}) once generation finishes
+        """
+        if not tasks:
+            return iter([('done', {'suggestion': 'No tasks to plan. Add some tasks to get started!'})])
+
+        shortcut = self._plan_shortcut(tasks, mode)
+        if shortcut is None and mode == PLAN_ENRICH:
+            shortcut = self._enrich_plan(plan_day(tasks), cache_mode)
+        if shortcut is not None:
+            return self._replay_plan(shortcut)
+
+        chunks, deferred = self._plan_chunks(tasks)
+        if len(chunks) > 1:
+            # Chunks are planned concurrently, so the merged plan is replayed
+            return self._replay_plan(self._llm_daily_plan(tasks, cache_mode, mode))
+
+        payload = self._route('plan', chunks[0]['payload'])
+        key = self.cache.make_key('plan', payload['model'], payload)
+        cached = self._cache_lookup(key, cache_mode)
+        if cached is not None:
+            self.plan_mode = 'llm'
+            cached['suggestion'] = self._deferred_note(cached.get('suggestion', ''), deferred)
+            return self._replay_plan(cached)
 
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.7,
-                        "num_predict": 1000
-                    }
-                },
-                timeout=(self.connect_timeout, self.read_timeout)
+            chunks = self._stream_generate(payload, 'plan')
+        except Exception:
+            if mode != PLAN_AUTO:
+                raise
+            return self._replay_plan(self._fallback_plan(tasks, "LLM unavailable"))
+        self.plan_mode = 'llm'
+
+        def events():
+            parser = JSONItemStream()
+            planned = []
+            for chunk in chunks:
+                for item in parser.feed(chunk):
+                    task = clean_plan_task(item)
+                    if task is not None:
+                        planned.append(task)
+                        yield 'task', task
+            plan = parser.value(dict, clean_plan)
+            suggestion = plan['suggestion'] if plan else ''
+            self._record_parse('plan', key, bool(planned))
+            if planned:
+                self._cache_store('plan', key, {'suggestion': suggestion, 'tasks': planned}, cache_mode)
+            yield 'done', {'suggestion': self._deferred_note(suggestion, deferred)}
+
+        return events()
+
+    def close(self):
+        """Release the model slots of streams that were not read to the end
+
+        A stream only releases its slot once iteration finishes, so a
+        response that is closed before its first chunk (client gone, or the
+        server never started it) must call this.
+        """
+        while self._stream_closers:
+            self._stream_closers.pop()()
+
+    @staticmethod
+    def _replay_plan(plan):
+        events = [('task', task) for task in plan.get('tasks', [])]
+        events.append(('done', {'suggestion': plan.get('suggestion', '')}))
+        return iter(events)
+
+    def _llm_daily_plan(self, tasks, cache_mode, mode):
+        """Plan the selected tasks with the LLM, one concurrent request per chunk"""
+        chunks, deferred = self._plan_chunks(tasks)
+        if len(chunks) == 1:
+            results = [self._try_plan_chunk(chunks[0], cache_mode, mode)]
+        else:
+            workers = min(len(chunks), self.scheduler.max_concurrency)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-chunk') as pool:
+                plan_chunk = tracing.bind(lambda chunk: self._try_plan_chunk(chunk, cache_mode, mode))
+                results = list(pool.map(plan_chunk, chunks))
+        return self._merge_chunk_plans(tasks, chunks, results, deferred, cache_mode, mode)
+
+    def _plan_chunks(self, tasks):
+        """Select what fits today and the prompt budget, split for the LLM
+
+        The deterministic planner ranks tasks and places them in the day;
+        placed tasks are kept in rank order until the compact task list
+        reaches the token budget. The rest are deferred. Kept tasks are split
+        in time order into chunks that each own a window of the day, so the
+        chunks can be planned independently and concatenated.
+
+        Returns:
+            tuple: (chunks, deferred) - each chunk holds its generation
+            payload and the deterministic entries used if it falls back;
+            deferred is the number of tasks left out of the plan
+        """
+        today = date.today()
+        placed, left_out = schedule(tasks, today)
+        kept = fit_to_budget([compact_task_line(task) for _, _, task in placed], self.prompt_budget)
+        deferred = len(left_out) + len(placed) - kept
+        selected = sorted(placed[:kept], key=lambda entry: entry[0])
+
+        groups = [selected[i:i + self.chunk_size] for i in range(0, len(selected), self.chunk_size)]
+        chunks = []
+        for number, group in enumerate(groups):
+            window = (
+                DAY_START if number == 0 else group[0][0],
+                groups[number + 1][0][0] if number + 1 < len(groups) else DAY_END
             )
+            chunks.append({
+                'payload': self._daily_plan_payload([task for _, _, task in group], window),
+                'entries': [scheduled_entry(task, start, minutes, today) for start, minutes, task in group]
+            })
+        return chunks, deferred
 
-            if response.status_code != 200:
-                raise Exception(f"Ollama API returned status {response.status_code}")
+    def _plan_chunk(self, chunk, cache_mode):
+        """Generate one chunk's plan, or take it from the cache
+
+        Returns:
+            tuple: (plan, cache_hit)
+        """
+        payload = self._route('plan', chunk['payload'])
+        key = self.cache.make_key('plan', payload['model'], payload)
+        if cache_mode == CACHE_DEFAULT:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached, True
+        return self.inflight.do(key, lambda: self._run_daily_plan(key, payload, cache_mode)), False
+
+    def _try_plan_chunk(self, chunk, cache_mode, mode):
+        """_plan_chunk that reports failures as an empty result in PLAN_AUTO"""
+        try:
+            return self._plan_chunk(chunk, cache_mode)
+        except Exception as e:
+            if mode != PLAN_AUTO:
+                raise
+            logger.warning("Plan chunk failed: %s", e)
+            return None, False
+
+    def _merge_chunk_plans(self, tasks, chunks, results, deferred, cache_mode, mode):
+        """Concatenate chunk plans in time order
+
+        In PLAN_AUTO a chunk without a usable plan keeps its deterministic
+        entries (X-Plan-Mode: partial); if no chunk succeeded the whole plan
+        falls back to the deterministic planner.
+        """
+        hits = [hit for _, hit in results]
+        self.cache_status = 'BYPASS' if cache_mode != CACHE_DEFAULT else ('HIT' if all(hits) else 'MISS')
+        usable = [isinstance(plan, dict) and isinstance(plan.get('tasks'), list) and bool(plan['tasks'])
+                  for plan, _ in results]
+        if mode == PLAN_AUTO and not any(usable):
+            return self._fallback_plan(tasks, "LLM unavailable or returned no usable plan")
+
+        planned = []
+        suggestions = []
+        for chunk, (plan, _), ok in zip(chunks, results, usable):
+            if isinstance(plan, dict) and isinstance(plan.get('suggestion'), str) and plan['suggestion']:
+                suggestions.append(plan['suggestion'])
+            if ok:
+                planned.extend(plan['tasks'])
+            elif mode == PLAN_AUTO:
+                planned.extend(chunk['entries'])
+
+        self.plan_mode = 'partial' if mode == PLAN_AUTO and not all(usable) else 'llm'
+        suggestion = suggestions[0] if suggestions else 'Unable to generate plan'
+        return {'suggestion': self._deferred_note(suggestion, deferred), 'tasks': planned}
+
+    @staticmethod
+    def _deferred_note(suggestion, deferred):
+        if not deferred:
+            return suggestion
+        note = f"{deferred} lower-priority task" + ("s" if deferred > 1 else "") + " did not fit today and can wait."
+        return f"{suggestion} {note}".strip()
+
+    def _plan_shortcut(self, tasks, mode):
+        """Deterministic plan when requested or when the LLM is over budget"""
+        if mode == PLAN_FAST:
+            self.plan_mode = 'fast'
+            return plan_day(tasks)
+        expected = self._latency_over_budget(mode)
+        if expected is not None:
+            return self._fallback_plan(tasks, f"expected LLM latency {expected:.1f}s over budget")
+        return None
+
+    def _latency_over_budget(self, mode):
+        """Expected LLM latency when a PLAN_AUTO request should not wait for it, else None"""
+        if mode != PLAN_AUTO or self.latency_budget is None:
+            return None
+        expected = self.scheduler.expected_latency()
+        return expected if expected > self.latency_budget else None
+
+    def _fallback_plan(self, tasks, reason):
+        logger.warning("Falling back to deterministic planner", extra={"reason": reason})
+        self.plan_mode = 'fallback'
+        self.models = []
+        return plan_day(tasks)
+
+    def _replan_scope(self, previous_plan, changes):
+        """Work out an incremental re-plan, or None to plan from scratch
+
+        Full regeneration is chosen when the previous plan has no entries,
+        an entry has no usable times, the diff exceeds REPLAN limits, or an
+        added task does not fit the free time (it may outrank kept tasks).
+
+        Returns:
+            dict: kept entries, the free gaps around them, and the added
+            tasks in rank order with their deterministic entries and LLM chunk
+        """
+        previous = clean_plan(previous_plan) or {'suggestion': '', 'tasks': []}
+        added = changes.get('added') or []
+        removed = changes.get('removed') or []
+        changed = len(added) + len(removed)
+        entries = previous['tasks']
+        if not entries or changed > self.replan_max_changes or changed > self.replan_max_ratio * len(entries):
+            return None
+
+        # Edited tasks come back under `added`; their old entry goes either
+        # way. Entries may carry the shortened title the prompt showed.
+        dropped = set()
+        for task in [{'title': title} for title in removed] + added:
+            dropped.update((_title_key(task.get('title')), _title_key(compact_title(task))))
+        kept = []
+        for entry in entries:
+            if _title_key(entry['title']) in dropped:
+                continue
+            start, end = parse_clock(entry['startTime']), parse_clock(entry['endTime'])
+            if start is None or end is None or end <= start:
+                return None
+            kept.append((start, end, entry))
+
+        today = date.today()
+        gaps = free_gaps([(start, end) for start, end, _ in kept])
+        placed, left_out = schedule(added, today, gaps)
+        if left_out:
+            return None
+        ranked = [task for _, _, task in placed]
+        entries = [scheduled_entry(task, start, minutes, today)
+                   for start, minutes, task in sorted(placed, key=lambda entry: entry[0])]
+        return {
+            'suggestion': previous['suggestion'],
+            'kept': [entry for _, _, entry in kept],
+            'gaps': gaps,
+            'added': ranked,
+            'entries': entries,
+            'chunk': {'payload': self._replan_payload(ranked, gaps), 'entries': entries} if ranked else None
+        }
+
+    def _replan_shortcut(self, update, mode):
+        """Deterministic placement when nothing needs the LLM, it was not
+        asked for, or it is over the latency budget"""
+        if not update['added'] or mode == PLAN_FAST:
+            self.plan_mode = 'fast'
+            return self._replan_result(update, update['entries'])
+        expected = self._latency_over_budget(mode)
+        if expected is not None:
+            return self._replan_fallback(update, f"expected LLM latency {expected:.1f}s over budget")
+        return None
+
+    def _replan_fallback(self, update, reason):
+        logger.warning("Falling back to deterministic planner", extra={"reason": reason})
+        self.plan_mode = 'fallback'
+        self.models = []
+        return self._replan_result(update, update['entries'])
+
+    def _merge_replan(self, update, result, cache_mode, mode):
+        """Keep the LLM's entries that fit the free time; in PLAN_AUTO the
+        added tasks it misplaced or skipped get deterministic slots"""
+        plan, hit = result
+        self.cache_status = 'BYPASS' if cache_mode != CACHE_DEFAULT else ('HIT' if hit else 'MISS')
+        accepted, gaps = self._accept_replan_entries(plan, update)
+        if mode == PLAN_AUTO and not accepted:
+            return self._replan_fallback(update, "LLM unavailable or returned no usable entries for the added tasks")
+
+        placed_keys = {_title_key(entry['title']) for entry in accepted}
+        missing = [task for task in update['added']
+                   if _title_key(task.get('title')) not in placed_keys
+                   and _title_key(compact_title(task)) not in placed_keys]
+        deferred = 0
+        filled = []
+        if missing and mode == PLAN_AUTO:
+            today = date.today()
+            placed, left_out = schedule(missing, today, gaps)
+            filled = [scheduled_entry(task, start, minutes, today) for start, minutes, task in placed]
+            deferred = len(left_out)
+        else:
+            deferred = len(missing)
+        self.plan_mode = 'partial' if filled else 'llm'
+        return self._replan_result(update, accepted + filled, deferred)
+
+    @staticmethod
+    def _accept_replan_entries(plan, update):
+        """LLM entries for added tasks that lie in free time without overlapping
+
+        Returns:
+            tuple: (accepted entries, gaps still free after them)
+        """
+        wanted = set()
+        for task in update['added']:
+            wanted.update((_title_key(task.get('title')), _title_key(compact_title(task))))
+        gaps = update['gaps']
+        accepted = []
+        entries = plan.get('tasks') if isinstance(plan, dict) else None
+        for entry in entries if isinstance(entries, list) else []:
+            key = _title_key(entry.get('title'))
+            start, end = parse_clock(entry.get('startTime')), parse_clock(entry.get('endTime'))
+            if key not in wanted or start is None or end is None or not fits(gaps, start, end):
+                continue
+            wanted.discard(key)
+            gaps = reserve(gaps, start, end)
+            accepted.append(entry)
+        return accepted, gaps
+
+    def _replan_result(self, update, new_entries, deferred=0):
+        tasks = sorted(update['kept'] + list(new_entries), key=lambda entry: entry['startTime'])
+        return {'suggestion': self._deferred_note(update['suggestion'], deferred), 'tasks': tasks}
+
+    def _enrich_plan(self, plan, cache_mode):
+        """Ask the LLM for reasons and subtasks on a fixed deterministic schedule
+
+        The schedule itself is never changed; if the LLM is unavailable the
+        deterministic plan is returned as is.
+        """
+        payload = self._route('enrich', self._enrich_payload(plan['tasks']))
+        key = self.cache.make_key('plan', payload['model'], payload)
+        details = self._cache_lookup(key, cache_mode)
+        if details is None:
+            try:
+                details = self.inflight.do(key, lambda: self._run_enrichment(key, payload, cache_mode))
+            except Exception:
+                logger.warning("Plan enrichment failed; returning deterministic plan", exc_info=True)
+                self.plan_mode = 'fast'
+                return plan
+        self.plan_mode = 'enrich'
+        return self._merge_enrichment(plan, details)
 
-            content = response.json()['response']
-            suggestions = self._parse_json_response(content)
+    @staticmethod
+    def _merge_enrichment(plan, details):
+        for detail in details:
+            if not isinstance(detail, dict):
+                continue
+            try:
+                index = int(detail.get('index')) - 1
+            except (TypeError, ValueError):
+                continue
+            if not 0 <= index < len(plan['tasks']):
+                continue
+            task = plan['tasks'][index]
+            if isinstance(detail.get('reason'), str) and detail['reason'].strip():
+                task['reason'] = detail['reason'].strip()
+            subtasks = detail.get('subtasks')
+            if isinstance(subtasks, list):
+                task['subtasks'] = [str(step) for step in subtasks if str(step).strip()][:5]
+        return plan
 
-            return suggestions
+    def _brainstorm_miss(self, key, payload, cache_mode, context, task_type):
+        """(suggestions, 'SEMANTIC' or None) for a brainstorm the response cache
+        missed: from a similar context when the semantic cache has one, else
+        generated"""
+        namespace = self._semantic_namespace(payload, task_type)
+        vector = self._embed_context(context, cache_mode)
+        similar = self._semantic_lookup(namespace, vector, cache_mode)
+        if similar is not None:
+            return similar, 'SEMANTIC'
+        suggestions = self._run_brainstorm(key, payload, cache_mode, (context, task_type))
+        self._semantic_store(namespace, vector, suggestions)
+        return suggestions, None
 
+    def _run_brainstorm(self, key, payload, cache_mode, item):
+        try:
+            suggestions = self._batched_brainstorm(payload, item)
+            if suggestions is None:
+                content = self._generate(payload, 'brainstorm')
+                suggestions = self._parse_suggestions(content)
+        except OllamaUnavailableError:
+            raise
         except requests.exceptions.ReadTimeout as e:
+            self.metrics.timeouts.inc('ollama')
             logger.exception("Ollama timed out in generate_brainstorm")
             raise ValueError("Ollama timed out while generating suggestions. Is the model running?")
         except requests.exceptions.RequestException as e:
@@ -73,52 +658,46 @@ class AIService:
             logger.exception("Error in generate_brainstorm")
             raise Exception(f"Failed to generate brainstorming suggestions: {str(e)}")
 
-    def generate_daily_plan(self, tasks):
-        """
-        Generate an optimized daily plan from tasks
+        self._record_parse('brainstorm', key, bool(suggestions))
+        if suggestions:
+            self._cache_store('brainstorm', key, suggestions, cache_mode)
+        return suggestions
 
-        Args:
-            tasks (list): List of task objects
+    def _batched_brainstorm(self, payload, item):
+        """Suggestions for `item` (context, task_type) from a generation shared
+        with concurrent brainstorms, or None to generate it alone"""
+        if not self.batcher.enabled:
+            return None
+        return self.batcher.submit(payload['model'], item, lambda take: self._run_brainstorm_batch(payload, take))
 
-        Returns:
-            dict: Daily plan with prioritized tasks and suggestions
+    def _run_brainstorm_batch(self, payload, take):
+        """Generate for the batch this brainstorm leads: one result per item,
+        None for each whose part of the output is unusable
+
+        The items are taken once a model slot is held, so brainstorms
+        arriving while this one waits for a slot still join it.
         """
-        if not tasks:
-            return {
-                'suggestion': 'No tasks to plan. Add some tasks to get started!',
-                'tasks': []
-            }
+        items = []
 
-        self._check_ollama_available()
-        system_prompt = "You are a productivity coach. Create optimized daily plans that prioritize tasks effectively based on urgency, importance, and effort."
-        user_prompt = self._build_daily_plan_prompt(tasks)
+        def build():
+            items.extend(take())
+            if len(items) == 1:
+                return payload
+            return dict(self._brainstorm_batch_payload(items), model=payload['model'])
 
-        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        content = self._generate(build, 'brainstorm')
+        if len(items) == 1:
+            return [self._parse_suggestions(content)]
+        return self._parse_batch_suggestions(content, len(items))
 
+    def _run_daily_plan(self, key, payload, cache_mode):
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": full_prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.5,
-                        "num_predict": 1500
-                    }
-                },
-                timeout=(self.connect_timeout, self.read_timeout)
-            )
-
-            if response.status_code != 200:
-                raise Exception(f"Ollama API returned status {response.status_code}")
-
-            content = response.json()['response']
+            content = self._generate(payload, 'plan')
             plan = self._parse_plan_response(content)
-
-            return plan
-
+        except OllamaUnavailableError:
+            raise
         except requests.exceptions.ReadTimeout as e:
+            self.metrics.timeouts.inc('ollama')
             logger.exception("Ollama timed out in generate_daily_plan")
             raise ValueError("Ollama timed out while generating the plan. Is the model running?")
         except requests.exceptions.RequestException as e:
@@ -128,20 +707,224 @@ class AIService:
             logger.exception("Error in generate_daily_plan")
             raise Exception(f"Failed to generate daily plan: {str(e)}")
 
-    def _check_ollama_available(self):
-        """Fast check to avoid long timeouts when Ollama is down"""
+        self._record_parse('plan', key, bool(plan['tasks']))
+        if plan['tasks']:
+            self._cache_store('plan', key, plan, cache_mode)
+        return plan
+
+    def _run_enrichment(self, key, payload, cache_mode):
+        try:
+            content = self._generate(payload, 'enrich')
+        except requests.exceptions.RequestException as e:
+            raise ValueError(f"Failed to enrich plan: {str(e)}")
+        details = self._parse_json_response(content, 'enrich')
+        self._record_parse('enrich', key, bool(details))
+        if details:
+            self._cache_store('plan', key, details, cache_mode)
+        return details
+
+    def _record_parse(self, endpoint, key, ok):
+        self.parse_stats.record(endpoint, key, ok, self.client.supports_schema())
+        if not ok:
+            self.metrics.parse_failures.inc(endpoint)
+
+    def _brainstorm_payload(self, context, task_type):
+        return {
+            "system": BRAINSTORM_SYSTEM_PROMPT,
+            "prompt": self._build_brainstorm_prompt(context, task_type),
+            "format": SUGGESTIONS_SCHEMA,
+            "options": {
+                "temperature": 0.7,
+                "num_predict": 1000
+            }
+        }
+
+    def _brainstorm_batch_payload(self, items):
+        return {
+            "system": BRAINSTORM_SYSTEM_PROMPT,
+            "prompt": self._build_brainstorm_batch_prompt(items),
+            "format": keyed_schema(SUGGESTIONS_SCHEMA, len(items)),
+            "options": {
+                "temperature": 0.7,
+                # As much room per context as a brainstorm of its own
+                "num_predict": 1000 * len(items)
+            }
+        }
+
+    def _daily_plan_payload(self, tasks, window=(DAY_START, DAY_END)):
+        return {
+            "system": PLAN_SYSTEM_PROMPT,
+            "prompt": self._build_daily_plan_prompt(tasks, window),
+            "format": PLAN_SCHEMA,
+            "options": {
+                "temperature": 0.5,
+                # Room for every selected task's entry and subtasks
+                "num_predict": PLAN_PREDICT_BASE + PLAN_PREDICT_PER_TASK * len(tasks)
+            }
+        }
+
+    def _replan_payload(self, tasks, gaps):
+        return {
+            "system": PLAN_SYSTEM_PROMPT,
+            "prompt": self._build_replan_prompt(tasks, gaps),
+            "format": PLAN_SCHEMA,
+            "options": {
+                "temperature": 0.5,
+                "num_predict": PLAN_PREDICT_BASE + PLAN_PREDICT_PER_TASK * len(tasks)
+            }
+        }
+
+    def _enrich_payload(self, scheduled):
+        return {
+            "system": PLAN_SYSTEM_PROMPT,
+            "prompt": self._build_enrich_prompt(scheduled),
+            "format": ENRICH_SCHEMA,
+            "options": {
+                "temperature": 0.5,
+                "num_predict": min(150 * len(scheduled) + 100, 1500)
+            }
+        }
+
+    def _cache_lookup(self, key, cache_mode):
+        if cache_mode != CACHE_DEFAULT:
+            self.cache_status = 'BYPASS'
+            return None
+        cached = self.cache.get(key)
+        self.cache_status = 'HIT' if cached is not None else 'MISS'
+        return cached
+
+    def _embed_context(self, context, cache_mode):
+        """Embedding of a brainstorm context for the semantic cache, or None
+        when it is off, bypassed or the embedding failed"""
+        if cache_mode == CACHE_BYPASS or not self.semantic_cache.enabled:
+            return None
+        try:
+            return self.client.embed([context], self.semantic_cache.model, self.semantic_cache.timeout)[0]
+        except Exception as e:
+            self._embed_failed(e)
+            return None
+
+    def _embed_failed(self, error):
+        self.semantic_cache.record_error()
+        logger.warning("Context embedding failed; skipping the semantic cache: %s", error)
+
+    @staticmethod
+    def _semantic_namespace(payload, task_type):
+        # Per model, like the response cache key, so a hit never returns
+        # another model tier's suggestions
+        return f"{payload['model']}|{task_type}"
+
+    def _semantic_lookup(self, namespace, vector, cache_mode):
+        """Suggestions cached for a similar context (X-Cache: SEMANTIC), or None"""
+        if vector is None or cache_mode != CACHE_DEFAULT:
+            return None
+        suggestions, _ = self.semantic_cache.lookup(namespace, vector)
+        if suggestions is not None:
+            self.cache_status = 'SEMANTIC'
+        return suggestions
+
+    def _semantic_store(self, namespace, vector, suggestions):
+        if vector is not None and suggestions:
+            self.semantic_cache.store(namespace, vector, suggestions)
+
+    def _cache_store(self, endpoint, key, value, cache_mode):
+        if cache_mode != CACHE_BYPASS:
+            self.cache.set(endpoint, key, value)
+
+    def _route(self, operation, payload):
+        """`payload` with the model the router picks for it"""
+        model = self.router.choose(operation, self._payload_tokens(payload))
+        self.models.append(model)
+        return dict(payload, model=model)
+
+    def _record_generation(self, payload, data, elapsed, operation):
+        self.generation_stats.record(data, elapsed, operation)
+        self.router.observe(payload.get('model', self.client.model), elapsed, data)
+
+    def _generate(self, payload, operation):
+        """Run a non-streaming generation and return the raw response text
+
+        `payload` may also be a function returning it, called once a model
+        slot is held.
+        """
+        queued = time.monotonic()
+        with self.scheduler.slot(self.tenant):
+            started = time.monotonic()
+            self.metrics.observe_stage(started - queued, operation, 'queue_wait')
+            if callable(payload):
+                payload = payload()
+            response = self.client.generate(payload)
+
+            if response.status_code != 200:
+                raise Exception(f"Ollama API returned status {response.status_code}")
+
+            data = response.json()
+            self._record_generation(payload, data, time.monotonic() - started, operation)
+            return data['response']
+
+    def _stream_generate(self, payload, operation):
+        """Yield response fragments from a streaming Ollama generation
+
+        The scheduler slot is held until the stream is exhausted or closed,
+        or until close() is called, whichever comes first.
+        """
+        queued = time.monotonic()
+        self.scheduler.acquire(self.tenant)
+        started = time.monotonic()
+        self.metrics.observe_stage(started - queued, operation, 'queue_wait')
         try:
-            resp = requests.get(f"{self.base_url}/api/tags", timeout=2)
-            if resp.status_code != 200:
-                raise ValueError("Ollama is not responding (non-200). Start ollama serve.")
-        except requests.exceptions.RequestException as exc:
-            raise ValueError(f"Ollama is not reachable: {exc}")
+            response = self.client.generate(payload, stream=True)
+            if response.status_code != 200:
+                response.close()
+                raise ValueError(f"Ollama API returned status {response.status_code}")
+        except requests.exceptions.RequestException as e:
+            self.scheduler.release()
+            logger.exception("Error connecting to Ollama")
+            raise ValueError(f"Failed to connect to Ollama. Make sure it's running: {str(e)}")
+        except Exception:
+            self.scheduler.release()
+            raise
+
+        released = threading.Lock()
+
+        def release(service_time=None):
+            # Once, from whichever of the stream and close() gets here first
+            if released.acquire(blocking=False):
+                response.close()
+                self.scheduler.release(service_time)
+
+        self._stream_closers.append(release)
+
+        def fragments():
+            service_time = None
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get('error'):
+                        raise ValueError(f"Ollama error: {data['error']}")
+                    if data.get('response'):
+                        yield data['response']
+                    if data.get('done'):
+                        service_time = time.monotonic() - started
+                        self._record_generation(payload, data, service_time, operation)
+                        break
+            except requests.exceptions.RequestException as e:
+                logger.exception("Ollama stream interrupted")
+                raise ValueError(f"Ollama stream interrupted: {str(e)}")
+            finally:
+                release(service_time)
+
+        return fragments()
+
+    # Prompts keep the fixed instructions first and the per-request content
+    # last, and the system prompt travels separately, so consecutive requests
+    # share a token prefix and Ollama can reuse its KV cache for it.
 
     def _build_brainstorm_prompt(self, context, task_type):
         """Build prompt for brainstorming"""
-        return f"""Given this context: "{context}"
-
-Generate 5-7 specific, actionable tasks for a {task_type} context.
+        return f"""Generate 5-7 specific, actionable tasks for the context below.
 
 Return ONLY a JSON array with this exact structure:
 [
@@ -156,32 +939,54 @@ Make tasks:
 - Specific and actionable
 - Varied in scope (some quick wins, some longer-term)
 - Prioritized appropriately
-- Relevant to the context"""
+- Relevant to the context and suited to its type
+
+Type: {task_type}
+Context: "{context}\""""
+
+    def _build_brainstorm_batch_prompt(self, items):
+        """Build one prompt answering several brainstorms, keyed by number"""
+        contexts = '\n'.join(
+            f"{n}. ({task_type}) {json.dumps(context, ensure_ascii=False)}"
+            for n, (context, task_type) in enumerate(items, 1)
+        )
+        return f"""Generate 5-7 specific, actionable tasks for each numbered context below.
 
-    def _build_daily_plan_prompt(self, tasks):
-        """Build prompt for daily planning"""
-        task_summaries = []
-        for task in tasks:
-            summary = f"- {task.get('title', 'Untitled')} "
-            summary += f"[Priority: {task.get('priority', 'medium')}] "
-            if task.get('dueDate'):
-                summary += f"[Due: {task.get('dueDate')}] "
-            if task.get('category'):
-                summary += f"[Category: {task.get('category')}]"
-            task_summaries.append(summary)
+Return ONLY a JSON object with one key per context number, each holding a JSON array with this exact structure:
+{{
+  "1": [
+    {{
+      "title": "Task title (concise, under 50 chars)",
+      "description": "Brief description of what needs to be done",
+      "priority": "high" | "medium" | "low"
+    }}
+  ]
+}}
+
+Make tasks:
+- Specific and actionable
+- Varied in scope (some quick wins, some longer-term)
+- Prioritized appropriately
+- Relevant to their own context only and suited to its type (in parentheses)
 
-        tasks_text = "\n".join(task_summaries)
+Contexts:
+{contexts}"""
 
-        return f"""Given these tasks:
+    def _build_daily_plan_prompt(self, tasks, window=(DAY_START, DAY_END)):
+        """Build prompt for daily planning
 
-{tasks_text}
+        Tasks are encoded one per line as `title | priority | due | category`
+        to keep prompt evaluation short.
+        """
+        tasks_text = "\n".join(f"- {compact_task_line(task)}" for task in tasks)
+        start, end = (format_clock(minute) for minute in window)
 
-Create an optimized daily plan with hourly scheduling. Consider:
+        return f"""Create an optimized daily plan with hourly scheduling for the tasks below. Consider:
 1. Priority levels (high priority first)
 2. Due dates (urgent tasks first)
 3. Task complexity (mix hard and easy tasks)
 4. Energy levels throughout the day (harder tasks in morning, easier in afternoon)
-5. Schedule tasks between 8:00 AM and 6:00 PM
+5. Only schedule inside the time window given below
 
 Return ONLY a JSON object with this exact structure:
 {{
@@ -203,52 +1008,100 @@ Return ONLY a JSON object with this exact structure:
 }}
 
 For each task, include 3-5 specific subtasks that break down the work into smaller, actionable steps.
-Order tasks from first to last to complete today. Ensure times don't overlap and include breaks."""
+Order tasks from first to last to complete today. Ensure times don't overlap and include breaks.
 
-    def _parse_json_response(self, content):
-        """Parse JSON response from OpenAI, handling markdown code blocks"""
-        try:
-            # Remove markdown code blocks if present
-            content = content.strip()
-            if content.startswith('```'):
-                # Extract JSON from code block
-                lines = content.split('\n')
-                content = '\n'.join(lines[1:-1])  # Remove first and last lines
-
-            data = json.loads(content)
-            return data if isinstance(data, list) else []
-        except json.JSONDecodeError:
-            # Fallback: try to extract JSON from the response
-            import re
-            json_match = re.search(r'\[.*\]', content, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except:
-                    pass
-            return []
+Time window: {start} to {end}
+Tasks (title | priority | due date | category):
+{tasks_text}"""
+
+    def _build_replan_prompt(self, tasks, gaps):
+        """Build prompt scheduling only new tasks into the free time of an existing plan"""
+        tasks_text = "\n".join(f"- {compact_task_line(task)}" for task in tasks)
+        windows = ", ".join(f"{format_clock(start)}-{format_clock(end)}" for start, end in gaps)
+
+        return f"""Add the tasks below to a daily plan whose other time slots are already fixed. Consider:
+1. Priority levels (high priority first)
+2. Due dates (urgent tasks first)
+3. Energy levels throughout the day (harder tasks in morning, easier in afternoon)
+4. Only schedule inside the free time windows given below
+
+Return ONLY a JSON object with this exact structure:
+{{
+  "suggestion": "One sentence on where the new tasks fit",
+  "tasks": [
+    {{
+      "title": "Task title exactly as listed",
+      "reason": "Why this task is scheduled here",
+      "timeEstimate": "Estimated time (e.g., '30 minutes', '2 hours')",
+      "startTime": "HH:MM format (e.g., '09:00')",
+      "endTime": "HH:MM format (e.g., '10:30')",
+      "subtasks": [
+        "First actionable step",
+        "Second actionable step",
+        "Third actionable step"
+      ]
+    }}
+  ]
+}}
+
+For each task, include 3-5 specific subtasks that break down the work into smaller, actionable steps.
+Schedule only the listed tasks. Ensure times don't overlap and include breaks.
+
+Free time windows: {windows}
+Tasks (title | priority | due date | category):
+{tasks_text}"""
+
+    def _build_enrich_prompt(self, scheduled):
+        """Build prompt asking only for reasons and subtasks on a fixed schedule"""
+        lines = [
+            f"{index}. {task['startTime']}-{task['endTime']} {task['title']} ({task['reason']})"
+            for index, task in enumerate(scheduled, start=1)
+        ]
+        schedule_text = "\n".join(lines)
+
+        return f"""The order and times of the schedule below are fixed.
+For each numbered task, give a one-sentence reason for its place in the day and 3-5 specific, actionable subtasks.
+
+Return ONLY a JSON array with this exact structure:
+[
+  {{
+    "index": 1,
+    "reason": "Why this task is scheduled here",
+    "subtasks": ["First actionable step", "Second actionable step", "Third actionable step"]
+  }}
+]
+
+Today's schedule:
+{schedule_text}"""
+
+    def _parse_json_response(self, content, operation):
+        """Extract the JSON array from model output (fences, prose, defects)
+
+        The parse time is recorded under `operation`'s stage metrics.
+        """
+        with self.metrics.stage(operation, 'parse'):
+            return extract_json(content, list) or []
+
+    def _parse_suggestions(self, content):
+        """Extract and validate brainstorm suggestions"""
+        with self.metrics.stage('brainstorm', 'parse'):
+            return extract_json(content, list, clean_suggestions) or []
+
+    def _parse_batch_suggestions(self, content, count):
+        """Validated suggestions per batched context, None where unusable"""
+        with self.metrics.stage('brainstorm', 'parse'):
+            data = extract_json(content, dict) or {}
+            results = [clean_suggestions(data.get(str(n))) or None for n in range(1, count + 1)]
+        if not any(results):
+            self.metrics.parse_failures.inc('brainstorm')
+            logger.warning("Batched brainstorm output did not parse; generating each request on its own",
+                           extra={"size": count})
+        return results
 
     def _parse_plan_response(self, content):
-        """Parse daily plan JSON response"""
-        try:
-            # Remove markdown code blocks if present
-            content = content.strip()
-            if content.startswith('```'):
-                lines = content.split('\n')
-                content = '\n'.join(lines[1:-1])
-
-            data = json.loads(content)
-            return data
-        except json.JSONDecodeError:
-            # Fallback: try to extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                try:
-                    return json.loads(json_match.group())
-                except:
-                    pass
-            return {
+        """Extract and validate a daily plan"""
+        with self.metrics.stage('plan', 'parse'):
+            return extract_json(content, dict, clean_plan) or {
                 'suggestion': 'Unable to generate plan',
                 'tasks': []
             }
@@ -0,0 +1,346 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+import httpx
+from app.extensions import micro_batcher, ollama
+from app.services import tracing
+from app.services.ai_service import AIService, CACHE_BYPASS, CACHE_DEFAULT, PLAN_AUTO, PLAN_ENRICH
+from app.services.planner import plan_day
+from app.services.health import OllamaUnavailableError
+from app.services.micro_batch import AsyncMicroBatcher
+from app.services.singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+# httpx logs every request at INFO; keep it as quiet as requests/urllib3
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+
+async def off_loop(func, *args):
+    """Run blocking `func` (SQLite, rate-limit storage) on the default executor
+
+    The trace context goes along, so spans opened there join the request.
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args)
+    return await asyncio.get_running_loop().run_in_executor(None, call)
+
+
+class AsyncOllamaClient:
+    """Non-blocking Ollama client for the ASGI serving mode
+
+    Mirrors the pooled sync client's configuration and shares its backends,
+    with their circuit breakers and load, so both serving modes route the
+    same way and agree on whether Ollama is up. The underlying httpx client
+    is created lazily inside the running loop.
+    """
+
+    def __init__(self, sync_client):
+        self.sync_client = sync_client
+        self._client = None
+
+    @property
+    def model(self):
+        return self.sync_client.model
+
+    def _http(self):
+        if self._client is None:
+            config = self.sync_client
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(config.read_timeout, connect=config.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=config.pool_maxsize,
+                    max_keepalive_connections=config.pool_maxsize
+                )
+            )
+        return self._client
+
+    async def generate(self, payload):
+        """POST /api/generate without blocking the event loop, failing over
+        to another backend when one refuses the connection"""
+        client = self.sync_client
+        body = client.request_body(payload)
+        tried = []
+        while True:
+            backend = client.acquire_backend(tried)
+            started = time.monotonic()
+            try:
+                response = await self._post(backend, body)
+                if response.status_code == 400 and client.schema_rejected(body, self._error_text(response)):
+                    response = await self._post(backend, body)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                backend.finish_request(ok=False)
+                tried.append(backend)
+                if client.failed_over(backend, tried):
+                    continue
+                raise
+            except BaseException:
+                backend.finish_request(ok=False)
+                raise
+            backend.finish_request(time.monotonic() - started, response.status_code < 500)
+            return response
+
+    async def embed(self, texts, model, timeout=None):
+        """Async counterpart of OllamaClient.embed"""
+        client = self.sync_client
+        body = {"model": model, "input": list(texts)}
+        if client.keep_alive is not None:
+            body['keep_alive'] = client.keep_alive
+        tried = []
+        while True:
+            backend = client.acquire_backend(tried)
+            try:
+                response = await self._post(backend, body, path='/api/embed', timeout=timeout)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                backend.finish_request(ok=False)
+                tried.append(backend)
+                if client.failed_over(backend, tried):
+                    continue
+                raise
+            except BaseException:
+                backend.finish_request(ok=False)
+                raise
+            backend.finish_request(ok=response.status_code < 500)
+            data = response.json() if response.status_code == 200 else None
+            return client.embeddings(response.status_code, data, len(body['input']))
+
+    async def _post(self, backend, body, path='/api/generate', timeout=None):
+        try:
+            with tracing.span('ollama.request', backend=backend.url, path=path):
+                response = await self._http().post(
+                    f"{backend.url}{path}", json=body, timeout=timeout or httpx.USE_CLIENT_DEFAULT
+                )
+        except httpx.HTTPError:
+            backend.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            backend.breaker.record_failure()
+        else:
+            backend.breaker.record_success()
+        return response
+
+    @staticmethod
+    def _error_text(response):
+        try:
+            return str(response.json().get('error', ''))
+        except ValueError:
+            return response.text
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class AsyncAIService(AIService):
+    """AIService variant whose generations are coroutines
+
+    Prompt building, parsing, caching and the scheduler are shared with the
+    sync service; only the Ollama I/O and request coalescing are async.
+    """
+
+    def __init__(self, client=None, cache=None, tenant='anonymous', latency_budget=None,
+                 prompt_budget=None, chunk_size=None, replan_max_changes=None, replan_max_ratio=None):
+        super().__init__(cache=cache, tenant=tenant, latency_budget=latency_budget,
+                         prompt_budget=prompt_budget, chunk_size=chunk_size,
+                         replan_max_changes=replan_max_changes, replan_max_ratio=replan_max_ratio)
+        self.async_client = client or async_ollama
+
+    async def generate_brainstorm(self, context, task_type='general', cache_mode=CACHE_DEFAULT):
+        """Async counterpart of AIService.generate_brainstorm"""
+        payload = self._route('brainstorm', self._brainstorm_payload(context, task_type))
+        key = self.cache.make_key('brainstorm', payload['model'], payload)
+        # The response cache's disk tier is SQLite
+        cached = await off_loop(self._cache_lookup, key, cache_mode)
+        if cached is not None:
+            return cached
+        namespace = self._semantic_namespace(payload, task_type)
+
+        async def run():
+            vector = await self._aembed_context(context, cache_mode)
+            similar = await off_loop(self._semantic_lookup, namespace, vector, cache_mode)
+            if similar is not None:
+                return similar, 'SEMANTIC'
+            try:
+                suggestions = await self._abatched_brainstorm(payload, (context, task_type))
+                if suggestions is None:
+                    content = await self._agenerate(payload, 'brainstorm')
+                    suggestions = self._parse_suggestions(content)
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.exception("Error in async generate_brainstorm")
+                raise Exception(f"Failed to generate brainstorming suggestions: {str(e)}")
+            self._record_parse('brainstorm', key, bool(suggestions))
+            if suggestions:
+                await off_loop(self._cache_store, 'brainstorm', key, suggestions, cache_mode)
+            await off_loop(self._semantic_store, namespace, vector, suggestions)
+            return suggestions, None
+
+        # Identical requests in flight share one embedding, lookup and generation
+        suggestions, status = await async_inflight.do(key, run)
+        self.cache_status = status or self.cache_status
+        return suggestions
+
+    async def _abatched_brainstorm(self, payload, item):
+        """Async counterpart of AIService._batched_brainstorm"""
+        if not async_batcher.enabled:
+            return None
+        items = []
+
+        def build(take):
+            items.extend(take())
+            if len(items) == 1:
+                return payload
+            return dict(self._brainstorm_batch_payload(items), model=payload['model'])
+
+        async def run(take):
+            content = await self._agenerate(lambda: build(take), 'brainstorm')
+            if len(items) == 1:
+                return [self._parse_suggestions(content)]
+            return self._parse_batch_suggestions(content, len(items))
+
+        return await async_batcher.submit(payload['model'], item, run)
+
+    async def _aembed_context(self, context, cache_mode):
+        """Async counterpart of AIService._embed_context"""
+        if cache_mode == CACHE_BYPASS or not self.semantic_cache.enabled:
+            return None
+        try:
+            vectors = await self.async_client.embed([context], self.semantic_cache.model, self.semantic_cache.timeout)
+            return vectors[0]
+        except Exception as e:
+            self._embed_failed(e)
+            return None
+
+    async def generate_daily_plan(self, tasks, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """Async counterpart of AIService.generate_daily_plan"""
+        if not tasks:
+            return {
+                'suggestion': 'No tasks to plan. Add some tasks to get started!',
+                'tasks': []
+            }
+
+        shortcut = self._plan_shortcut(tasks, mode)
+        if shortcut is not None:
+            return shortcut
+        if mode == PLAN_ENRICH:
+            return await self._aenrich_plan(plan_day(tasks), cache_mode)
+
+        chunks, deferred = self._plan_chunks(tasks)
+        results = await asyncio.gather(*(self._atry_plan_chunk(chunk, cache_mode, mode) for chunk in chunks))
+        return self._merge_chunk_plans(tasks, chunks, results, deferred, cache_mode, mode)
+
+    async def replan_daily_plan(self, tasks, previous_plan, changes, cache_mode=CACHE_DEFAULT, mode=PLAN_AUTO):
+        """Async counterpart of AIService.replan_daily_plan"""
+        update = self._replan_scope(previous_plan, changes)
+        if update is None:
+            self.plan_update = 'full'
+            return await self.generate_daily_plan(tasks, cache_mode=cache_mode, mode=mode)
+        self.plan_update = 'incremental'
+
+        shortcut = self._replan_shortcut(update, mode)
+        if shortcut is not None:
+            return shortcut
+        if mode == PLAN_ENRICH:
+            enriched = await self._aenrich_plan({'suggestion': '', 'tasks': update['entries']}, cache_mode)
+            return self._replan_result(update, enriched['tasks'])
+        result = await self._atry_plan_chunk(update['chunk'], cache_mode, mode)
+        return self._merge_replan(update, result, cache_mode, mode)
+
+    async def _aplan_chunk(self, chunk, cache_mode):
+        """Async counterpart of AIService._plan_chunk"""
+        payload = self._route('plan', chunk['payload'])
+        key = self.cache.make_key('plan', payload['model'], payload)
+        if cache_mode == CACHE_DEFAULT:
+            cached = await off_loop(self.cache.get, key)
+            if cached is not None:
+                return cached, True
+
+        async def run():
+            try:
+                content = await self._agenerate(payload, 'plan')
+                plan = self._parse_plan_response(content)
+            except ValueError:
+                raise
+            except Exception as e:
+                logger.exception("Error in async generate_daily_plan")
+                raise Exception(f"Failed to generate daily plan: {str(e)}")
+            self._record_parse('plan', key, bool(plan['tasks']))
+            if plan['tasks']:
+                await off_loop(self._cache_store, 'plan', key, plan, cache_mode)
+            return plan
+
+        return await async_inflight.do(key, run), False
+
+    async def _atry_plan_chunk(self, chunk, cache_mode, mode):
+        """Async counterpart of AIService._try_plan_chunk"""
+        try:
+            return await self._aplan_chunk(chunk, cache_mode)
+        except Exception as e:
+            if mode != PLAN_AUTO:
+                raise
+            logger.warning("Plan chunk failed: %s", e)
+            return None, False
+
+    async def _aenrich_plan(self, plan, cache_mode):
+        """Async counterpart of AIService._enrich_plan"""
+        payload = self._route('enrich', self._enrich_payload(plan['tasks']))
+        key = self.cache.make_key('plan', payload['model'], payload)
+        details = await off_loop(self._cache_lookup, key, cache_mode)
+        if details is None:
+            async def run():
+                found = self._parse_json_response(await self._agenerate(payload, 'enrich'), 'enrich')
+                self._record_parse('enrich', key, bool(found))
+                if found:
+                    await off_loop(self._cache_store, 'plan', key, found, cache_mode)
+                return found
+
+            try:
+                details = await async_inflight.do(key, run)
+            except Exception:
+                logger.warning("Plan enrichment failed; returning deterministic plan", exc_info=True)
+                self.plan_mode = 'fast'
+                return plan
+        self.plan_mode = 'enrich'
+        return self._merge_enrichment(plan, details)
+
+    async def _agenerate(self, payload, operation):
+        """Run a generation through the scheduler and return the raw text
+
+        `payload` may also be a function returning it, called once a model
+        slot is held.
+        """
+        loop = asyncio.get_running_loop()
+        queued = loop.time()
+        await self.scheduler.acquire_async(self.tenant)
+        started = loop.time()
+        self.metrics.observe_stage(started - queued, operation, 'queue_wait')
+        service_time = None
+        try:
+            if callable(payload):
+                payload = payload()
+            response = await self.async_client.generate(payload)
+            if response.status_code != 200:
+                raise Exception(f"Ollama API returned status {response.status_code}")
+            data = response.json()
+            service_time = loop.time() - started
+            self._record_generation(payload, data, service_time, operation)
+            return data['response']
+        except OllamaUnavailableError:
+            raise
+        except httpx.TimeoutException:
+            self.metrics.timeouts.inc('ollama')
+            logger.exception("Ollama timed out")
+            raise ValueError("Ollama timed out while generating. Is the model running?")
+        except httpx.HTTPError as e:
+            logger.exception("Error connecting to Ollama")
+            raise ValueError(f"Failed to connect to Ollama. Make sure it's running: {str(e)}")
+        finally:
+            self.scheduler.release(service_time)
+
+
+# Loop-bound singletons used by the ASGI app
+async_ollama = AsyncOllamaClient(ollama)
+async_inflight = AsyncSingleFlight()
+async_batcher = AsyncMicroBatcher(micro_batcher)
@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+from app.services import tracing
+from app.services.metrics import metrics
+
+# A generation whose load_duration exceeds this had to load the model first
+COLD_LOAD_SECONDS = 0.5
+# Recent generations kept per kind for averages and percentiles
+WINDOW = 256
+NANOSECONDS = 1e9
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+class GenerationStats:
+    """Latency of Ollama generations, reported separately for cold and warm starts
+
+    Ollama includes `load_duration` in every final response; a generation
+    that had to load the model (first use, or after keep_alive expired) is
+    cold, everything else warm. Warm-up loads are tracked on their own so
+    they do not skew request latency.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {'cold': deque(maxlen=WINDOW), 'warm': deque(maxlen=WINDOW)}
+        self._counts = {'cold': 0, 'warm': 0}
+        self._warmup = None
+
+    def record(self, data, elapsed, operation='generate'):
+        """Record a finished generation
+
+        Args:
+            data (dict): Ollama's final response object (done=True)
+            elapsed (float): Wall-clock seconds the request took
+            operation (str): brainstorm, plan or enrich
+        """
+        load = (data.get('load_duration') or 0) / NANOSECONDS
+        kind = 'cold' if load >= COLD_LOAD_SECONDS else 'warm'
+        span_id = metrics.observe_stage(elapsed, operation, 'generation', start=kind)
+        if span_id is not None:
+            self._trace_phases(data, elapsed, span_id)
+        metrics.observe_generation(operation, kind, data)
+        sample = (elapsed, load, data.get('prompt_eval_count') or 0)
+        with self._lock:
+            self._samples[kind].append(sample)
+            self._counts[kind] += 1
+
+    @staticmethod
+    def _trace_phases(data, elapsed, parent):
+        """Split a generation span by Ollama's own timings
+
+        load, prompt eval and eval run back to back at the end of the call;
+        what precedes them (connection setup, request transfer, waiting in
+        Ollama's queue) is reported as transport.
+        """
+        end = time.perf_counter()
+        for name, duration_key, count_key in (
+            ('eval', 'eval_duration', 'eval_count'),
+            ('prompt_eval', 'prompt_eval_duration', 'prompt_eval_count'),
+            ('load', 'load_duration', None)
+        ):
+            seconds = (data.get(duration_key) or 0) / NANOSECONDS
+            attrs = {'tokens': data.get(count_key) or 0} if count_key else {}
+            tracing.add_span(f'ollama.{name}', seconds, end=end, parent=parent, **attrs)
+            end -= seconds
+        total = (data.get('total_duration') or 0) / NANOSECONDS
+        if total:
+            tracing.add_span('ollama.transport', max(elapsed - total, 0.0), end=end, parent=parent)
+
+    def record_warmup(self, elapsed, ok, error=None):
+        with self._lock:
+            self._warmup = {
+                'ok': ok,
+                'at': time.time(),
+                'seconds': round(elapsed, 3),
+                'error': error
+            }
+
+    def stats(self):
+        with self._lock:
+            result = {'warmup': dict(self._warmup) if self._warmup else None}
+            for kind, samples in self._samples.items():
+                entry = {'count': self._counts[kind]}
+                if samples:
+                    latencies = [sample[0] for sample in samples]
+                    entry.update({
+                        'avg_ms': round(sum(latencies) / len(samples) * 1000, 1),
+                        'p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+                        'avg_load_ms': round(sum(sample[1] for sample in samples) / len(samples) * 1000, 1),
+                        # Tokens Ollama actually evaluated; a reused KV prefix is not counted
+                        'avg_prompt_eval_tokens': round(sum(sample[2] for sample in samples) / len(samples), 1)
+                    })
+                result[kind] = entry
+            return result
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+import requests
+from app.services import tracing
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaUnavailableError(ValueError):
+    """Raised instead of calling Ollama while the circuit breaker is open"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker guarding calls to Ollama
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    calls fail fast for `reset_timeout` seconds. It then lets a single
+    trial call through (half-open); success closes it, failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+
+    def configure(self, failure_threshold, reset_timeout):
+        with self._lock:
+            self.failure_threshold = failure_threshold
+            self.reset_timeout = reset_timeout
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def before_call(self):
+        """Raise OllamaUnavailableError unless a call may proceed"""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            if state == self.OPEN:
+                retry_after = self.reset_timeout - (time.monotonic() - self._opened_at)
+            else:
+                retry_after = 1.0
+        raise OllamaUnavailableError(
+            "Ollama is unavailable. Start ollama serve and retry shortly.",
+            retry_after=max(retry_after, 1.0)
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Ollama circuit closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != self.OPEN:
+                    logger.warning("Ollama circuit opened", extra={"failures": self._failures})
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'state': self._current_state(),
+                'consecutive_failures': self._failures
+            }
+
+
+class OllamaHealthMonitor:
+    """Background prober that caches Ollama's health
+
+    A daemon thread hits /api/tags on every backend each
+    `OLLAMA_HEALTH_INTERVAL` seconds and feeds the results into the
+    backends' circuit breakers, so health checks and AI routes read cached
+    state instead of doing network I/O. Ollama counts as running while any
+    backend is.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.interval = 10.0
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._state = {
+            'running': False,
+            'checked_at': None,
+            'latency_ms': None,
+            'error': None
+        }
+        self._stop = threading.Event()
+        self._thread = None
+        self._recovery_listeners = []
+
+    def init_app(self, app):
+        self.interval = max(app.config['OLLAMA_HEALTH_INTERVAL'], 1.0)
+        app.extensions['ollama_health'] = self
+        self.enabled = app.config['OLLAMA_HEALTH_MONITOR']
+        if self.enabled:
+            self.start()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='ollama-health', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """Stop probing; with a `timeout`, wait up to that long for a probe
+        in progress to finish. Returns whether the thread has exited."""
+        self._stop.set()
+        if self._thread is None:
+            return True
+        if timeout is not None:
+            self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    def add_recovery_listener(self, listener):
+        """Call `listener(backend)` whenever a probe finds a backend up after it was down
+
+        The first successful probe counts, so listeners also run at startup.
+        """
+        if listener not in self._recovery_listeners:
+            self._recovery_listeners.append(listener)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Logged like a slow request when a round of probes is slow
+            with tracing.trace('ollama_probe'):
+                self.probe()
+            self._stop.wait(self.interval)
+
+    def probe(self):
+        """Probe every backend once and update the cached state"""
+        recovered, errors, latencies = [], [], []
+        for backend in self.client.backends:
+            running, latency_ms, error = self._probe_backend(backend)
+            if backend.record_probe(running, latency_ms, error):
+                recovered.append(backend)
+            if running:
+                latencies.append(latency_ms)
+            else:
+                errors.append(f"{backend.url}: {error}")
+
+        running = bool(latencies)
+        with self._lock:
+            self._state = {
+                'running': running,
+                'checked_at': time.time(),
+                'latency_ms': min(latencies) if running else None,
+                'error': None if running else '; '.join(errors)
+            }
+
+        for backend in recovered:
+            for listener in list(self._recovery_listeners):
+                try:
+                    listener(backend)
+                except Exception:
+                    logger.exception("Ollama recovery listener failed")
+        return running
+
+    def _probe_backend(self, backend):
+        started = time.perf_counter()
+        running, error = False, None
+        try:
+            response = self.client.tags(backend)
+            running = response.status_code == 200
+            if not running:
+                error = f"status {response.status_code}"
+        except requests.exceptions.RequestException as exc:
+            error = str(exc)
+        elapsed = time.perf_counter() - started
+        metrics.probe_duration.observe(elapsed)
+        return running, round(elapsed * 1000, 1), error
+
+    def snapshot(self):
+        """Return the cached health state (no network I/O)"""
+        with self._lock:
+            state = dict(self._state)
+        state['circuit'] = self.client.circuit_snapshot()
+        return state
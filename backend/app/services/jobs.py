@@ -0,0 +1,260 @@
+"""
+Background jobs for long AI requests
+
+With `?async=1` an AI route answers 202 with a job id at once and the
+generation runs on a bounded thread pool in the process that accepted it,
+so no HTTP connection is held open while the model works. Job state and
+results are kept in SQLite, so any worker process can answer
+`GET /api/jobs/<id>`; finished jobs are kept for `JOB_RESULT_TTL` seconds.
+
+A submission carrying an `Idempotency-Key` that the client already used
+gets the existing job back instead of starting a second generation, so
+retrying after a dropped connection is safe.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from app.services import tracing
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+MAX_IDEMPOTENCY_KEY_LENGTH = 200
+
+
+class JobQueueFullError(Exception):
+    """Raised when JOB_MAX_PENDING jobs are already waiting or running"""
+
+    def __init__(self, message, retry_after=1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class IdempotencyConflictError(ValueError):
+    """Raised when an Idempotency-Key is reused for a different request"""
+
+
+def request_fingerprint(*parts):
+    """Stable hash of what a submission asked for, to compare idempotent retries"""
+    material = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class JobStore:
+    """Runs submitted work in the background and records its outcome
+
+    Work is a callable returning `(status, body, headers)`, like the
+    routes' own responses, so a job's result reads exactly as the
+    synchronous response would have.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.max_pending = 34
+        self.result_ttl = 600
+        self.timeout = 300
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._closed = False
+        self._pending = 0
+        self._stats = {'submitted': 0, 'deduplicated': 0, 'rejected': 0, 'succeeded': 0, 'failed': 0}
+
+    def init_app(self, app):
+        self.path = app.config['JOB_STORE_PATH']
+        # Enough threads for every model slot and scheduler queue place, so
+        # jobs wait in the scheduler's fair queue rather than in the pool's
+        self.max_pending = app.config['JOB_MAX_PENDING'] or (
+            app.config['LLM_MAX_CONCURRENCY'] + app.config['LLM_MAX_QUEUE']
+        )
+        self.result_ttl = app.config['JOB_RESULT_TTL']
+        self.timeout = app.config['JOB_TIMEOUT']
+        self.app = app
+        self._init_db()
+        app.extensions['jobs'] = self
+
+    # A short-lived connection per operation, as in the task store, keeps
+    # this safe across threads and worker processes.
+
+    @contextmanager
+    def _connect(self):
+        if self.path is None:
+            raise RuntimeError("JobStore used before init_app()")
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, tenant TEXT NOT NULL, idempotency_key TEXT, "
+                "fingerprint TEXT, status TEXT NOT NULL, status_code INTEGER, body TEXT, headers TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_idempotency ON jobs (tenant, idempotency_key) "
+                "WHERE idempotency_key IS NOT NULL"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_expires ON jobs (expires_at)")
+
+    def _pool(self):
+        # Created lazily and per process: threads do not survive a fork
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("JobStore has been shut down")
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_pending, thread_name_prefix='job')
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def submit(self, kind, tenant, work, idempotency_key=None, fingerprint=None):
+        """Start `work` in the background, or find the job for a reused key
+
+        Returns:
+            tuple: (job dict, True if this call created the job)
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            if idempotency_key:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE tenant = ? AND idempotency_key = ?", (tenant, idempotency_key)
+                ).fetchone()
+                if row is not None:
+                    if row['fingerprint'] != fingerprint:
+                        raise IdempotencyConflictError('Idempotency-Key was already used for a different request')
+                    with self._lock:
+                        self._stats['deduplicated'] += 1
+                    return self._describe(row, now), False
+            with self._lock:
+                if self._pending >= self.max_pending:
+                    self._stats['rejected'] += 1
+                    raise JobQueueFullError("Too many background jobs. Retry shortly.")
+                self._pending += 1
+                self._stats['submitted'] += 1
+            job_id = uuid.uuid4().hex
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, kind, tenant, idempotency_key, fingerprint, status, "
+                    "created_at, updated_at, expires_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, kind, tenant, idempotency_key, fingerprint, QUEUED, now, now,
+                     now + self.timeout + self.result_ttl)
+                )
+            except BaseException:
+                self._release()
+                raise
+        try:
+            self._pool().submit(self._run, job_id, kind, work, tracing.current_request_id())
+        except Exception:
+            # e.g. the pool was shut down for a drain: the job will never run
+            self._release()
+            self._update(job_id, FAILED, 503, {'error': 'The server is shutting down. Please submit the job again.'})
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise JobQueueFullError("The server is not accepting background jobs. Retry shortly.")
+        return self.get(job_id, tenant), True
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _run(self, job_id, kind, work, request_id):
+        try:
+            self._update(job_id, RUNNING)
+            # Traced and logged under the submitting request's ID
+            with self.app.app_context(), tracing.trace(f'job {kind}', request_id, job=job_id):
+                try:
+                    status, body, headers = work()
+                except Exception:
+                    logger.exception("Background job failed", extra={"job": job_id})
+                    status, body, headers = 500, {'error': 'The job failed. Please try again.'}, {}
+            outcome = SUCCEEDED if status < 400 else FAILED
+            self._update(job_id, outcome, status, body, headers)
+            with self._lock:
+                self._stats[outcome] += 1
+        finally:
+            self._release()
+
+    def _update(self, job_id, status, status_code=None, body=None, headers=None):
+        now = time.time()
+        finished = status in (SUCCEEDED, FAILED)
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, status_code = ?, body = ?, headers = ?, updated_at = ?, "
+                "expires_at = ? WHERE id = ?",
+                (status, status_code,
+                 json.dumps(body) if finished else None,
+                 json.dumps(headers or {}) if finished else None,
+                 now, now + (self.result_ttl if finished else self.timeout + self.result_ttl), job_id)
+            )
+
+    def get(self, job_id, tenant):
+        """The job's state and, once finished, its result; None when unknown,
+        expired or submitted by another tenant"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE id = ? AND tenant = ? AND expires_at > ?", (job_id, tenant, now)
+            ).fetchone()
+        return self._describe(row, now) if row is not None else None
+
+    def _describe(self, row, now):
+        status, updated_at = row['status'], row['updated_at']
+        job = {'id': row['id'], 'kind': row['kind'], 'status': status,
+               'createdAt': row['created_at'], 'updatedAt': updated_at}
+        if status in (QUEUED, RUNNING) and now - updated_at > self.timeout:
+            # The process running it went away (restart, crash)
+            job.update(status=FAILED, statusCode=500, error='The job was interrupted. Please submit it again.')
+            return job
+        if status in (SUCCEEDED, FAILED):
+            body = json.loads(row['body'])
+            job['statusCode'] = row['status_code']
+            job['headers'] = json.loads(row['headers'])
+            if status == SUCCEEDED:
+                job['result'] = body
+            else:
+                job['error'] = body.get('error') if isinstance(body, dict) else None
+        return job
+
+    def shutdown(self, wait=True):
+        """Stop taking jobs; with `wait`, let the running ones finish"""
+        with self._lock:
+            self._closed = True
+            executor, self._executor = self._executor, None
+        if executor is not None and self._executor_pid == os.getpid():
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['pending'] = self._pending
+        stats['max_pending'] = self.max_pending
+        return stats
@@ -0,0 +1,259 @@
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+_CLOSERS = {'[': ']', '{': '}'}
+_SIGNIFICANT = re.compile(r'[\[\]{}"\\]')
+_STRING_SPECIAL = re.compile(r'["\\\n]')
+_DECODER = json.JSONDecoder()
+
+
+def _is_ident(ch):
+    return ch.isalnum() or ch in '_$'
+
+
+def repair_json(text):
+    """Fix the defects models commonly emit in an otherwise valid document
+
+    One pass over `text`, which should start at its opening bracket:
+    bare object keys are quoted, trailing commas dropped, mismatched
+    closers corrected and raw newlines in strings escaped. If the document
+    is truncated, it is cut back to the last complete value and the open
+    containers are closed, so a half-written last item is dropped rather
+    than guessed. The result may still be invalid JSON.
+    """
+    out = []
+    stack = []
+    in_string = escape = is_key = expect_key = pending_comma = False
+    # (output length, open containers) right after the last complete value
+    cut = None
+    i, n = 0, len(text)
+    while i < n:
+        if in_string and not escape:
+            # Copy plain string content up to the next quote, escape or newline
+            match = _STRING_SPECIAL.search(text, i)
+            stop = match.start() if match else n
+            out.append(text[i:stop])
+            i = stop
+            if i == n:
+                break
+        ch = text[i]
+        i += 1
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if not is_key:
+                    out.append(ch)
+                    cut = (len(out), tuple(stack))
+                    continue
+            elif ch == '\n':
+                ch = '\\n'
+            out.append(ch)
+            continue
+
+        if ch in ' \t\r\n':
+            out.append(ch)
+        elif ch in ']}':
+            pending_comma = expect_key = False
+            if not stack:
+                break
+            out.append(_CLOSERS[stack.pop()])
+            cut = (len(out), tuple(stack))
+            if not stack:
+                break
+        elif ch == ',':
+            if not pending_comma:
+                cut = (len(out), tuple(stack))
+            pending_comma = True
+            expect_key = bool(stack) and stack[-1] == '{'
+        else:
+            if pending_comma:
+                out.append(',')
+                pending_comma = False
+            if ch == '"':
+                in_string = True
+                is_key = expect_key
+                expect_key = False
+                out.append(ch)
+            elif ch in '[{':
+                stack.append(ch)
+                expect_key = ch == '{'
+                out.append(ch)
+            elif expect_key and _is_ident(ch):
+                start = i - 1
+                while i < n and _is_ident(text[i]):
+                    i += 1
+                out.append(f'"{text[start:i]}"')
+                expect_key = False
+            else:
+                expect_key = False
+                out.append(ch)
+
+    if (stack or in_string) and cut is not None:
+        length, still_open = cut
+        return ''.join(out[:length]) + ''.join(_CLOSERS[c] for c in reversed(still_open))
+    return ''.join(out)
+
+
+def _loads(text):
+    """json.loads, retrying once on the repaired text; None if both fail"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(repair_json(text))
+    except json.JSONDecodeError:
+        return None
+
+
+class JSONItemStream:
+    """Incrementally extract JSON from model output in a single pass.
+
+    Chunks are fed as the model produces them. Every object whose parent
+    container is an array is returned as soon as its closing brace arrives;
+    only the outermost such objects are emitted, so nested lists stay inside
+    the item they belong to. The spans of top-level arrays and objects are
+    recorded along the way, so `value()` can pick out the whole document
+    afterwards without rescanning or guessing with a regex.
+    """
+
+    def __init__(self, emit_items=True):
+        # False when only value() is wanted, skipping per-item parsing
+        self.emit_items = emit_items
+        self._chunks = []
+        self._offset = 0
+        self._stack = []
+        self._in_string = False
+        # Absolute position of the character escaped by a trailing backslash
+        self._escaped = -1
+        self._item_parts = None
+        self._item_depth = None
+        # (start, opener) of the open top-level container, and closed spans
+        self._top = None
+        self._spans = []
+
+    @property
+    def text(self):
+        """Everything fed so far"""
+        return ''.join(self._chunks)
+
+    def feed(self, chunk):
+        """Consume a chunk and return the list of objects completed by it"""
+        items = []
+        if not chunk:
+            return items
+        self._chunks.append(chunk)
+        # Where the open item starts within this chunk (0 if it started earlier)
+        item_start = 0
+
+        # Only brackets, quotes and backslashes matter; jump between them
+        for match in _SIGNIFICANT.finditer(chunk):
+            index = match.start()
+            position = self._offset + index
+            if position == self._escaped:
+                continue
+            ch = chunk[index]
+
+            if self._in_string:
+                if ch == '\\':
+                    self._escaped = position + 1
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"':
+                # Quotes in prose before the JSON starts are not strings
+                if self._stack:
+                    self._in_string = True
+            elif ch in '[{':
+                if not self._stack:
+                    self._top = (position, ch)
+                if (ch == '{' and self.emit_items and self._item_parts is None
+                        and self._stack and self._stack[-1] == '['):
+                    self._item_parts = []
+                    self._item_depth = len(self._stack)
+                    item_start = index
+                self._stack.append(ch)
+            elif ch in ']}':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    self._spans.append((self._top[0], position + 1, self._top[1]))
+                    self._top = None
+                if ch == '}' and self._item_parts is not None and len(self._stack) == self._item_depth:
+                    self._item_parts.append(chunk[item_start:index + 1])
+                    raw = ''.join(self._item_parts)
+                    self._item_parts = None
+                    self._item_depth = None
+                    item = _loads(raw)
+                    if item is not None:
+                        items.append(item)
+                    else:
+                        logger.debug("Skipping unparseable streamed item", extra={"raw": raw[:200]})
+
+        if self._item_parts is not None:
+            self._item_parts.append(chunk[item_start:])
+        self._offset += len(chunk)
+        return items
+
+    def value(self, expect=list, validate=None):
+        """The first usable top-level JSON value of type `expect`
+
+        Candidates are the top-level bracketed spans in order, plus a final
+        unterminated one when the output was truncated. Each is parsed as is
+        and then repaired. With `validate`, a candidate's validated form is
+        returned and candidates it rejects (falsy result) are skipped, so a
+        bracketed aside in the model's prose cannot shadow the real answer.
+
+        Returns:
+            The parsed (and validated) value, or None
+        """
+        opener = '[' if expect is list else '{'
+        spans = list(self._spans)
+        if self._top is not None:
+            spans.append((self._top[0], self._offset, self._top[1]))
+
+        text = self.text
+        for start, end, kind in spans:
+            if kind != opener:
+                continue
+            data = _loads(text[start:end])
+            if not isinstance(data, expect):
+                continue
+            result = validate(data) if validate else data
+            if result:
+                return result
+        return None
+
+
+def extract_json(text, expect=list, validate=None):
+    """Extract a JSON value from complete model output, see JSONItemStream.value
+
+    Well-formed output (bare, fenced or wrapped in prose) is decoded
+    straight from its first opening bracket; anything else goes through
+    the single-pass scan and repair.
+    """
+    text = text or ''
+    start = text.find('[' if expect is list else '{')
+    if start < 0:
+        return None
+    try:
+        data, _ = _DECODER.raw_decode(text, start)
+    except json.JSONDecodeError:
+        data = None
+    if isinstance(data, expect):
+        result = validate(data) if validate else data
+        if result:
+            return result
+
+    stream = JSONItemStream(emit_items=False)
+    stream.feed(text)
+    return stream.value(expect, validate)
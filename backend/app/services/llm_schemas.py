@@ -0,0 +1,144 @@
+"""
+Shapes of the JSON the models are asked to return
+
+The JSON Schemas are sent as Ollama's `format` so generation is constrained
+to them. Parsed model output is still normalized here before it reaches
+clients or the cache: required fields are enforced, enums and clock times
+normalized, unknown fields dropped and entries that cannot be used discarded.
+"""
+import re
+
+PRIORITIES = ('high', 'medium', 'low')
+
+_STRING = {"type": "string"}
+_STRING_LIST = {"type": "array", "items": _STRING}
+
+SUGGESTIONS_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "title": _STRING,
+            "description": _STRING,
+            "priority": {"type": "string", "enum": list(PRIORITIES)}
+        },
+        "required": ["title", "description", "priority"]
+    }
+}
+
+PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "suggestion": _STRING,
+        "tasks": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "title": _STRING,
+                    "reason": _STRING,
+                    "timeEstimate": _STRING,
+                    "startTime": _STRING,
+                    "endTime": _STRING,
+                    "subtasks": _STRING_LIST
+                },
+                "required": ["title", "reason", "timeEstimate", "startTime", "endTime", "subtasks"]
+            }
+        }
+    },
+    "required": ["suggestion", "tasks"]
+}
+
+ENRICH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "index": {"type": "integer"},
+            "reason": _STRING,
+            "subtasks": _STRING_LIST
+        },
+        "required": ["index", "reason", "subtasks"]
+    }
+}
+
+
+def keyed_schema(schema, count):
+    """Object schema holding one `schema` value per key, "1" to str(count)"""
+    keys = [str(n) for n in range(1, count + 1)]
+    return {"type": "object", "properties": {key: schema for key in keys}, "required": keys}
+
+
+_CLOCK_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*([AaPp]\.?[Mm]\.?)?')
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) else ''
+
+
+def clock(value):
+    """Normalize '9:00', '09:00' or '2:30 PM' to 'HH:MM'; '' if unusable"""
+    match = _CLOCK_RE.match(value) if isinstance(value, str) else None
+    if not match:
+        return ''
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    meridiem = (match.group(3) or '').lower()
+    if meridiem.startswith('p') and hours < 12:
+        hours += 12
+    elif meridiem.startswith('a') and hours == 12:
+        hours = 0
+    if hours > 23 or minutes > 59:
+        return ''
+    return f"{hours:02d}:{minutes:02d}"
+
+
+def clean_suggestion(item):
+    """A brainstorm suggestion, or None when it has no title"""
+    if not isinstance(item, dict):
+        return None
+    title = _text(item.get('title'))
+    if not title:
+        return None
+    priority = _text(item.get('priority')).lower()
+    return {
+        'title': title,
+        'description': _text(item.get('description')),
+        'priority': priority if priority in PRIORITIES else 'medium'
+    }
+
+
+def clean_suggestions(items):
+    if not isinstance(items, list):
+        return []
+    return [suggestion for suggestion in map(clean_suggestion, items) if suggestion is not None]
+
+
+def clean_plan_task(item):
+    """A scheduled plan entry, or None when it has no title"""
+    if not isinstance(item, dict):
+        return None
+    title = _text(item.get('title'))
+    if not title:
+        return None
+    subtasks = item.get('subtasks')
+    return {
+        'title': title,
+        'reason': _text(item.get('reason')),
+        'timeEstimate': _text(item.get('timeEstimate')),
+        'startTime': clock(item.get('startTime')),
+        'endTime': clock(item.get('endTime')),
+        'subtasks': [step.strip() for step in subtasks if isinstance(step, str) and step.strip()]
+        if isinstance(subtasks, list) else []
+    }
+
+
+def clean_plan(data):
+    """A daily plan, or None when `data` does not look like one"""
+    if not isinstance(data, dict) or not ('tasks' in data or 'suggestion' in data):
+        return None
+    tasks = data.get('tasks')
+    return {
+        'suggestion': _text(data.get('suggestion')),
+        'tasks': [task for task in map(clean_plan_task, tasks) if task is not None]
+        if isinstance(tasks, list) else []
+    }
@@ -0,0 +1,246 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format
+
+Each metric keeps its series in a dict keyed by label values behind its own
+lock; an observation is a dict lookup, a bisect and a few additions, cheap
+enough to leave on in production. Values are per process, so scrape every
+worker (or run a single one) when using several.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from app.services import tracing
+
+# Seconds; covers validation (sub-millisecond) up to slow generations
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+NANOSECONDS = 1e9
+# Cosine similarity of semantic cache lookups; finer near typical thresholds
+SIMILARITY_BUCKETS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.92, 0.94, 0.96, 0.98, 0.99, 1.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for values, state in sorted(series):
+            lines.extend(self._render_series(values, state))
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def _render_series(self, values, total):
+        return [f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}"]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._series[labels] = value
+
+    def _render_series(self, values, value):
+        return [f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._series.get(labels)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def _render_series(self, values, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+        labels = _format_labels(self.labels, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """A set of metrics plus collectors that report other components' state at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, documentation, labels=()):
+        return self._register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self._register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labels, buckets))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register `collector()`, returning {(name, kind, documentation): value}
+
+        Collectors expose counters and gauges other components already keep,
+        and only run when metrics are scraped.
+        """
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for (name, kind, documentation), value in collector().items():
+                lines.extend([
+                    f"# HELP {name} {documentation}",
+                    f"# TYPE {name} {kind}",
+                    f"{name} {_format_value(value)}"
+                ])
+        return '\n'.join(lines) + '\n'
+
+
+class AppMetrics(MetricsRegistry):
+    """The Task Manager API's metrics"""
+
+    def __init__(self):
+        super().__init__()
+        self.request_duration = self.histogram(
+            'taskmgr_request_duration_seconds',
+            'HTTP request latency (time to first byte for streams)', ('route', 'method'))
+        self.responses = self.counter(
+            'taskmgr_responses_total', 'HTTP responses by status', ('route', 'status'))
+        self.rate_limited = self.counter(
+            'taskmgr_rate_limited_total', 'Requests rejected with 429', ('route',))
+        self.unavailable = self.counter(
+            'taskmgr_unavailable_total', 'Requests answered with 503', ('route',))
+        self.stage_duration = self.histogram(
+            'taskmgr_stage_duration_seconds',
+            'Time spent per stage: validation, queue_wait, generation, parse', ('operation', 'stage'))
+        self.probe_duration = self.histogram(
+            'taskmgr_ollama_probe_duration_seconds', 'Background Ollama health probe latency')
+        self.parse_failures = self.counter(
+            'taskmgr_parse_failures_total', 'Generations with no usable output', ('operation',))
+        self.timeouts = self.counter(
+            'taskmgr_timeouts_total', 'Ollama read timeouts and scheduler queue timeouts', ('kind',))
+        self.generations = self.counter(
+            'taskmgr_ollama_generations_total', 'Finished Ollama generations', ('operation', 'start'))
+        self.eval_tokens = self.counter(
+            'taskmgr_ollama_eval_tokens_total', 'Tokens generated (eval_count)')
+        self.eval_seconds = self.counter(
+            'taskmgr_ollama_eval_seconds_total', 'Time spent generating tokens (eval_duration)')
+        self.prompt_tokens = self.counter(
+            'taskmgr_ollama_prompt_eval_tokens_total', 'Prompt tokens evaluated (prompt_eval_count)')
+        self.prompt_seconds = self.counter(
+            'taskmgr_ollama_prompt_eval_seconds_total', 'Time spent evaluating prompts (prompt_eval_duration)')
+        self.load_seconds = self.counter(
+            'taskmgr_ollama_load_seconds_total', 'Time spent loading the model (load_duration)')
+        self.semantic_similarity = self.histogram(
+            'taskmgr_semantic_cache_similarity', 'Best cosine similarity found per semantic cache lookup',
+            ('result',), buckets=SIMILARITY_BUCKETS)
+        self.model_routes = self.counter(
+            'taskmgr_model_routes_total',
+            'Model routing decisions per tier; reason is rule, or queue / latency for SLO downgrades',
+            ('operation', 'tier', 'reason'))
+        self.eval_rate = self.gauge(
+            'taskmgr_ollama_eval_tokens_per_second', 'Generation speed of the most recent generation')
+
+    @contextmanager
+    def stage(self, operation, name):
+        """Context manager timing one request stage, also as a trace span"""
+        with tracing.span(f'{operation}.{name}'), self.stage_duration.time(operation, name):
+            yield
+
+    def timed_stage(self, operation, name):
+        """Decorator timing every call of a function as a request stage"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(operation, name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe_stage(self, seconds, operation, name, **attrs):
+        """Record a stage timed by the caller; returns its trace span id"""
+        self.stage_duration.observe(seconds, operation, name)
+        return tracing.add_span(f'{operation}.{name}', seconds, **attrs)
+
+    def observe_generation(self, operation, start, data):
+        """Record throughput from Ollama's final response object"""
+        self.generations.inc(operation, start)
+        eval_count = data.get('eval_count') or 0
+        eval_duration = (data.get('eval_duration') or 0) / NANOSECONDS
+        self.eval_tokens.inc(amount=eval_count)
+        self.eval_seconds.inc(amount=eval_duration)
+        self.prompt_tokens.inc(amount=data.get('prompt_eval_count') or 0)
+        self.prompt_seconds.inc(amount=(data.get('prompt_eval_duration') or 0) / NANOSECONDS)
+        self.load_seconds.inc(amount=(data.get('load_duration') or 0) / NANOSECONDS)
+        if eval_count and eval_duration:
+            self.eval_rate.set(round(eval_count / eval_duration, 2))
+
+
+# Process-wide registry; imported directly by services that extensions.py
+# itself depends on (scheduler, health monitor)
+metrics = AppMetrics()
@@ -0,0 +1,191 @@
+"""
+Micro-batching of concurrent brainstorm generations
+
+Under bursty load, many small brainstorms each pay for a scheduler slot, an
+HTTP round trip and a prompt evaluation on Ollama. With
+`MICROBATCH_ENABLED`, a brainstorm that finds every model slot busy opens
+a batch: it waits up to `MICROBATCH_WINDOW_MS` for others routed to the
+same model, up to `MICROBATCH_MAX_SIZE` in all, and the batch stays open
+while it waits for a slot, so the requests queued behind it join. The group
+then runs as one generation that answers every context under its own key,
+and each caller takes its part. While a slot is free, brainstorms run
+alone and at once: parallel slots already serve them without the longer
+decode of a shared answer.
+
+A caller whose part is missing or unusable generates on its own, so
+batching changes how a result is produced, not what a request can get back.
+"""
+import asyncio
+import threading
+from app.services import tracing
+
+
+class _Batch:
+    def __init__(self):
+        self.items = []
+        self.closed = False
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Groups concurrent calls that share a key into one execution
+
+    Unlike SingleFlight, the grouped calls differ. The leader (the first
+    caller) waits for the window to pass or the batch to fill, unless the
+    scheduler has a free slot, then calls `run(take)` once for all of them;
+    `take()` closes the batch and returns its items, so `run` decides how
+    long it stays open. `run` returns one result per item, None for an item
+    its caller should produce alone. Errors reach every caller.
+    """
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.enabled = False
+        self.window = 0.01
+        self.max_size = 4
+        self._lock = threading.Lock()
+        self._open = {}
+        self._stats = {'batches': 0, 'batched': 0, 'solo': 0, 'fallbacks': 0, 'largest': 0}
+
+    def init_app(self, app):
+        self.max_size = max(app.config['MICROBATCH_MAX_SIZE'], 1)
+        self.enabled = app.config['MICROBATCH_ENABLED'] and self.max_size > 1
+        self.window = app.config['MICROBATCH_WINDOW_MS'] / 1000.0
+        app.extensions['micro_batcher'] = self
+
+    def submit(self, key, item, run):
+        """This item's result from a shared execution, or None to run it alone"""
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch()
+            index = len(batch.items)
+            batch.items.append(item)
+            if len(batch.items) >= self.max_size:
+                self._close(key, batch)
+
+        if not leader:
+            with tracing.span('micro_batch.wait', position=index):
+                batch.done.wait()
+            if batch.error is not None:
+                raise batch.error
+            return batch.results[index] if batch.results is not None else None
+
+        if self.scheduler.saturated():
+            with tracing.span('micro_batch.window'):
+                batch.full.wait(self.window)
+        try:
+            batch.results = run(lambda: self._take(key, batch))
+            return batch.results[0]
+        except Exception as e:
+            batch.error = e
+            raise
+        finally:
+            # Closed even when `run` failed before taking the items
+            self.record(len(self._take(key, batch)), batch.results)
+            batch.done.set()
+
+    def _take(self, key, batch):
+        with self._lock:
+            self._close(key, batch)
+            return list(batch.items)
+
+    def _close(self, key, batch):
+        # Called with the lock held
+        if not batch.closed:
+            batch.closed = True
+            if self._open.get(key) is batch:
+                del self._open[key]
+            batch.full.set()
+
+    def record(self, size, results):
+        with self._lock:
+            if size == 1:
+                self._stats['solo'] += 1
+                return
+            self._stats['batches'] += 1
+            self._stats['batched'] += size
+            self._stats['largest'] = max(self._stats['largest'], size)
+            if results is not None:
+                self._stats['fallbacks'] += sum(result is None for result in results)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['open'] = len(self._open)
+        stats['average_size'] = round(stats['batched'] / stats['batches'], 2) if stats['batches'] else 0.0
+        stats['enabled'] = self.enabled
+        stats['window_ms'] = round(self.window * 1000, 3)
+        stats['max_size'] = self.max_size
+        return stats
+
+
+class AsyncMicroBatcher:
+    """asyncio counterpart of MicroBatcher for the ASGI serving mode
+
+    Takes its settings from, and records into, the sync batcher. Must only
+    be used from a single event loop.
+    """
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+        self._open = {}
+
+    @property
+    def enabled(self):
+        return self.batcher.enabled
+
+    async def submit(self, key, item, run):
+        """Async counterpart of MicroBatcher.submit; `run` is a coroutine function"""
+        batch = self._open.get(key)
+        if batch is not None:
+            index = len(batch['items'])
+            batch['items'].append(item)
+            if len(batch['items']) >= self.batcher.max_size:
+                self._close(key, batch)
+            with tracing.span('micro_batch.wait', position=index):
+                results = await asyncio.shield(batch['future'])
+            return results[index]
+
+        loop = asyncio.get_running_loop()
+        batch = self._open[key] = {'items': [item], 'full': asyncio.Event(), 'future': loop.create_future()}
+        future = batch['future']
+        results = None
+        try:
+            if self.batcher.scheduler.saturated():
+                with tracing.span('micro_batch.window'):
+                    try:
+                        await asyncio.wait_for(batch['full'].wait(), self.batcher.window)
+                    except asyncio.TimeoutError:
+                        pass
+            results = await run(lambda: self._take(key, batch))
+            future.set_result(results)
+            return results[0]
+        except asyncio.CancelledError:
+            # The others generate on their own rather than wait forever
+            self._close(key, batch)
+            if not future.done():
+                results = [None] * len(batch['items'])
+                future.set_result(results)
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieve it so an un-awaited future does not log a warning
+            future.exception()
+            raise
+        finally:
+            self._close(key, batch)
+            self.batcher.record(len(batch['items']), results)
+
+    def _take(self, key, batch):
+        self._close(key, batch)
+        return list(batch['items'])
+
+    def _close(self, key, batch):
+        if self._open.get(key) is batch:
+            del self._open[key]
+        batch['full'].set()
@@ -0,0 +1,165 @@
+"""
+Model routing by operation, payload size and latency SLO
+
+`MODEL_TIERS` names the models to use, largest first
+(`large=llama3.1:8b,small=llama3.2:3b`). `MODEL_ROUTES` sends each
+generation to a tier by operation (brainstorm, plan, enrich) and estimated
+tokens (prompt plus output cap, as charged to AI_TOKEN_BUDGET): rules are
+`operation[:max_tokens]=tier`, `*` matches any operation, and the first
+matching rule wins. A generation no rule matches uses the first tier.
+Without tiers everything runs on OLLAMA_MODEL.
+
+With an SLO set, routing adapts to load. While the scheduler queue holds
+`MODEL_SLO_QUEUE` requests or more, generations move one tier down; a tier
+whose p95 generation time over the last `MODEL_SLO_WINDOW` seconds exceeds
+`MODEL_SLO_P95` is skipped for the next smaller one. Samples age out of the
+window, so a skipped tier is tried again once its slow samples expire.
+Cold starts (the model had to be loaded) are left out of the p95.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from app.services.generation_stats import COLD_LOAD_SECONDS, NANOSECONDS, WINDOW
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Fewer samples than this in the window say nothing about a tier's p95
+MIN_SAMPLES = 5
+OPERATIONS = ('brainstorm', 'plan', 'enrich')
+
+
+def parse_tiers(value, default_model):
+    """MODEL_TIERS as [(name, model)], largest first
+
+    Empty means a single `default` tier running `default_model`.
+    """
+    tiers = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, model = (part.strip() for part in item.partition('='))
+        if not name or not model:
+            raise ValueError(f"MODEL_TIERS entry {item!r} must be name=model")
+        if name in dict(tiers):
+            raise ValueError(f"MODEL_TIERS names tier {name!r} twice")
+        tiers.append((name, model))
+    return tiers or [('default', default_model)]
+
+
+def parse_routes(value, tier_names):
+    """MODEL_ROUTES as [(operation, max_tokens or None, tier)]"""
+    routes = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        match, _, tier = (part.strip() for part in item.partition('='))
+        operation, _, limit = (part.strip() for part in match.partition(':'))
+        if operation != '*' and operation not in OPERATIONS:
+            raise ValueError(f"MODEL_ROUTES entry {item!r}: unknown operation {operation!r}")
+        if tier not in tier_names:
+            raise ValueError(f"MODEL_ROUTES entry {item!r}: unknown tier {tier!r}")
+        if limit and not limit.isdigit():
+            raise ValueError(f"MODEL_ROUTES entry {item!r}: token limit must be a number")
+        routes.append((operation, int(limit) if limit else None, tier))
+    return routes
+
+
+class ModelRouter:
+    """Picks the model for each generation and tracks latency per model"""
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.tiers = [('default', 'llama3.2:latest')]
+        self.routes = []
+        self.slo_p95 = 0.0
+        self.slo_queue = 0
+        self.window = 300.0
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._stats = {'routed': 0, 'queue_downgrades': 0, 'latency_downgrades': 0}
+
+    def init_app(self, app):
+        self.tiers = parse_tiers(app.config['MODEL_TIERS'], app.config['OLLAMA_MODEL'])
+        self.routes = parse_routes(app.config['MODEL_ROUTES'], [name for name, _ in self.tiers])
+        self.slo_p95 = app.config['MODEL_SLO_P95']
+        self.slo_queue = app.config['MODEL_SLO_QUEUE']
+        self.window = app.config['MODEL_SLO_WINDOW']
+        app.extensions['model_router'] = self
+
+    @property
+    def models(self):
+        """Every model a generation may be routed to, largest first"""
+        return [model for _, model in self.tiers]
+
+    def _rule_tier(self, operation, tokens):
+        for rule_operation, limit, tier in self.routes:
+            if rule_operation in ('*', operation) and (limit is None or tokens <= limit):
+                return [name for name, _ in self.tiers].index(tier)
+        return 0
+
+    def choose(self, operation, tokens):
+        """Model for a generation of `operation` costing about `tokens`"""
+        index = self._rule_tier(operation, tokens)
+        last = len(self.tiers) - 1
+        reason = 'rule'
+        if index < last and self.slo_queue and self.scheduler.queue_depth() >= self.slo_queue:
+            index, reason = index + 1, 'queue'
+        if self.slo_p95:
+            now = time.monotonic()
+            while index < last and self._p95(self.tiers[index][1], now) > self.slo_p95:
+                index, reason = index + 1, 'latency'
+        tier, model = self.tiers[index]
+        with self._lock:
+            self._stats['routed'] += 1
+            if reason != 'rule':
+                self._stats[f'{reason}_downgrades'] += 1
+        metrics.model_routes.inc(operation, tier, reason)
+        if reason != 'rule':
+            logger.debug("Routed %s to a smaller model", operation,
+                         extra={"tier": tier, "model": model, "reason": reason})
+        return model
+
+    def observe(self, model, elapsed, data):
+        """Record a finished generation's wall-clock time for `model`"""
+        if (data.get('load_duration') or 0) / NANOSECONDS >= COLD_LOAD_SECONDS:
+            return
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=WINDOW)
+            samples.append((time.monotonic(), elapsed))
+
+    def _p95(self, model, now):
+        """p95 seconds of `model`'s recent warm generations, or 0 when too few"""
+        with self._lock:
+            samples = self._samples.get(model)
+            if not samples:
+                return 0.0
+            while samples and samples[0][0] < now - self.window:
+                samples.popleft()
+            values = sorted(elapsed for _, elapsed in samples)
+        if len(values) < MIN_SAMPLES:
+            return 0.0
+        return values[min(int(len(values) * 0.95), len(values) - 1)]
+
+    def stats(self):
+        now = time.monotonic()
+        tiers = []
+        for name, model in self.tiers:
+            p95 = self._p95(model, now)
+            with self._lock:
+                samples = len(self._samples.get(model) or ())
+            tiers.append({'tier': name, 'model': model, 'p95_s': round(p95, 3) if p95 else None,
+                          'samples': samples})
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'tiers': tiers,
+            'slo_p95_s': self.slo_p95 or None,
+            'slo_queue': self.slo_queue or None
+        })
+        return stats
@@ -0,0 +1,403 @@
+import logging
+import re
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from app.services import tracing
+from app.services.health import CircuitBreaker, OllamaUnavailableError
+
+logger = logging.getLogger(__name__)
+
+# Loading a model can take far longer than a generation's read timeout
+LOAD_TIMEOUT = 120.0
+# Weight of the newest generation in a backend's latency average
+LATENCY_EWMA_ALPHA = 0.3
+
+
+def parse_keep_alive(value):
+    """OLLAMA_KEEP_ALIVE as Ollama expects it: seconds as a number, or a
+    duration string such as '30m'. Empty means Ollama's default (5m)."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    return int(value) if re.fullmatch(r'-?\d+', value) else value
+
+
+def parse_backend_urls(value):
+    """OLLAMA_URL as a list of base URLs: one URL or several, comma-separated"""
+    urls = [url.strip().rstrip('/') for url in (value or '').split(',') if url.strip()]
+    if not urls:
+        raise ValueError("OLLAMA_URL must name at least one Ollama server")
+    return urls
+
+
+class OllamaBackend:
+    """One Ollama server in the pool: breaker, load, latency and last probe
+
+    `in_flight` counts generations sent to this server and not yet finished
+    (streams count until their response is closed). `latency_ewma` is an
+    exponentially weighted average of whole-generation seconds.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.breaker = CircuitBreaker()
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.latency_ewma = None
+        self.requests = 0
+        self.failures = 0
+        self.running = False
+        self.checked_at = None
+        self.probe_latency_ms = None
+        self.error = None
+
+    def load_score(self, default_latency):
+        """Expected wait for one more generation here; lower is better"""
+        with self._lock:
+            latency = self.latency_ewma if self.latency_ewma is not None else default_latency
+            return (self.in_flight + 1) * latency
+
+    def start_request(self):
+        with self._lock:
+            self.in_flight += 1
+            self.requests += 1
+
+    def finish_request(self, elapsed=None, ok=True):
+        """Release an in-flight generation; successful ones update the EWMA"""
+        with self._lock:
+            self.in_flight = max(self.in_flight - 1, 0)
+            if not ok:
+                self.failures += 1
+            elif elapsed is not None:
+                self.latency_ewma = elapsed if self.latency_ewma is None else (
+                    LATENCY_EWMA_ALPHA * elapsed + (1 - LATENCY_EWMA_ALPHA) * self.latency_ewma
+                )
+
+    def record_probe(self, running, latency_ms, error):
+        """Store a health probe result; returns True when the server came back up"""
+        if running:
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        with self._lock:
+            recovered = running and not self.running
+            self.running = running
+            self.checked_at = time.time()
+            self.probe_latency_ms = latency_ms
+            self.error = error
+        return recovered
+
+    def snapshot(self):
+        with self._lock:
+            state = {
+                'url': self.url,
+                'running': self.running,
+                'checked_at': self.checked_at,
+                'probe_latency_ms': self.probe_latency_ms,
+                'error': self.error,
+                'in_flight': self.in_flight,
+                'latency_ewma_ms': None if self.latency_ewma is None else round(self.latency_ewma * 1000, 1),
+                'requests': self.requests,
+                'failures': self.failures
+            }
+        state['circuit'] = self.breaker.snapshot()
+        return state
+
+
+class OllamaClient:
+    """Long-lived Ollama HTTP client with keep-alive connection pooling
+
+    Created once per process in app.extensions and configured from the
+    app config in create_app(), so every AIService shares the same pooled
+    connections instead of opening new sockets per call.
+
+    `OLLAMA_URL` may list several servers. Each generation goes to the
+    least-loaded backend whose circuit breaker admits it, and a connection
+    failure is retried once on each remaining backend.
+    """
+
+    def __init__(self):
+        self.backends = [OllamaBackend('http://localhost:11434')]
+        self.model = 'llama3.2:latest'
+        self.connect_timeout = 5.0
+        self.read_timeout = 30.0
+        self.probe_timeout = 2.0
+        self.pool_connections = 4
+        self.pool_maxsize = 16
+        self.structured_output = True
+        self.keep_alive = None
+        self.session = None
+        self._route_lock = threading.Lock()
+        self.failovers = 0
+        # Models that rejected a JSON Schema `format`; they get prompt-only JSON
+        self._schema_lock = threading.Lock()
+        self._schema_unsupported = set()
+        self.schema_fallbacks = 0
+
+    def init_app(self, app):
+        """Configure the client and its connection pool from app config"""
+        self.backends = [OllamaBackend(url) for url in parse_backend_urls(app.config['OLLAMA_URL'])]
+        self.model = app.config['OLLAMA_MODEL']
+        self.connect_timeout = app.config['OLLAMA_CONNECT_TIMEOUT']
+        self.read_timeout = app.config['OLLAMA_READ_TIMEOUT']
+        self.probe_timeout = app.config['OLLAMA_PROBE_TIMEOUT']
+        self.pool_connections = app.config['OLLAMA_POOL_CONNECTIONS']
+        self.pool_maxsize = app.config['OLLAMA_POOL_MAXSIZE']
+        self.structured_output = app.config['OLLAMA_STRUCTURED_OUTPUT']
+        self.keep_alive = parse_keep_alive(app.config['OLLAMA_KEEP_ALIVE'])
+        for backend in self.backends:
+            backend.breaker.configure(
+                failure_threshold=app.config['OLLAMA_BREAKER_FAILURES'],
+                reset_timeout=app.config['OLLAMA_BREAKER_RESET']
+            )
+
+        self.reset_pool()
+        app.extensions['ollama'] = self
+
+    def reset_pool(self):
+        """Replace the connection pool, e.g. in a worker process after fork
+
+        Sockets opened before a fork would otherwise be shared by the parent
+        and every child.
+        """
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=False,
+            max_retries=0
+        )
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        previous, self.session = self.session, session
+        if previous is not None:
+            previous.close()
+
+    def _session(self):
+        if self.session is None:
+            raise RuntimeError("OllamaClient used before init_app()")
+        return self.session
+
+    def tags(self, backend):
+        """Fetch a backend's installed models list (GET /api/tags)"""
+        with tracing.span('ollama.tags', backend=backend.url):
+            return self._session().get(f"{backend.url}/api/tags", timeout=self.probe_timeout)
+
+    def acquire_backend(self, exclude=()):
+        """Pick the least-loaded backend whose breaker admits a call
+
+        The chosen backend counts the call as in flight until
+        `finish_request()`. Raises OllamaUnavailableError when every
+        candidate's breaker is open.
+        """
+        known = [b.latency_ewma for b in self.backends if b.latency_ewma is not None]
+        # Backends without a measurement yet are assumed average
+        default_latency = sum(known) / len(known) if known else 1.0
+        retry_after = None
+        with self._route_lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            for backend in sorted(candidates, key=lambda b: b.load_score(default_latency)):
+                try:
+                    backend.breaker.before_call()
+                except OllamaUnavailableError as exc:
+                    retry_after = exc.retry_after if retry_after is None else min(retry_after, exc.retry_after)
+                    continue
+                backend.start_request()
+                return backend
+        raise OllamaUnavailableError(
+            "Ollama is unavailable. Start ollama serve and retry shortly.",
+            retry_after=retry_after or 1.0
+        )
+
+    def failed_over(self, backend, tried):
+        """Whether a connection failure on `backend` should move to another one"""
+        if len(tried) >= len(self.backends):
+            return False
+        with self._route_lock:
+            self.failovers += 1
+        logger.warning("Ollama backend unreachable; retrying on another", extra={"backend": backend.url})
+        return True
+
+    def circuit_snapshot(self):
+        """Pool-wide breaker state: closed while any backend is closed"""
+        snapshots = [backend.breaker.snapshot() for backend in self.backends]
+        states = {snapshot['state'] for snapshot in snapshots}
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN):
+            if state in states:
+                break
+        else:
+            state = CircuitBreaker.OPEN
+        return {
+            'state': state,
+            'consecutive_failures': min(snapshot['consecutive_failures'] for snapshot in snapshots)
+        }
+
+    def backend_stats(self):
+        return [backend.snapshot() for backend in self.backends]
+
+    def supports_schema(self, model=None):
+        """Whether generations send their JSON Schema as Ollama's `format`"""
+        return self.structured_output and (model or self.model) not in self._schema_unsupported
+
+    def request_body(self, payload, stream=False):
+        """Body for /api/generate with keep_alive, without a schema `format`
+        the model cannot take; the payload's `model` overrides OLLAMA_MODEL"""
+        body = {"model": self.model, **payload, "stream": stream}
+        if self.keep_alive is not None:
+            body.setdefault('keep_alive', self.keep_alive)
+        if isinstance(body.get('format'), dict) and not self.supports_schema(body['model']):
+            del body['format']
+        return body
+
+    def schema_rejected(self, body, error):
+        """Remember a model whose 400 response refused a JSON Schema `format`
+
+        Returns True when the request should be retried without `format`.
+        """
+        if not isinstance(body.get('format'), dict) or 'format' not in error.lower():
+            return False
+        with self._schema_lock:
+            self._schema_unsupported.add(body['model'])
+            self.schema_fallbacks += 1
+        logger.warning("Model rejected a JSON Schema format; using prompt-only JSON",
+                       extra={"model": body['model'], "error": error[:200]})
+        del body['format']
+        return True
+
+    def schema_stats(self):
+        return {
+            'enabled': self.structured_output,
+            'active': self.supports_schema(),
+            'fallbacks': self.schema_fallbacks,
+            'unsupported_models': sorted(self._schema_unsupported)
+        }
+
+    def generate(self, payload, stream=False):
+        """POST /api/generate with the configured model and timeouts
+
+        Fails fast with OllamaUnavailableError while every backend's circuit
+        breaker is open; transport errors and 5xx responses count as breaker
+        failures. A backend that refuses the connection is skipped and the
+        request sent to the next one. A JSON Schema `format` the server
+        rejects is dropped and the request retried once with the
+        prompt-only JSON instructions.
+        """
+        body = self.request_body(payload, stream)
+        tried = []
+        while True:
+            backend = self.acquire_backend(tried)
+            started = time.monotonic()
+            try:
+                response = self._post(backend, body, stream)
+                if response.status_code == 400 and self.schema_rejected(body, self._error_text(response)):
+                    response.close()
+                    response = self._post(backend, body, stream)
+            except requests.exceptions.ConnectionError:
+                backend.finish_request(ok=False)
+                tried.append(backend)
+                if self.failed_over(backend, tried):
+                    continue
+                raise
+            except BaseException:
+                backend.finish_request(ok=False)
+                raise
+            ok = response.status_code < 500
+            if stream:
+                self._finish_on_close(response, backend, started, ok)
+            else:
+                backend.finish_request(time.monotonic() - started, ok)
+            return response
+
+    @staticmethod
+    def _finish_on_close(response, backend, started, ok):
+        """Keep a streamed generation in flight on its backend until it is closed"""
+        close = response.close
+        finished = []
+
+        def close_and_finish():
+            if not finished:
+                finished.append(True)
+                backend.finish_request(time.monotonic() - started, ok)
+            close()
+
+        response.close = close_and_finish
+
+    def embed(self, texts, model, timeout=None):
+        """POST /api/embed and return one vector per text
+
+        Routed and failed over like generations, but embedding latency is
+        not fed into a backend's load score, which tracks generations.
+        """
+        body = {"model": model, "input": list(texts)}
+        if self.keep_alive is not None:
+            body['keep_alive'] = self.keep_alive
+        tried = []
+        while True:
+            backend = self.acquire_backend(tried)
+            try:
+                response = self._post(backend, body, False, path='/api/embed', read_timeout=timeout)
+            except requests.exceptions.ConnectionError:
+                backend.finish_request(ok=False)
+                tried.append(backend)
+                if self.failed_over(backend, tried):
+                    continue
+                raise
+            except BaseException:
+                backend.finish_request(ok=False)
+                raise
+            backend.finish_request(ok=response.status_code < 500)
+            return self.embeddings(response.status_code, response.json() if response.status_code == 200 else None, len(body['input']))
+
+    @staticmethod
+    def embeddings(status, data, count):
+        """Vectors from an /api/embed response body; ValueError when unusable"""
+        vectors = data.get('embeddings') if isinstance(data, dict) else None
+        if status != 200 or not isinstance(vectors, list) or len(vectors) != count:
+            raise ValueError(f"Ollama embed returned status {status} without {count} embeddings")
+        return vectors
+
+    def load_model(self, backend, model=None):
+        """Load a model (OLLAMA_MODEL by default) into a backend's memory
+        without generating (empty prompt)"""
+        body = {"model": model or self.model, "prompt": "", "stream": False}
+        if self.keep_alive is not None:
+            body['keep_alive'] = self.keep_alive
+        return self._session().post(
+            f"{backend.url}/api/generate",
+            json=body,
+            timeout=(self.connect_timeout, max(self.read_timeout, LOAD_TIMEOUT))
+        )
+
+    def _post(self, backend, body, stream, path='/api/generate', read_timeout=None):
+        # For streams this ends once the response headers arrive
+        try:
+            with tracing.span('ollama.request', backend=backend.url, path=path, stream=stream):
+                response = self._session().post(
+                    f"{backend.url}{path}",
+                    json=body,
+                    timeout=(self.connect_timeout, read_timeout or self.read_timeout),
+                    stream=stream
+                )
+        except requests.exceptions.RequestException:
+            backend.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            backend.breaker.record_failure()
+        else:
+            backend.breaker.record_success()
+        return response
+
+    @staticmethod
+    def _error_text(response):
+        try:
+            return str(response.json().get('error', ''))
+        except ValueError:
+            return response.text
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
@@ -0,0 +1,49 @@
+import threading
+from collections import OrderedDict
+
+# Recently failed generation keys remembered to spot retries
+MAX_FAILED_KEYS = 1024
+
+
+class ParseStats:
+    """Outcome counters for parsing model output, per endpoint
+
+    A generation fails when nothing usable could be parsed from it. When a
+    generation for the same cache key follows a failed one, it is counted
+    as a retry: that is the extra model traffic parse failures cause.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._failed = OrderedDict()
+
+    def record(self, endpoint, key, ok, structured):
+        """Record one parsed generation
+
+        Args:
+            endpoint (str): brainstorm, plan or enrich
+            key (str): Response cache key of the generation
+            ok (bool): Whether usable output was parsed
+            structured (bool): Whether a JSON Schema `format` was sent
+        """
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, {
+                'generations': 0, 'structured': 0, 'parse_failures': 0, 'retries': 0
+            })
+            stats['generations'] += 1
+            stats['structured'] += structured
+            if self._failed.pop(key, None) is not None:
+                stats['retries'] += 1
+            if not ok:
+                stats['parse_failures'] += 1
+                self._failed[key] = True
+                if len(self._failed) > MAX_FAILED_KEYS:
+                    self._failed.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for endpoint, stats in self._endpoints.items():
+                result[endpoint] = dict(stats, failure_rate=round(stats['parse_failures'] / stats['generations'], 4))
+            return result
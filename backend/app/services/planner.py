@@ -0,0 +1,223 @@
+"""
+Deterministic daily planner.
+
+Orders tasks by due-date urgency and priority and packs them into the
+working day with breaks, producing the same response schema as the LLM
+plan in a few milliseconds. Used for `mode=fast`, as the fallback when
+Ollama is unavailable or too slow, and as the skeleton the LLM enriches.
+"""
+from datetime import date, datetime
+
+PRIORITY_WEIGHT = {'high': 3, 'medium': 2, 'low': 1}
+# Default effort per priority when a task has no estimate of its own
+DEFAULT_MINUTES = {'high': 90, 'medium': 60, 'low': 30}
+
+DAY_START = 8 * 60
+DAY_END = 18 * 60
+LUNCH_START = 12 * 60
+LUNCH_END = 13 * 60
+BREAK_MINUTES = 15
+
+
+def _priority(task):
+    priority = str(task.get('priority') or 'medium').lower()
+    return priority if priority in PRIORITY_WEIGHT else 'medium'
+
+
+def _days_until_due(task, today):
+    due = task.get('dueDate')
+    if not due:
+        return None
+    try:
+        return (datetime.strptime(str(due)[:10], '%Y-%m-%d').date() - today).days
+    except ValueError:
+        return None
+
+
+def _urgency_bucket(days):
+    """0 = overdue/today, 1 = tomorrow, 2 = this week, 3 = later, 4 = no date"""
+    if days is None:
+        return 4
+    if days <= 0:
+        return 0
+    if days == 1:
+        return 1
+    if days <= 7:
+        return 2
+    return 3
+
+
+def rank_tasks(tasks, today=None):
+    """Return tasks most-urgent first
+
+    Sort key: urgency bucket, then priority, then due date, then original
+    order so the result is stable for identical inputs.
+    """
+    today = today or date.today()
+    keyed = []
+    for position, task in enumerate(tasks):
+        days = _days_until_due(task, today)
+        keyed.append((
+            _urgency_bucket(days),
+            -PRIORITY_WEIGHT[_priority(task)],
+            days if days is not None else float('inf'),
+            position,
+            task
+        ))
+    keyed.sort(key=lambda entry: entry[:4])
+    return [entry[4] for entry in keyed]
+
+
+def estimate_minutes(task):
+    return DEFAULT_MINUTES[_priority(task)]
+
+
+def format_minutes(minutes):
+    hours, mins = divmod(int(minutes), 60)
+    if not hours:
+        return f"{mins} minutes"
+    label = f"{hours} hour" + ("s" if hours > 1 else "")
+    return f"{label} {mins} minutes" if mins else label
+
+
+def format_clock(minutes):
+    return f"{int(minutes) // 60:02d}:{int(minutes) % 60:02d}"
+
+
+def parse_clock(value):
+    """Minutes after midnight for 'HH:MM', or None"""
+    try:
+        hours, minutes = str(value).split(':')
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours <= 23 and 0 <= minutes <= 59):
+        return None
+    return hours * 60 + minutes
+
+
+def _reason(task, days):
+    parts = [f"{_priority(task).capitalize()} priority"]
+    if days is not None:
+        if days < 0:
+            parts.append(f"overdue by {-days} day" + ("s" if days < -1 else ""))
+        elif days == 0:
+            parts.append("due today")
+        elif days == 1:
+            parts.append("due tomorrow")
+        else:
+            parts.append(f"due in {days} days")
+    return ", ".join(parts)
+
+
+def working_gaps():
+    """Free [start, end] windows of an empty working day, in minutes"""
+    return [[DAY_START, LUNCH_START], [LUNCH_END, DAY_END]]
+
+
+def reserve(gaps, start, end):
+    """Gaps left after taking out [start, end] plus a break on either side"""
+    start, end = start - BREAK_MINUTES, end + BREAK_MINUTES
+    remaining = []
+    for gap_start, gap_end in gaps:
+        if end <= gap_start or start >= gap_end:
+            remaining.append([gap_start, gap_end])
+            continue
+        if start > gap_start:
+            remaining.append([gap_start, start])
+        if end < gap_end:
+            remaining.append([end, gap_end])
+    return remaining
+
+
+def free_gaps(busy):
+    """Free windows of the working day around already scheduled (start, end) intervals"""
+    gaps = working_gaps()
+    for start, end in busy:
+        gaps = reserve(gaps, start, end)
+    return gaps
+
+
+def fits(gaps, start, end):
+    """Whether [start, end] lies inside one free gap"""
+    return start < end and any(gap_start <= start and end <= gap_end for gap_start, gap_end in gaps)
+
+
+def place(gaps, minutes):
+    """First-fit a task into the gaps, shrinking the one used
+
+    Returns the start minute, or None when no gap is long enough. A break
+    is reserved after the task so back-to-back work is not scheduled.
+    """
+    for gap in gaps:
+        if gap[1] - gap[0] >= minutes:
+            start = gap[0]
+            gap[0] = start + minutes + BREAK_MINUTES
+            return start
+    return None
+
+
+def scheduled_entry(task, start, minutes, today):
+    return {
+        'title': task.get('title', 'Untitled'),
+        'reason': _reason(task, _days_until_due(task, today)),
+        'timeEstimate': format_minutes(minutes),
+        'startTime': format_clock(start),
+        'endTime': format_clock(start + minutes),
+        'subtasks': []
+    }
+
+
+def schedule(tasks, today=None, gaps=None):
+    """Rank tasks and first-fit them into an empty working day, or into `gaps`
+
+    Returns:
+        tuple: (placed, deferred) - placed is a list of (start, minutes, task)
+        in rank order, deferred the tasks that did not fit
+    """
+    gaps = working_gaps() if gaps is None else [list(gap) for gap in gaps]
+    placed = []
+    deferred = []
+    # Most urgent first gets the earliest slot; shorter tasks backfill gaps
+    for task in rank_tasks(tasks, today):
+        minutes = estimate_minutes(task)
+        start = place(gaps, minutes)
+        if start is None:
+            deferred.append(task)
+        else:
+            placed.append((start, minutes, task))
+    return placed, deferred
+
+
+def plan_day(tasks, today=None):
+    """Build a daily plan without the LLM
+
+    Args:
+        tasks (list): Sanitized task dicts (title, priority, dueDate, category)
+        today (date): Reference date for urgency, defaults to today
+
+    Returns:
+        dict: {'suggestion': str, 'tasks': [...]} matching the LLM plan schema
+    """
+    if not tasks:
+        return {
+            'suggestion': 'No tasks to plan. Add some tasks to get started!',
+            'tasks': []
+        }
+
+    today = today or date.today()
+    placed, deferred = schedule(tasks, today)
+    scheduled = [
+        scheduled_entry(task, start, minutes, today)
+        for start, minutes, task in sorted(placed, key=lambda entry: entry[0])
+    ]
+
+    suggestion = (
+        "Start with the most urgent, highest-priority work while focus is freshest, "
+        f"then move to lighter tasks after lunch. {len(scheduled)} of {len(tasks)} tasks "
+        f"fit between {format_clock(DAY_START)} and {format_clock(DAY_END)} with "
+        f"{BREAK_MINUTES}-minute breaks."
+    )
+    if deferred:
+        suggestion += f" {len(deferred)} less urgent task" + ("s do" if len(deferred) > 1 else " does") + " not fit today and can wait."
+    return {'suggestion': suggestion, 'tasks': scheduled}
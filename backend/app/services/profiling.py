@@ -0,0 +1,163 @@
+"""
+Opt-in profiling of single requests
+
+Profiling is off unless `PROFILE_KEY` is set (then a request sending
+`X-Profile: sample` or `X-Profile: pstats` with `X-Profile-Key: <key>` is
+profiled) or `PROFILE_SAMPLE_RATE` picks a share of requests. Artifacts are
+written to `PROFILE_DIR`, named by request ID, and the file name is
+returned in `X-Profile-Artifact`.
+
+- `sample`: a thread reads the stacks of the request's threads (including
+  plan chunks running on the pool) every `PROFILE_INTERVAL_MS` and writes
+  them in folded format (`<request_id>.folded`), the input of
+  flamegraph.pl, speedscope and inferno. Overhead is one stack walk per
+  interval, so it is fair on slow AI requests.
+- `pstats`: cProfile on the request thread (`<request_id>.pstats`, read with
+  `python -m pstats` or snakeviz). Exact call counts, but it slows the
+  profiled code down noticeably.
+
+One request per process is profiled at a time; others run unprofiled.
+"""
+import cProfile
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+SAMPLE = 'sample'
+PSTATS = 'pstats'
+MODES = (SAMPLE, PSTATS)
+# Frames kept per sampled stack, innermost last
+MAX_DEPTH = 128
+
+
+def _folded_stack(frame):
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class _StackSampler:
+    """Samples the stacks of a trace's threads until stopped"""
+
+    def __init__(self, trace, interval):
+        self.trace = trace
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self.trace._lock:
+                threads = set(self.trace.threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[_folded_stack(frame)] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class _CProfile:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class Profiler:
+    """Decides which requests to profile and writes their artifacts"""
+
+    def __init__(self):
+        self.key = ''
+        self.sample_rate = 0.0
+        self.mode = SAMPLE
+        self.interval = 0.005
+        self.directory = 'profiles'
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self._stats = {'profiled': 0, 'skipped': 0}
+
+    def init_app(self, app):
+        self.key = app.config['PROFILE_KEY']
+        self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+        self.mode = app.config['PROFILE_MODE'] if app.config['PROFILE_MODE'] in MODES else SAMPLE
+        self.interval = app.config['PROFILE_INTERVAL_MS'] / 1000.0
+        self.directory = app.config['PROFILE_DIR']
+        app.extensions['profiler'] = self
+
+    @property
+    def enabled(self):
+        return bool(self.key) or self.sample_rate > 0
+
+    def requested_mode(self, headers):
+        """Profiling mode for a request, or None"""
+        if not self.enabled:
+            return None
+        wanted = (headers.get('X-Profile') or '').strip().lower()
+        if wanted and self.key and headers.get('X-Profile-Key') == self.key:
+            return wanted if wanted in MODES else SAMPLE
+        if self.sample_rate and random.random() < self.sample_rate:
+            return self.mode
+        return None
+
+    def start(self, mode, trace):
+        """Start profiling; returns a handle for `finish`, or None when busy"""
+        if trace is None or not self._busy.acquire(blocking=False):
+            with self._lock:
+                self._stats['skipped'] += 1
+            return None
+        try:
+            profile = _StackSampler(trace, self.interval) if mode == SAMPLE else _CProfile()
+        except Exception:
+            # e.g. another profiler already active on this interpreter
+            self._busy.release()
+            logger.exception("Could not start the %s profiler", mode)
+            return None
+        return mode, profile, trace.request_id
+
+    def finish(self, handle):
+        """Stop profiling and write the artifact; returns its file name"""
+        mode, profile, request_id = handle
+        name = f"{request_id}.{'folded' if mode == SAMPLE else 'pstats'}"
+        try:
+            profile.stop()
+        finally:
+            self._busy.release()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            profile.write(os.path.join(self.directory, name))
+        except Exception:
+            logger.exception("Could not write profile %s", name)
+            return None
+        with self._lock:
+            self._stats['profiled'] += 1
+        return name
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['enabled'] = self.enabled
+        return stats
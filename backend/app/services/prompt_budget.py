@@ -0,0 +1,48 @@
+"""
+Prompt token accounting for daily plans
+
+Prompt evaluation time grows with prompt length, so plan prompts encode
+each task on one short line and are cut to a token budget before they are
+sent. Token counts are estimated from character length; the exact count
+depends on the model's tokenizer and is not needed for budgeting.
+"""
+import math
+
+# Average characters per token for English text on llama-family tokenizers
+CHARS_PER_TOKEN = 4
+MAX_TITLE_CHARS = 80
+
+
+def estimate_tokens(text):
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compact_title(task):
+    """A task's title with whitespace collapsed and cut to MAX_TITLE_CHARS"""
+    title = ' '.join(str(task.get('title') or 'Untitled').split())
+    if len(title) > MAX_TITLE_CHARS:
+        title = title[:MAX_TITLE_CHARS - 1].rstrip() + '…'
+    return title
+
+
+def compact_task_line(task):
+    """Encode a task as `title | priority | due | category`, omitting blanks"""
+    fields = [compact_title(task), str(task.get('priority') or 'medium').lower()]
+    if task.get('dueDate'):
+        fields.append(f"due {str(task['dueDate'])[:10]}")
+    if task.get('category'):
+        fields.append(str(task['category']))
+    return ' | '.join(fields)
+
+
+def fit_to_budget(lines, budget):
+    """Number of leading lines whose estimated tokens fit in the budget
+
+    At least one line is always kept so a request never plans nothing.
+    """
+    used = 0
+    for count, line in enumerate(lines):
+        used += estimate_tokens(line) + 1
+        if count and used > budget:
+            return count
+    return len(lines)
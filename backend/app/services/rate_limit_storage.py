@@ -0,0 +1,134 @@
+"""
+SQLite storage for rate limit counters
+
+flask-limiter's `memory://` storage keeps counters per process, so every
+gunicorn worker enforces the full limit on its own. Importing this module
+registers a `sqlite://` storage scheme with `limits`; pointing
+`RATE_LIMIT_STORAGE_URI` at a file shares the counters between all worker
+processes on the host without running Redis or memcached.
+
+URIs follow the SQLAlchemy convention: `sqlite:///ratelimit.db` is relative
+to the working directory, `sqlite:////var/lib/taskmgr/ratelimit.db` is
+absolute. Only the fixed-window strategy (flask-limiter's default) is
+supported.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from limits.errors import ConfigurationError
+from limits.storage import Storage
+
+logger = logging.getLogger(__name__)
+
+# Expired windows are swept after this many increments per process
+PURGE_EVERY = 500
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in a SQLite file shared across processes
+
+    Each increment runs in a `BEGIN IMMEDIATE` transaction, which takes the
+    database write lock up front, so concurrent read-modify-writes from
+    other processes are serialized instead of losing updates.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, timeout=5.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = urlparse(uri).path[1:]
+        if not self.path:
+            raise ConfigurationError(f"rate limit storage needs a file path: {uri}")
+        self.timeout = float(timeout)
+        self._lock = threading.Lock()
+        self._increments = 0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                "key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at)")
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    # A short-lived connection per operation, as in the response cache's
+    # SQLite tier, keeps this safe across threads and processes.
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def incr(self, key, expiry, elastic_expiry=False, amount=1):
+        """Add `amount` to the key's window, starting a new window if it expired"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT count, expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                count, expires_at = amount, now + expiry
+            else:
+                count = row[0] + amount
+                expires_at = now + expiry if elastic_expiry else row[1]
+            conn.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?)",
+                (key, count, expires_at)
+            )
+            if self._purge_due():
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def _purge_due(self):
+        with self._lock:
+            self._increments += 1
+            return self._increments % PURGE_EVERY == 0
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self):
+        try:
+            with self._connect() as conn:
+                conn.execute("SELECT 1 FROM rate_limits LIMIT 1")
+            return True
+        except sqlite3.Error:
+            logger.exception("Rate limit storage check failed")
+            return False
+
+    def reset(self):
+        with self._transaction() as conn:
+            return conn.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
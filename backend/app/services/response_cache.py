@@ -0,0 +1,179 @@
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """LRU + TTL cache for generated AI responses
+
+    Entries live in a bounded in-memory LRU. When `RESPONSE_CACHE_PATH` is
+    set, a SQLite file backs the memory tier so results survive restarts
+    and are shared between worker processes on the same host.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.max_entries = 256
+        self.ttls = {}
+        self.path = None
+        self.disk_max_entries = 5000
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def init_app(self, app):
+        self.enabled = app.config['RESPONSE_CACHE_ENABLED']
+        self.max_entries = app.config['RESPONSE_CACHE_MAX_ENTRIES']
+        self.ttls = {
+            'brainstorm': app.config['RESPONSE_CACHE_TTL_BRAINSTORM'],
+            'plan': app.config['RESPONSE_CACHE_TTL_PLAN']
+        }
+        self.path = app.config['RESPONSE_CACHE_PATH'] or None
+        self.disk_max_entries = app.config['RESPONSE_CACHE_DISK_MAX_ENTRIES']
+        if self.path:
+            self._init_disk()
+        app.extensions['response_cache'] = self
+
+    @staticmethod
+    def make_key(endpoint, model, payload):
+        """Hash (endpoint, model, prompt, options) into a cache key
+
+        Whitespace in the prompt is collapsed so cosmetic differences in the
+        request do not defeat the cache.
+        """
+        prompt = re.sub(r'\s+', ' ', payload.get('prompt', '')).strip()
+        material = json.dumps({
+            'endpoint': endpoint,
+            'model': model,
+            'system': payload.get('system'),
+            'prompt': prompt,
+            'options': payload.get('options', {}),
+            'format': payload.get('format')
+        }, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return the cached value or None on miss/expiry"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        if self.path:
+            found = self._disk_get(key, now)
+            if found is not None:
+                expires_at, value = found
+                with self._lock:
+                    self._remember(key, expires_at, value)
+                    self._stats['disk_hits'] += 1
+                return copy.deepcopy(value)
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None
+
+    def set(self, endpoint, key, value):
+        """Store a value under the endpoint's TTL"""
+        ttl = self.ttls.get(endpoint, 0)
+        if not self.enabled or ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._stats['stores'] += 1
+        if self.path:
+            self._disk_set(key, expires_at, value)
+
+    def _remember(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.path:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM response_cache")
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        stats['disk'] = bool(self.path)
+        return stats
+
+    # SQLite tier. A short-lived connection per operation keeps this safe
+    # across threads and processes; WAL lets readers and a writer overlap.
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=1.0)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_disk(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires_at)")
+
+    def _disk_get(self, key, now):
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?",
+                    (key, now)
+                ).fetchone()
+        except sqlite3.Error:
+            logger.exception("Response cache disk read failed")
+            return None
+        if row is None:
+            return None
+        return row[1], json.loads(row[0])
+
+    def _disk_set(self, key, expires_at, value):
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires_at)
+                )
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),))
+                conn.execute(
+                    "DELETE FROM response_cache WHERE key IN ("
+                    "SELECT key FROM response_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,)
+                )
+        except sqlite3.Error:
+            logger.exception("Response cache disk write failed")
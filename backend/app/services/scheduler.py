@@ -0,0 +1,283 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from app.services.health import OllamaUnavailableError
+from app.services.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Assumed generation time until real samples arrive
+DEFAULT_SERVICE_TIME = 10.0
+EWMA_ALPHA = 0.2
+
+
+class SchedulerOverloadedError(OllamaUnavailableError):
+    """Raised when a request is shed instead of queued for a model slot"""
+
+
+class _Waiter:
+    __slots__ = ('event', 'granted')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.granted = False
+
+    def grant(self):
+        self.granted = True
+        self.event.set()
+        return True
+
+
+class _AsyncWaiter:
+    """Queue entry of a coroutine, woken on its own event loop"""
+    __slots__ = ('loop', 'future', 'granted')
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.future = loop.create_future()
+        self.granted = False
+
+    def grant(self):
+        # release() may run on any thread
+        try:
+            self.loop.call_soon_threadsafe(self._resolve)
+        except RuntimeError:
+            # The loop is closed: nobody is left to take the slot
+            return False
+        self.granted = True
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class LLMScheduler:
+    """Bounded admission control in front of Ollama
+
+    At most `LLM_MAX_CONCURRENCY` generations run at once (match Ollama's
+    OLLAMA_NUM_PARALLEL). Further requests wait in per-tenant FIFO queues
+    served round-robin, so one API key cannot starve the others. Requests
+    are shed with a Retry-After when the queue is full or the estimated
+    wait exceeds `LLM_MAX_QUEUE_WAIT`, rather than accepted and timed out.
+    """
+
+    def __init__(self):
+        self.max_concurrency = 2
+        self.max_queue = 32
+        self.max_wait = 20.0
+        self._lock = threading.Lock()
+        self._active = 0
+        self._queued = 0
+        self._queues = OrderedDict()
+        self._service_time = None
+        self._wait_time = 0.0
+        self._stats = {'admitted': 0, 'shed': 0, 'timeouts': 0}
+
+    def init_app(self, app):
+        self.max_concurrency = max(app.config['LLM_MAX_CONCURRENCY'], 1)
+        self.max_queue = max(app.config['LLM_MAX_QUEUE'], 0)
+        self.max_wait = app.config['LLM_MAX_QUEUE_WAIT']
+        app.extensions['llm_scheduler'] = self
+
+    def _estimated_wait(self):
+        """Seconds a newly queued request would wait (lock must be held)"""
+        service_time = self._service_time or DEFAULT_SERVICE_TIME
+        return math.ceil((self._queued + 1) / self.max_concurrency) * service_time
+
+    def estimated_wait(self):
+        with self._lock:
+            if self._active < self.max_concurrency:
+                return 0.0
+            return self._estimated_wait()
+
+    def queue_depth(self):
+        """Requests currently waiting for a model slot"""
+        with self._lock:
+            return self._queued
+
+    def saturated(self):
+        """True when a new request would have to wait for a slot"""
+        with self._lock:
+            return self._active >= self.max_concurrency or bool(self._queued)
+
+    def expected_latency(self):
+        """Estimated seconds until a new request would finish (wait + service)
+
+        Returns 0 until real service times have been observed.
+        """
+        with self._lock:
+            if self._service_time is None:
+                return 0.0
+            wait = self._estimated_wait() if self._active >= self.max_concurrency else 0.0
+            return wait + self._service_time
+
+    @contextmanager
+    def slot(self, tenant='anonymous'):
+        """Hold a model slot for the duration of the block
+
+        Only a block that completes feeds the service-time estimate.
+        """
+        self.acquire(tenant)
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.release()
+            raise
+        self.release(time.monotonic() - started)
+
+    def acquire(self, tenant='anonymous'):
+        """Block until a slot is granted or raise SchedulerOverloadedError"""
+        enqueued_at = time.monotonic()
+        waiter = self._enqueue(tenant, _Waiter)
+        if waiter is None:
+            return
+
+        if not waiter.event.wait(self.max_wait):
+            with self._lock:
+                if not waiter.granted:
+                    self._discard(tenant, waiter)
+                    raise self._timed_out()
+
+        with self._lock:
+            self._admit(time.monotonic() - enqueued_at)
+
+    async def acquire_async(self, tenant='anonymous'):
+        """Coroutine counterpart of acquire for the ASGI serving mode
+
+        A queued coroutine waits on a future of its own event loop instead
+        of a thread, under the same queue limit, shedding and max wait as
+        blocking callers. If the caller is cancelled after its slot was
+        granted, the slot is released.
+        """
+        enqueued_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        waiter = self._enqueue(tenant, lambda: _AsyncWaiter(loop))
+        if waiter is None:
+            return
+
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # Whether the slot was handed over is decided under the lock,
+            # not by the future, which release() completes asynchronously
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._discard(tenant, waiter)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise self._timed_out()
+            if isinstance(e, asyncio.CancelledError):
+                if granted:
+                    self.release()
+                raise
+
+        with self._lock:
+            self._admit(time.monotonic() - enqueued_at)
+
+    def _enqueue(self, tenant, make_waiter):
+        """Admit at once (returns None), queue a new waiter, or shed"""
+        with self._lock:
+            if self._active < self.max_concurrency and not self._queued:
+                self._active += 1
+                self._admit(0.0)
+                return None
+
+            retry_after = None
+            if self._queued >= self.max_queue:
+                retry_after = self._estimated_wait()
+            elif self._service_time is not None:
+                # Only shed on the estimate once real service times exist
+                estimate = self._estimated_wait()
+                if estimate > self.max_wait:
+                    retry_after = estimate
+            if retry_after is not None:
+                self._stats['shed'] += 1
+            else:
+                waiter = make_waiter()
+                self._queues.setdefault(tenant, deque()).append(waiter)
+                self._queued += 1
+
+        if retry_after is not None:
+            logger.warning("Shedding AI request", extra={"tenant": tenant, "retry_after": retry_after})
+            raise SchedulerOverloadedError("The AI service is busy. Please retry shortly.", retry_after=retry_after)
+        return waiter
+
+    def _timed_out(self):
+        """Error for a waiter whose max wait passed (lock must be held)"""
+        self._stats['timeouts'] += 1
+        metrics.timeouts.inc('queue')
+        return SchedulerOverloadedError(
+            "Timed out waiting for the AI service. Please retry shortly.",
+            retry_after=self._estimated_wait()
+        )
+
+    def release(self, service_time=None):
+        """Free a slot, handing it straight to the next waiter if any
+
+        `service_time` is how long a successful generation held the slot.
+        Failed or abandoned ones pass None: a fast failure or a timeout
+        would skew the estimate that admission and shedding rely on.
+        """
+        with self._lock:
+            if service_time is not None:
+                if self._service_time is None:
+                    self._service_time = service_time
+                else:
+                    self._service_time += EWMA_ALPHA * (service_time - self._service_time)
+
+            while True:
+                waiter = self._next_waiter()
+                if waiter is None:
+                    self._active = max(self._active - 1, 0)
+                    break
+                if waiter.grant():
+                    break
+
+    def _admit(self, waited):
+        self._stats['admitted'] += 1
+        self._wait_time += EWMA_ALPHA * (waited - self._wait_time)
+
+    def _next_waiter(self):
+        if not self._queues:
+            return None
+        tenant, queue = next(iter(self._queues.items()))
+        waiter = queue.popleft()
+        if queue:
+            self._queues.move_to_end(tenant)
+        else:
+            del self._queues[tenant]
+        self._queued -= 1
+        return waiter
+
+    def _discard(self, tenant, waiter):
+        queue = self._queues.get(tenant)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        self._queued -= 1
+        if not queue:
+            del self._queues[tenant]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'active': self._active,
+                'queued': self._queued,
+                'tenants_waiting': len(self._queues),
+                'max_concurrency': self.max_concurrency,
+                'max_queue': self.max_queue,
+                'avg_service_s': round(self._service_time or 0.0, 3),
+                'avg_wait_s': round(self._wait_time, 3),
+                'estimated_wait_s': round(self._estimated_wait() if self._active >= self.max_concurrency else 0.0, 3)
+            })
+        return stats
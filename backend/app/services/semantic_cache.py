@@ -0,0 +1,161 @@
+"""
+Semantic cache for brainstorm suggestions
+
+The response cache only matches a context exactly. Contexts that mean the
+same ("plan my product launch" / "help me plan a product launch") miss it
+and cost a full generation. Here each brainstorm context is embedded with
+Ollama's `/api/embed`, and suggestions already generated for a context
+whose cosine similarity is at least `SEMANTIC_CACHE_THRESHOLD` are served
+instead. An embedding takes milliseconds next to a generation's seconds.
+
+Vectors are kept per model and task type in a bounded in-memory matrix (one row per
+context, L2-normalized float32), so a lookup is one matrix-vector product.
+When an index is full, expired rows are reused first, then the least
+recently used one. numpy is optional: without it the cache stays disabled.
+"""
+import logging
+import threading
+import time
+from app.services.metrics import metrics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# A new context this close to a stored one replaces it instead of taking a row
+DUPLICATE_SIMILARITY = 0.99
+
+
+class _VectorIndex:
+    """Fixed-capacity matrix of normalized vectors and their cached values"""
+
+    def __init__(self, capacity, dimensions):
+        self.vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self.expires = np.zeros(capacity, dtype=np.float64)
+        self.used = np.zeros(capacity, dtype=np.float64)
+        self.values = [None] * capacity
+        self.size = 0
+
+    def nearest(self, vector, now):
+        """(row, similarity) of the most similar live entry, or (None, None)"""
+        if not self.size:
+            return None, None
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.expires[:self.size] <= now] = -np.inf
+        row = int(np.argmax(similarities))
+        similarity = float(similarities[row])
+        return (None, None) if similarity == -np.inf else (row, similarity)
+
+    def free_row(self, now):
+        """Row for a new entry: the next empty one, an expired one, else the LRU"""
+        if self.size < len(self.values):
+            self.size += 1
+            return self.size - 1, False
+        expired = np.flatnonzero(self.expires <= now)
+        if expired.size:
+            return int(expired[0]), False
+        return int(np.argmin(self.used)), True
+
+    def put(self, row, vector, value, expires, now):
+        self.vectors[row] = vector
+        self.values[row] = value
+        self.expires[row] = expires
+        self.used[row] = now
+
+
+class SemanticCache:
+    """Similarity lookup of brainstorm results by embedded context"""
+
+    def __init__(self):
+        self.enabled = False
+        self.model = 'nomic-embed-text'
+        self.threshold = 0.92
+        self.max_entries = 256
+        self.ttl = 3600
+        self.timeout = 2.0
+        self._lock = threading.Lock()
+        self._indexes = {}
+        self._stats = {'lookups': 0, 'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0}
+
+    def init_app(self, app):
+        self.enabled = app.config['SEMANTIC_CACHE_ENABLED']
+        if self.enabled and np is None:
+            logger.warning("SEMANTIC_CACHE_ENABLED needs numpy (pip install -r requirements.txt); "
+                           "the semantic cache is off")
+            self.enabled = False
+        self.model = app.config['SEMANTIC_CACHE_MODEL']
+        self.threshold = app.config['SEMANTIC_CACHE_THRESHOLD']
+        self.max_entries = app.config['SEMANTIC_CACHE_MAX_ENTRIES']
+        self.ttl = app.config['RESPONSE_CACHE_TTL_BRAINSTORM']
+        self.timeout = app.config['SEMANTIC_CACHE_TIMEOUT']
+        app.extensions['semantic_cache'] = self
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else None
+
+    def lookup(self, namespace, vector):
+        """Value stored for the most similar vector above the threshold
+
+        Returns:
+            tuple: (value or None, best similarity or None)
+        """
+        vector = self._normalize(vector)
+        now = time.monotonic()
+        with self._lock:
+            self._stats['lookups'] += 1
+            index = self._indexes.get(namespace)
+            row, similarity = (None, None)
+            if vector is not None and index is not None and index.vectors.shape[1] == vector.size:
+                row, similarity = index.nearest(vector, now)
+            hit = similarity is not None and similarity >= self.threshold
+            self._stats['hits' if hit else 'misses'] += 1
+            value = None
+            if hit:
+                index.used[row] = now
+                value = index.values[row]
+        if similarity is not None:
+            metrics.semantic_similarity.observe(similarity, 'hit' if hit else 'miss')
+        return value, similarity
+
+    def store(self, namespace, vector, value):
+        """Remember `value` for `vector`, replacing a near-identical entry"""
+        vector = self._normalize(vector)
+        if vector is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is None or index.vectors.shape[1] != vector.size:
+                # First entry, or the embedding model changed dimensions
+                index = self._indexes[namespace] = _VectorIndex(self.max_entries, vector.size)
+            row, similarity = index.nearest(vector, now)
+            if similarity is None or similarity < DUPLICATE_SIMILARITY:
+                row, evicted = index.free_row(now)
+                if evicted:
+                    self._stats['evictions'] += 1
+            index.put(row, vector, value, now + self.ttl, now)
+            self._stats['stores'] += 1
+
+    def record_error(self):
+        """Count an embedding that failed; the request carries on uncached"""
+        with self._lock:
+            self._stats['errors'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = sum(index.size for index in self._indexes.values())
+        stats['hit_rate'] = round(stats['hits'] / stats['lookups'], 4) if stats['lookups'] else 0.0
+        stats['enabled'] = self.enabled
+        stats['threshold'] = self.threshold
+        return stats
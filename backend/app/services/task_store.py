@@ -0,0 +1,336 @@
+"""
+SQLite task store with versioned delta sync
+
+Tasks belong to a tenant (the caller's API key, or its address without
+one, as for jobs and the LLM scheduler) and every read and write is scoped
+to it. Each write takes the next value of the tenant's version counter and
+stamps it on the task row; deletes leave a tombstone row. A client that
+remembers the highest version it has seen (its cursor) asks only for rows
+with a larger version, so sync traffic is proportional to what changed
+rather than to the number of tasks, and other tenants' writes never move
+its cursor or ETags. Tombstones older than `TASK_TOMBSTONE_TTL` are
+purged; a client whose cursor predates the purge gets a full snapshot
+(`reset`) instead of a delta.
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+MAX_TASK_BYTES = 16 * 1024
+_DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+FILTER_KEYS = ('status', 'excludeStatus', 'category', 'dueBefore', 'dueAfter')
+
+
+class TaskConflictError(ValueError):
+    """Raised when a write's expected version no longer matches the stored task"""
+
+    def __init__(self, message, version):
+        super().__init__(message)
+        self.version = version
+
+
+class UnknownCursorError(ValueError):
+    """Raised for a sync cursor ahead of the store, e.g. after the database was recreated"""
+
+
+def task_key(task_id):
+    """Row key for a task id; the frontend's numeric ids and strings share one space"""
+    if isinstance(task_id, bool) or not isinstance(task_id, (int, str)) or task_id == '':
+        raise ValueError('Task id must be a number or a non-empty string')
+    key = str(task_id)
+    if len(key) > 64:
+        raise ValueError('Task id is too long (64 char max)')
+    return key
+
+
+def validate_task(task):
+    """Check a client task and return (key, serialized JSON)"""
+    if not isinstance(task, dict):
+        raise ValueError('Task must be an object')
+    key = task_key(task.get('id'))
+    for field in ('title', 'status', 'category', 'dueDate', 'priority'):
+        value = task.get(field)
+        if value is not None and not isinstance(value, str):
+            raise ValueError(f'Task {field} must be a string')
+    data = json.dumps(task, separators=(',', ':'))
+    if len(data) > MAX_TASK_BYTES:
+        raise ValueError(f'Task is too large ({MAX_TASK_BYTES} bytes max)')
+    return key, data
+
+
+def parse_filter(raw):
+    """Normalize a task filter: status/excludeStatus (string or list),
+    category, and dueBefore/dueAfter as ISO dates (inclusive)"""
+    if not isinstance(raw, dict):
+        raise ValueError('Filter must be an object')
+    unknown = set(raw) - set(FILTER_KEYS)
+    if unknown:
+        raise ValueError(f"Unknown filter fields: {', '.join(sorted(unknown))}")
+    parsed = {}
+    for field in ('status', 'excludeStatus'):
+        value = raw.get(field)
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else value
+        if not isinstance(values, list) or not values or not all(isinstance(v, str) for v in values):
+            raise ValueError(f'Filter {field} must be a string or a list of strings')
+        parsed[field] = values
+    if raw.get('category') is not None:
+        if not isinstance(raw['category'], str):
+            raise ValueError('Filter category must be a string')
+        parsed['category'] = raw['category']
+    for field in ('dueBefore', 'dueAfter'):
+        value = raw.get(field)
+        if value is None:
+            continue
+        if not isinstance(value, str) or not _DATE_RE.match(value):
+            raise ValueError(f'Filter {field} must be an ISO date')
+        parsed[field] = value[:10]
+    return parsed
+
+
+class TaskStore:
+    """Tasks persisted in SQLite, indexed for filtering and delta sync
+
+    Indexed columns (status, category, due date) are copied out of the task
+    JSON on write; the JSON itself is returned unchanged, so clients get
+    back exactly the fields they stored.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.page_size = 500
+        self.tombstone_ttl = 30 * 86400
+
+    def init_app(self, app):
+        self.path = app.config['TASK_STORE_PATH']
+        self.page_size = app.config['TASK_SYNC_PAGE_SIZE']
+        self.tombstone_ttl = app.config['TASK_TOMBSTONE_TTL']
+        self._init_db()
+        app.extensions['task_store'] = self
+
+    # A short-lived connection per operation, as in the response cache's
+    # SQLite tier, keeps this safe across threads and worker processes.
+
+    @contextmanager
+    def _connect(self):
+        if self.path is None:
+            raise RuntimeError("TaskStore used before init_app()")
+        conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as conn:
+            # Take the write lock up front so version numbers are handed out
+            # one transaction at a time, also across processes
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+        with self._transaction() as conn:
+            self._migrate_unscoped(conn)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "tenant TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL, status TEXT, category TEXT, "
+                "due_date TEXT, version INTEGER NOT NULL, updated_at REAL NOT NULL, "
+                "deleted INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (tenant, id))"
+            )
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tasks_version ON tasks (tenant, version)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_due_date ON tasks (tenant, due_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (tenant, status, due_date)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_category ON tasks (tenant, category, due_date)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS task_versions ("
+                "tenant TEXT PRIMARY KEY, version INTEGER NOT NULL, purged_through INTEGER NOT NULL)"
+            )
+
+    @staticmethod
+    def _migrate_unscoped(conn):
+        """Set aside a tasks table from before tasks were scoped to tenants
+
+        Its rows cannot be attributed to a caller, so they are moved to
+        `tasks_unscoped` rather than shown to everyone. Clients holding
+        cursors from that store get 409 and push their tasks again.
+        """
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(tasks)")]
+        if not columns or 'tenant' in columns:
+            return
+        conn.execute("ALTER TABLE tasks RENAME TO tasks_unscoped")
+        for index in ('idx_tasks_version', 'idx_tasks_due_date', 'idx_tasks_status', 'idx_tasks_category'):
+            conn.execute(f"DROP INDEX IF EXISTS {index}")
+        conn.execute("DROP TABLE IF EXISTS task_meta")
+        logger.warning("Task store predates per-tenant tasks; existing rows were moved to tasks_unscoped")
+
+    @staticmethod
+    def _versions(conn, tenant):
+        """(version, purged_through) of a tenant; (0, 0) before its first write"""
+        row = conn.execute(
+            "SELECT version, purged_through FROM task_versions WHERE tenant = ?", (tenant,)
+        ).fetchone()
+        return tuple(row) if row else (0, 0)
+
+    def version(self, tenant):
+        """Current version of the tenant's tasks; changes on each of its writes"""
+        with self._connect() as conn:
+            return self._versions(conn, tenant)[0]
+
+    def get(self, tenant, task_id):
+        """Return (task, version) for a live task of the tenant, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data, version FROM tasks WHERE tenant = ? AND id = ? AND deleted = 0",
+                (tenant, task_key(task_id))
+            ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def apply(self, tenant, upserts=(), deletes=(), expected=None):
+        """Write the tenant's upserted tasks and delete ids in one transaction
+
+        Returns the tenant's new version. `expected` maps a task key to the
+        version the client last saw; a mismatch raises TaskConflictError
+        and nothing is written. Deleting an unknown id still records a
+        tombstone so other clients drop it too.
+        """
+        rows = [validate_task(task) for task in upserts]
+        delete_keys = [(task_key(task_id), task_id) for task_id in deletes]
+        now = time.time()
+        with self._transaction() as conn:
+            for key, expected_version in (expected or {}).items():
+                row = conn.execute(
+                    "SELECT version, deleted FROM tasks WHERE tenant = ? AND id = ?", (tenant, key)
+                ).fetchone()
+                current = row[0] if row and not row[1] else None
+                if current != expected_version:
+                    raise TaskConflictError(f'Task {key} has changed', current)
+
+            version = self._versions(conn, tenant)[0]
+            for key, data in rows:
+                task = json.loads(data)
+                version += 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks "
+                    "(tenant, id, data, status, category, due_date, version, updated_at, deleted) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (tenant, key, data, task.get('status'), task.get('category'),
+                     (task.get('dueDate') or '')[:10] or None, version, now)
+                )
+            for key, task_id in delete_keys:
+                version += 1
+                # Tombstones keep the id in the client's own type
+                conn.execute(
+                    "INSERT OR REPLACE INTO tasks "
+                    "(tenant, id, data, status, category, due_date, version, updated_at, deleted) "
+                    "VALUES (?, ?, ?, NULL, NULL, NULL, ?, ?, 1)",
+                    (tenant, key, json.dumps({'id': task_id}), version, now)
+                )
+            conn.execute(
+                "INSERT OR IGNORE INTO task_versions (tenant, version, purged_through) VALUES (?, 0, 0)", (tenant,)
+            )
+            conn.execute("UPDATE task_versions SET version = ? WHERE tenant = ?", (version, tenant))
+            self._purge_tombstones(conn, tenant, now)
+        return version
+
+    def _purge_tombstones(self, conn, tenant, now):
+        cutoff = now - self.tombstone_ttl
+        purged = conn.execute(
+            "SELECT MAX(version) FROM tasks WHERE tenant = ? AND deleted = 1 AND updated_at < ?", (tenant, cutoff)
+        ).fetchone()[0]
+        if purged is None:
+            return
+        conn.execute("DELETE FROM tasks WHERE tenant = ? AND deleted = 1 AND updated_at < ?", (tenant, cutoff))
+        conn.execute(
+            "UPDATE task_versions SET purged_through = MAX(purged_through, ?) WHERE tenant = ?", (purged, tenant)
+        )
+
+    def changes(self, tenant, since=None, limit=None):
+        """The tenant's tasks written and ids deleted after version `since`, oldest first
+
+        Returns `tasks`, `deleted`, the `cursor` to pass next time and
+        `hasMore` when the page was full. Without a usable cursor the live
+        tasks are returned as a snapshot with `reset: true`, meaning the
+        client should replace what it holds. A cursor this store never
+        issued to the tenant raises UnknownCursorError; the client should push all of its
+        tasks again.
+        """
+        limit = min(limit or self.page_size, self.page_size)
+        with self._connect() as conn:
+            version, purged_through = self._versions(conn, tenant)
+            if since is not None and since > version:
+                raise UnknownCursorError(f'Unknown sync cursor {since} (store is at {version})')
+            reset = since is None or since < purged_through
+            start = 0 if reset else since
+            rows = conn.execute(
+                "SELECT data, version, deleted FROM tasks WHERE tenant = ? AND version > ? "
+                + ("AND deleted = 0 " if reset else "")
+                + "ORDER BY version LIMIT ?",
+                (tenant, start, limit + 1)
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        tasks, deleted = [], []
+        for data, _, is_deleted in rows:
+            task = json.loads(data)
+            if is_deleted:
+                deleted.append(task['id'])
+            else:
+                tasks.append(task)
+        return {
+            'tasks': tasks,
+            'deleted': deleted,
+            'cursor': rows[-1][1] if has_more else version,
+            'hasMore': has_more,
+            'reset': reset,
+            'version': version
+        }
+
+    def select(self, tenant, task_ids=None, filters=None, limit=None):
+        """The tenant's live tasks by id and/or parsed filter, nearest due date first"""
+        clauses, params = ['tenant = ?', 'deleted = 0'], [tenant]
+        if task_ids is not None:
+            keys = [task_key(task_id) for task_id in task_ids]
+            if not keys:
+                return []
+            clauses.append(f"id IN ({', '.join('?' * len(keys))})")
+            params.extend(keys)
+        filters = filters or {}
+        if 'status' in filters:
+            clauses.append(f"status IN ({', '.join('?' * len(filters['status']))})")
+            params.extend(filters['status'])
+        if 'excludeStatus' in filters:
+            clauses.append(f"(status IS NULL OR status NOT IN ({', '.join('?' * len(filters['excludeStatus']))}))")
+            params.extend(filters['excludeStatus'])
+        if 'category' in filters:
+            clauses.append("category = ?")
+            params.append(filters['category'])
+        if 'dueBefore' in filters:
+            clauses.append("due_date <= ?")
+            params.append(filters['dueBefore'])
+        if 'dueAfter' in filters:
+            clauses.append("due_date >= ?")
+            params.append(filters['dueAfter'])
+        sql = ("SELECT data FROM tasks WHERE " + ' AND '.join(clauses)
+               + " ORDER BY due_date IS NULL, due_date, version")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
@@ -0,0 +1,256 @@
+"""
+Request IDs, trace spans and structured logs
+
+Every request gets an ID (the client's `X-Request-ID` when it sends a
+usable one) that is echoed on the response and added to every log line it
+causes. While it runs, named spans (validation, queue wait, the Ollama
+HTTP call and Ollama's own load / prompt eval / eval timings, parsing) are
+collected in memory; when it ends, requests slower than
+`TRACE_LOG_THRESHOLD_MS` are logged as one JSON object with their spans, so
+a slow request can be broken down after the fact.
+
+State lives in context variables, so it follows asyncio tasks; work handed
+to a thread pool carries it along through `bind()`. Outside a trace, spans
+cost one context variable lookup.
+"""
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+logger = logging.getLogger('app.trace')
+
+# Spans kept per trace; later ones are counted as dropped
+MAX_SPANS = 256
+_REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9_-][A-Za-z0-9._-]{0,63}$')
+# LogRecord attributes that are not `extra` fields
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+_request_id = ContextVar('request_id', default=None)
+_trace = ContextVar('trace', default=None)
+_span = ContextVar('span', default=None)
+
+
+class _Settings:
+    enabled = True
+    threshold = 1.0
+
+
+settings = _Settings()
+
+
+def configure(app):
+    """Apply TRACE_* settings and set up logging with request IDs"""
+    settings.enabled = app.config['TRACE_ENABLED']
+    settings.threshold = app.config['TRACE_LOG_THRESHOLD_MS'] / 1000.0
+    json_logs = app.config['LOG_FORMAT'].lower() == 'json'
+    for handler in logging.getLogger().handlers:
+        if not any(isinstance(f, RequestIdFilter) for f in handler.filters):
+            handler.addFilter(RequestIdFilter())
+        handler.setFormatter(JsonFormatter() if json_logs else logging.Formatter(
+            '%(asctime)s %(levelname)s %(name)s [%(request_id)s]: %(message)s'
+        ))
+
+
+def request_id_from(header):
+    """The client's request ID when it is short and plain, else a new one"""
+    if header and _REQUEST_ID_RE.match(header):
+        return header
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+def current_trace():
+    return _trace.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Adds `request_id` ('-' outside a request) to every record"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the fields passed as `extra`"""
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'request_id': getattr(record, 'request_id', None) or _request_id.get(),
+            'message': record.getMessage()
+        }
+        trace = getattr(record, 'trace', None)
+        if trace is not None:
+            # Trace lines carry their fields at the top level, not as text
+            entry['message'] = 'trace'
+            entry.update(trace)
+        else:
+            entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class Trace:
+    """Spans recorded for one request, background job or probe"""
+
+    def __init__(self, name, request_id, attrs):
+        self.name = name
+        self.request_id = request_id
+        self.attrs = attrs
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+        self.dropped = 0
+        self.closed = False
+        # Threads working for this trace, sampled by the profiler
+        self.threads = {threading.get_ident()}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def add(self, span_id, name, start, duration, parent, attrs):
+        with self._lock:
+            if self.closed:
+                return
+            if len(self.spans) >= MAX_SPANS:
+                self.dropped += 1
+                return
+            span = {
+                'id': span_id,
+                'name': name,
+                'parent': parent,
+                'start_ms': round((start - self.started) * 1000, 2),
+                'duration_ms': round(duration * 1000, 2)
+            }
+            span.update(attrs)
+            self.spans.append(span)
+
+    def to_dict(self, duration):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: (span['start_ms'], span['id']))
+        entry = {'trace': self.name, 'request_id': self.request_id, 'duration_ms': round(duration * 1000, 2)}
+        entry.update(self.attrs)
+        entry['spans'] = spans
+        if self.dropped:
+            entry['dropped_spans'] = self.dropped
+        return entry
+
+
+def begin(name, request_id=None, **attrs):
+    """Start a trace in the current context; returns it (None when tracing is off)"""
+    _request_id.set(request_id or uuid.uuid4().hex)
+    if not settings.enabled:
+        _trace.set(None)
+        return None
+    trace = Trace(name, _request_id.get(), attrs)
+    _trace.set(trace)
+    _span.set(None)
+    return trace
+
+
+def end(force_log=False, **attrs):
+    """Finish the current trace, logging it when slow (or `force_log`)
+
+    `attrs` that are not None are added to the log entry. Safe to call
+    more than once; only the first call logs.
+    """
+    trace = _trace.get()
+    if trace is not None and not trace.closed:
+        duration = time.perf_counter() - trace.started
+        with trace._lock:
+            trace.closed = True
+        trace.attrs.update((key, value) for key, value in attrs.items() if value is not None)
+        if force_log or duration >= settings.threshold:
+            entry = trace.to_dict(duration)
+            logger.info(json.dumps(entry, default=str), extra={'trace': entry})
+    _trace.set(None)
+    _span.set(None)
+    _request_id.set(None)
+
+
+@contextmanager
+def trace(name, request_id=None, **attrs):
+    """Run a block as its own trace, e.g. a background job"""
+    outer = (_request_id.get(), _trace.get(), _span.get())
+    begin(name, request_id, **attrs)
+    try:
+        yield _trace.get()
+    finally:
+        end()
+        _request_id.set(outer[0])
+        _trace.set(outer[1])
+        _span.set(outer[2])
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a block as a span of the current trace, nested under the open one"""
+    current = _trace.get()
+    if current is None:
+        yield
+        return
+    span_id = current.new_id()
+    parent = _span.get()
+    token = _span.set(span_id)
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        attrs['error'] = type(e).__name__
+        raise
+    finally:
+        _span.reset(token)
+        current.add(span_id, name, started, time.perf_counter() - started, parent, attrs)
+
+
+def add_span(name, seconds, end=None, parent=None, **attrs):
+    """Record an interval measured elsewhere, ending now (or at `end`)
+
+    Returns the span's id, to parent further spans on, or None outside a trace.
+    """
+    current = _trace.get()
+    if current is None:
+        return None
+    span_id = current.new_id()
+    finished = time.perf_counter() if end is None else end
+    current.add(span_id, name, finished - seconds, seconds, parent or _span.get(), attrs)
+    return span_id
+
+
+def bind(fn):
+    """Wrap `fn` to run with the caller's request ID and trace in another thread"""
+    state = (_request_id.get(), _trace.get(), _span.get())
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        tokens = (_request_id.set(state[0]), _trace.set(state[1]), _span.set(state[2]))
+        if state[1] is not None:
+            with state[1]._lock:
+                state[1].threads.add(threading.get_ident())
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if state[1] is not None:
+                with state[1]._lock:
+                    state[1].threads.discard(threading.get_ident())
+            _span.reset(tokens[2])
+            _trace.reset(tokens[1])
+            _request_id.reset(tokens[0])
+    return wrapper
@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+import requests
+from app.services.model_router import parse_tiers
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmer:
+    """Loads the configured models ahead of the first real request
+
+    With `OLLAMA_WARMUP` on, the model (every `MODEL_TIERS` model, largest
+    first, when tiers are set) is loaded on each backend whenever it becomes
+    reachable: at startup and again after that Ollama restarts, as seen by
+    the health monitor. Loading uses the configured `OLLAMA_KEEP_ALIVE`, so a
+    negative value pins the models in memory.
+    """
+
+    def __init__(self, client, health, stats):
+        self.client = client
+        self.health = health
+        self.stats = stats
+        self.enabled = False
+        self.models = []
+        self._lock = threading.Lock()
+        self._threads = {}
+
+    def init_app(self, app):
+        self.enabled = app.config['OLLAMA_WARMUP']
+        self.models = [model for _, model in parse_tiers(app.config['MODEL_TIERS'], app.config['OLLAMA_MODEL'])]
+        app.extensions['model_warmer'] = self
+        if not self.enabled:
+            return
+        if app.config['OLLAMA_HEALTH_MONITOR']:
+            self.health.add_recovery_listener(self.trigger)
+        else:
+            self.trigger()
+
+    def trigger(self, backend=None):
+        """Warm up in the background, on one backend or all of them, skipping
+        backends that are already warming up"""
+        targets = [backend] if backend is not None else list(self.client.backends)
+        with self._lock:
+            for target in targets:
+                thread = self._threads.get(target.url)
+                if thread is not None and thread.is_alive():
+                    continue
+                thread = threading.Thread(target=self.warm_up, args=(target,), name='ollama-warmup', daemon=True)
+                self._threads[target.url] = thread
+                thread.start()
+
+    def warm_up(self, backend):
+        """Load the models on `backend` now; returns True when all loaded"""
+        return all([self._load(backend, model) for model in self.models or [self.client.model]])
+
+    def _load(self, backend, model):
+        started = time.monotonic()
+        try:
+            response = self.client.load_model(backend, model)
+            ok, error = response.status_code == 200, None
+            if not ok:
+                error = f"status {response.status_code}"
+        except requests.exceptions.RequestException as exc:
+            ok, error = False, str(exc)
+        elapsed = time.monotonic() - started
+        self.stats.record_warmup(elapsed, ok, error)
+        if ok:
+            logger.info("Model warmed up", extra={"model": model, "backend": backend.url,
+                                                  "seconds": round(elapsed, 2)})
+        else:
+            logger.warning("Model warm-up failed", extra={"model": model, "backend": backend.url,
+                                                         "error": error})
+        return ok
@@ -0,0 +1,14 @@
+"""
+ASGI entrypoint for the async serving mode.
+
+Usage:
+  uvicorn asgi:app --host 0.0.0.0 --port 4001
+"""
+from dotenv import load_dotenv
+
+# Load environment variables before the app reads its config
+load_dotenv()
+
+from app.asgi import create_asgi_app  # noqa: E402
+
+app = create_asgi_app()
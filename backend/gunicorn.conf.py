@@ -0,0 +1,109 @@
+"""
+gunicorn settings for production
+
+Used by `FLASK_ENV=production python run.py`, or directly with
+`gunicorn -c gunicorn.conf.py`. Generations are bound by Ollama rather
+than the CPU, so workers are sized by the LLM concurrency cap: each
+worker's scheduler gets a share of LLM_MAX_CONCURRENCY and LLM_MAX_QUEUE
+(the remainder goes one each to the first workers), keeping the host's
+total at what Ollama serves in parallel, and a thread for every slot and
+queued request. On SIGTERM,
+workers stop accepting connections and get SERVER_GRACEFUL_TIMEOUT seconds
+to finish in-flight generations and streams.
+
+This file must not import the app: it adjusts the environment the app's
+config is read from, and the app is loaded (preloaded) afterwards.
+"""
+import os
+import tempfile
+from dotenv import load_dotenv
+
+load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+
+_cores = os.cpu_count() or 1
+_llm_concurrency = max(int(os.getenv('LLM_MAX_CONCURRENCY', 2)), 1)
+_llm_queue = max(int(os.getenv('LLM_MAX_QUEUE', 32)), 0)
+
+wsgi_app = 'run:app'
+chdir = os.path.dirname(os.path.abspath(__file__))
+bind = f"0.0.0.0:{os.getenv('PORT', 4001)}"
+
+# No more than there are cores, and one process per model slot at most:
+# every worker needs a slot of its own, and more would oversubscribe Ollama
+_requested_workers = max(int(os.getenv('WEB_CONCURRENCY') or min(_cores, _llm_concurrency)), 1)
+workers = min(_requested_workers, _llm_concurrency)
+worker_class = 'gthread'
+
+
+def _shares(total):
+    """`total` split across the workers, the first ones taking the remainder"""
+    return [total // workers + (index < total % workers) for index in range(workers)]
+
+
+_slot_shares = _shares(_llm_concurrency)
+_queue_shares = _shares(_llm_queue)
+# The preloaded app is configured for the largest share; post_fork applies
+# each worker's own
+os.environ['LLM_MAX_CONCURRENCY'] = str(_slot_shares[0])
+os.environ['LLM_MAX_QUEUE'] = str(_queue_shares[0])
+threads = int(os.getenv('SERVER_THREADS') or 0) or _slot_shares[0] + _queue_shares[0] + 4
+
+# Rate limits must be counted across workers, not per process
+if workers > 1 and not os.getenv('RATE_LIMIT_STORAGE_URI'):
+    os.environ['RATE_LIMIT_STORAGE_URI'] = 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'taskmgr-ratelimit.db')
+
+# Import the app, its config and pooled clients once in the master
+preload_app = True
+graceful_timeout = int(os.getenv('SERVER_GRACEFUL_TIMEOUT', 90))
+# Worker heartbeat; a gthread worker stays responsive during generations
+timeout = 60
+keepalive = 5
+loglevel = os.getenv('LOG_LEVEL', 'info').lower()
+accesslog = '-'
+
+
+def when_ready(server):
+    if _requested_workers > workers:
+        server.log.warning(
+            "WEB_CONCURRENCY=%s exceeds LLM_MAX_CONCURRENCY=%s; running %s workers so Ollama is not "
+            "oversubscribed", _requested_workers, _llm_concurrency, workers
+        )
+    server.log.info(
+        "%s workers x %s threads, LLM slots %s and queue places %s per worker, rate limits in %s",
+        workers, threads, _slot_shares, _queue_shares, os.getenv('RATE_LIMIT_STORAGE_URI', 'memory://')
+    )
+    # Workers run their own monitors (post_fork); the master serves nothing.
+    # Wait out a probe in progress (probe_timeout to connect and again to
+    # read, per backend) so no worker is forked mid-request.
+    from app.extensions import ollama, ollama_health
+    if not ollama_health.stop(timeout=2 * ollama.probe_timeout * len(ollama.backends) + 1):
+        server.log.warning("Ollama health monitor still probing; forking workers anyway")
+
+
+def pre_fork(server, worker):
+    # A share per worker position; a replacement worker takes over the
+    # position (and share) of the one it replaces
+    taken = {getattr(other, 'llm_share', None) for other in server.WORKERS.values()}
+    worker.llm_share = min(index for index in range(workers + 1) if index not in taken)
+
+
+def post_fork(server, worker):
+    from app.extensions import llm_scheduler, ollama, ollama_health
+    # Workers beyond `workers` (added with TTIN) take the last, smallest share
+    share = min(worker.llm_share, workers - 1)
+    llm_scheduler.max_concurrency = _slot_shares[share]
+    llm_scheduler.max_queue = _queue_shares[share]
+    # Threads and sockets do not survive a fork cleanly: give each worker
+    # its own Ollama connection pool and health monitor
+    ollama.reset_pool()
+    if ollama_health.enabled:
+        ollama_health.start()
+
+
+def worker_exit(server, worker):
+    # Let background jobs finish; the master kills the worker after
+    # graceful_timeout regardless
+    from app.extensions import jobs, ollama, ollama_health
+    jobs.shutdown(wait=True)
+    ollama_health.stop()
+    ollama.close()
@@ -1,10 +1,18 @@
 from app import create_app
+from app.config import get_config
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+if __name__ == '__main__' and get_config().PRODUCTION_SERVER:
+    # gunicorn (or waitress on Windows) instead of the development server.
+    # Decided before the app is created: gunicorn loads it in its own
+    # process, so building it here would only cost startup time.
+    from app.server import serve
+    serve(create_app)
+
 # Create Flask application
 app = create_app()
 
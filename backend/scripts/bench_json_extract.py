@@ -0,0 +1,135 @@
+"""
+Micro-benchmark for extracting JSON from LLM output.
+
+Runs the regex-based parser the service used before against the
+single-pass extractor (whole text and fed as a token stream) over a corpus
+of model outputs, reporting how many samples each recovers and the time per
+parse. A scaling pass checks that extraction time grows linearly with
+output size, for well-formed, prose-wrapped and defective output.
+
+The bundled corpus covers the output shapes seen from llama-family models
+(fences, prose with brackets, trailing commas, truncation, bare keys).
+Append captured outputs to it, or pass another JSONL file with lines of
+{"kind": "suggestions" | "plan", "label": str, "expected": int, "output": str}.
+
+Usage:
+  python scripts/bench_json_extract.py [corpus.jsonl] [--repeat 2000]
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.services.json_stream import JSONItemStream, extract_json  # noqa: E402
+from app.services.llm_schemas import clean_plan, clean_suggestions  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'llm_output_corpus.jsonl')
+STREAM_CHUNK = 8
+
+
+def legacy_parse(content, kind):
+    """The fence-stripping + greedy regex parser this replaces"""
+    pattern = r'\[.*\]' if kind == 'suggestions' else r'\{.*\}'
+    try:
+        content = content.strip()
+        if content.startswith('```'):
+            lines = content.split('\n')
+            content = '\n'.join(lines[1:-1])
+        return json.loads(content)
+    except json.JSONDecodeError:
+        match = re.search(pattern, content, re.DOTALL)
+        if match:
+            try:
+                return json.loads(match.group())
+            except json.JSONDecodeError:
+                pass
+    return None
+
+
+def extract(content, kind):
+    if kind == 'suggestions':
+        return extract_json(content, list, clean_suggestions)
+    return extract_json(content, dict, clean_plan)
+
+
+def extract_streamed(content, kind):
+    stream = JSONItemStream()
+    for i in range(0, len(content), STREAM_CHUNK):
+        stream.feed(content[i:i + STREAM_CHUNK])
+    if kind == 'suggestions':
+        return stream.value(list, clean_suggestions)
+    return stream.value(dict, clean_plan)
+
+
+PARSERS = [('legacy', legacy_parse), ('extract', extract), ('streamed', extract_streamed)]
+
+
+def count_items(result, kind):
+    if kind == 'suggestions':
+        return len(result) if isinstance(result, list) else 0
+    return len(result.get('tasks') or []) if isinstance(result, dict) else 0
+
+
+def time_per_call(fn, args, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def run_corpus(samples, repeat):
+    print(f"{'sample':<42}" + ''.join(f"{name:>16}" for name, _ in PARSERS))
+    recovered = {name: 0 for name, _ in PARSERS}
+    totals = {name: 0.0 for name, _ in PARSERS}
+    for sample in samples:
+        kind, text = sample['kind'], sample['output']
+        row = f"{sample['kind'][:4]}: {sample['label']}"[:41]
+        cells = []
+        for name, fn in PARSERS:
+            ok = count_items(fn(text, kind), kind) >= sample['expected']
+            recovered[name] += ok
+            micros = time_per_call(fn, (text, kind), repeat)
+            totals[name] += micros
+            cells.append(f"{'ok' if ok else 'FAIL':>5} {micros:>7.1f}us")
+        print(f"{row:<42}" + ''.join(f"{cell:>16}" for cell in cells))
+
+    print()
+    for name, _ in PARSERS:
+        print(f"{name:<10} recovered {recovered[name]}/{len(samples)}  "
+              f"mean {totals[name] / len(samples):.1f}us per parse")
+
+
+def run_scaling(repeat):
+    item = '{"title": "Task [x]", "description": "Do {it} with \\"care\\"", "priority": "high"}'
+    variants = [
+        ('fenced', lambda body: "```json\n[" + body + "]\n```"),
+        ('prose', lambda body: "Here [are] the tasks:\n[" + body + "]\nDone [end]."),
+        ('needs repair', lambda body: "[" + body.replace('"title"', 'title') + ",\n"),
+    ]
+    print("\nscaling (N suggestions per output)")
+    for label, wrap in variants:
+        for size in (10, 100, 1000):
+            text = wrap(',\n'.join([item] * size))
+            micros = time_per_call(extract, (text, 'suggestions'), max(repeat // size, 3))
+            print(f"  {label:<13} N={size:<5} {len(text):>7} chars {micros:>10.1f}us "
+                  f"{micros / len(text) * 1000:>6.1f}ns/char")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('corpus', nargs='?', default=DEFAULT_CORPUS)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding='utf-8') as f:
+        samples = [json.loads(line) for line in f if line.strip()]
+    run_corpus(samples, args.repeat)
+    run_scaling(args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Stand-in for an Ollama server, for benchmarking the API without a model.
+
+Implements `/api/tags`, `/api/embed` and `/api/generate` (streaming and non-streaming)
+with the response fields the backend reads, including eval_count,
+eval_duration, prompt_eval_count and load_duration. Brainstorm (single and
+micro-batched), plan, re-plan and enrich prompts get well-formed answers
+derived from the prompt, so the whole request path runs as it would against
+a real model.
+Embeddings are hashed bag-of-words vectors, so texts sharing words are
+similar, as the brainstorm semantic cache expects.
+
+Timing follows a simple model of a local server:
+  - `--parallel` generations run at once (OLLAMA_NUM_PARALLEL); the rest wait
+  - the first generation, or the first after `--keep-alive` seconds idle,
+    pays `--load-time` to load the model
+  - each generation spends `--prompt-latency` evaluating the prompt, then
+    emits tokens at `--tokens-per-second`, +/- `--jitter`
+  - `--model-speed name=factor` makes a model that much faster (or, below
+    1, slower) at both, to try model tiers (MODEL_TIERS)
+
+Failure injection: `--error-rate` answers with HTTP 500, `--malformed-rate`
+returns output with the defects models produce (prose, fences, trailing
+commas, truncation), `--schema-unsupported` rejects `format` schemas as
+Ollama releases before 0.5 do.
+
+Usage:
+  python scripts/fake_ollama.py [--port 11435] [--tokens-per-second 40] ...
+  OLLAMA_URL=http://127.0.0.1:11435 python run.py
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+NANOSECONDS = 1e9
+CHARS_PER_TOKEN = 4
+
+_PLAN_TASK_RE = re.compile(r'^- (.+?) \|', re.MULTILINE)
+_WINDOW_RE = re.compile(r'^Time window: (\d{2}):(\d{2}) to (\d{2}):(\d{2})', re.MULTILINE)
+_ENRICH_RE = re.compile(r'^(\d+)\. \d{2}:\d{2}-\d{2}:\d{2} (.+?) \(', re.MULTILINE)
+_FREE_RE = re.compile(r'(\d{2}):(\d{2})-(\d{2}):(\d{2})')
+_CONTEXT_RE = re.compile(r'^Context: "(.*)"\s*$', re.MULTILINE | re.DOTALL)
+_BATCH_CONTEXT_RE = re.compile(r'^(\d+)\. \(\w+\) (".*")$', re.MULTILINE)
+_WORD_RE = re.compile(r'\w+')
+EMBED_DIMENSIONS = 64
+
+
+def brainstorm_output(prompt):
+    match = _CONTEXT_RE.search(prompt)
+    return suggestions_for(match.group(1) if match else 'the goal')
+
+
+def brainstorm_batch_output(prompt):
+    return {number: suggestions_for(json.loads(context)) for number, context in _BATCH_CONTEXT_RE.findall(prompt)}
+
+
+def suggestions_for(topic):
+    topic = topic[:60]
+    steps = ('Research', 'Outline', 'Draft', 'Review', 'Schedule')
+    priorities = ('high', 'high', 'medium', 'medium', 'low')
+    return [
+        {'title': f"{step} {topic}", 'description': f"{step} the work needed for {topic}.", 'priority': priority}
+        for step, priority in zip(steps, priorities)
+    ]
+
+
+def plan_output(prompt):
+    titles = _PLAN_TASK_RE.findall(prompt)
+    window = _WINDOW_RE.search(prompt)
+    windows = [(480, 1080) if not window else (
+        int(window.group(1)) * 60 + int(window.group(2)),
+        int(window.group(3)) * 60 + int(window.group(4))
+    )]
+    free = re.search(r'^Free time windows: (.*)$', prompt, re.MULTILINE)
+    if free:
+        windows = [(int(a) * 60 + int(b), int(c) * 60 + int(d)) for a, b, c, d in _FREE_RE.findall(free.group(1))]
+    tasks = []
+    titles = iter(titles)
+    for minute, end in windows:
+        while minute + 60 <= end:
+            title = next(titles, None)
+            if title is None:
+                break
+            tasks.append(_plan_entry(title, minute))
+            minute += 75
+    return {'suggestion': 'Hardest work first, lighter tasks after lunch.', 'tasks': tasks}
+
+
+def _plan_entry(title, minute):
+    return {
+        'title': title,
+        'reason': 'Scheduled by urgency and priority.',
+        'timeEstimate': '1 hour',
+        'startTime': f"{minute // 60:02d}:{minute % 60:02d}",
+        'endTime': f"{(minute + 60) // 60:02d}:{(minute + 60) % 60:02d}",
+        'subtasks': ['Gather materials', 'Do the core work', 'Check the result']
+    }
+
+
+def enrich_output(prompt):
+    return [
+        {'index': int(index), 'reason': f"{title} fits this slot.",
+         'subtasks': ['Prepare', 'Work through it', 'Wrap up']}
+        for index, title in _ENRICH_RE.findall(prompt)
+    ]
+
+
+def embed_output(text):
+    """Unit vector of hashed word counts"""
+    vector = [0.0] * EMBED_DIMENSIONS
+    for word in _WORD_RE.findall(text.lower()):
+        vector[int(hashlib.md5(word.encode('utf-8')).hexdigest(), 16) % EMBED_DIMENSIONS] += 1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def model_output(prompt):
+    if "Today's schedule:" in prompt:
+        return enrich_output(prompt)
+    if 'Time window:' in prompt or 'Free time windows:' in prompt:
+        return plan_output(prompt)
+    if 'each numbered context' in prompt:
+        return brainstorm_batch_output(prompt)
+    return brainstorm_output(prompt)
+
+
+def malform(text, rng):
+    """Wrap or damage well-formed JSON the way models do"""
+    defect = rng.choice(('prose', 'fence', 'trailing_comma', 'truncate'))
+    if defect == 'prose':
+        return f"Sure! Here is what you asked for [as JSON]:\n{text}\nLet me know if you need more."
+    if defect == 'fence':
+        return f"```json\n{text}\n```"
+    if defect == 'trailing_comma':
+        return re.sub(r'([}\]])([}\]])$', r'\1,\2', text)
+    return text[:max(1, int(len(text) * 0.8))]
+
+
+class FakeOllama:
+    """Shared state: parallel slots, model residency and counters"""
+
+    def __init__(self, args):
+        self.args = args
+        self.slots = threading.BoundedSemaphore(args.parallel)
+        self.rng = random.Random(args.seed)
+        self.lock = threading.Lock()
+        self.last_used = None
+        self.generations = 0
+
+    def uniform(self):
+        with self.lock:
+            return self.rng.random()
+
+    def acquire_model(self):
+        """Seconds spent loading the model for this generation"""
+        with self.lock:
+            now = time.monotonic()
+            cold = self.last_used is None or now - self.last_used > self.args.keep_alive
+            self.last_used = float('inf')
+            self.generations += 1
+        return self.args.load_time if cold else 0.0
+
+    def release_model(self):
+        with self.lock:
+            self.last_used = time.monotonic()
+
+    def speed(self, model):
+        return self.args.model_speed.get(model, 1.0)
+
+    def jittered(self, seconds):
+        return seconds * (1 + self.args.jitter * (2 * self.uniform() - 1))
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeOllama/1.0'
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def log_message(self, format, *args):
+        if self.fake.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data):
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.startswith('/api/tags'):
+            names = dict.fromkeys([self.fake.args.model] + list(self.fake.args.model_speed))
+            return self._send_json({'models': [{'name': name} for name in names]})
+        self._send_json({'error': 'not found'}, 404)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self._send_json({'error': 'invalid JSON'}, 400)
+        if self.path.startswith('/api/embed'):
+            texts = body.get('input') or ''
+            texts = [texts] if isinstance(texts, str) else texts
+            time.sleep(self.fake.jittered(self.fake.args.prompt_latency) / 4)
+            return self._send_json({'model': body.get('model'), 'embeddings': [embed_output(t) for t in texts]})
+        if not self.path.startswith('/api/generate'):
+            return self._send_json({'error': 'not found'}, 404)
+        if isinstance(body.get('format'), dict) and self.fake.args.schema_unsupported:
+            return self._send_json({'error': 'invalid format: expected "json" or a valid JSON schema'}, 400)
+        if self.fake.uniform() < self.fake.args.error_rate:
+            return self._send_json({'error': 'injected failure'}, 500)
+        self.generate(body)
+
+    def generate(self, body):
+        args = self.fake.args
+        prompt = body.get('prompt') or ''
+        model = body.get('model') or args.model
+        speed = self.fake.speed(model)
+        with self.fake.slots:
+            load_seconds = self.fake.acquire_model()
+            try:
+                if not prompt:
+                    # Empty prompt: Ollama only loads the model
+                    time.sleep(load_seconds)
+                    return self._send_json({'model': model, 'response': '', 'done': True,
+                                            'load_duration': int(load_seconds * NANOSECONDS)})
+                text = json.dumps(model_output(prompt))
+                if self.fake.uniform() < args.malformed_rate:
+                    text = malform(text, self.fake.rng)
+                prompt_seconds = self.fake.jittered(args.prompt_latency) / speed
+                time.sleep(load_seconds + prompt_seconds)
+
+                tokens = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+                token_seconds = self.fake.jittered(1 / args.tokens_per_second) / speed
+                stats = {
+                    'model': model,
+                    'done': True,
+                    'load_duration': int(load_seconds * NANOSECONDS),
+                    'prompt_eval_count': max(1, len(prompt) // CHARS_PER_TOKEN),
+                    'prompt_eval_duration': int(prompt_seconds * NANOSECONDS),
+                    'eval_count': len(tokens),
+                    'eval_duration': int(len(tokens) * token_seconds * NANOSECONDS)
+                }
+                if body.get('stream', True):
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'application/x-ndjson')
+                    self.send_header('Transfer-Encoding', 'chunked')
+                    self.end_headers()
+                    for token in tokens:
+                        time.sleep(token_seconds)
+                        line = json.dumps({'model': model, 'response': token, 'done': False}) + '\n'
+                        self._write_chunk(line.encode('utf-8'))
+                    self._write_chunk((json.dumps(dict(stats, response='')) + '\n').encode('utf-8'))
+                    self.wfile.write(b'0\r\n\r\n')
+                else:
+                    time.sleep(len(tokens) * token_seconds)
+                    self._send_json(dict(stats, response=text))
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                self.fake.release_model()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--model', default='llama3.2:latest')
+    parser.add_argument('--parallel', type=int, default=2, help='concurrent generations (OLLAMA_NUM_PARALLEL)')
+    parser.add_argument('--load-time', type=float, default=2.0, help='seconds to load the model when cold')
+    parser.add_argument('--keep-alive', type=float, default=300, help='idle seconds before the model unloads')
+    parser.add_argument('--prompt-latency', type=float, default=0.2, help='seconds of prompt evaluation')
+    parser.add_argument('--tokens-per-second', type=float, default=40)
+    parser.add_argument('--jitter', type=float, default=0.2, help='relative +/- variation of timings')
+    parser.add_argument('--model-speed', action='append', default=[], metavar='NAME=FACTOR',
+                        help='speed of another model relative to --model (repeatable)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of generations failing with 500')
+    parser.add_argument('--malformed-rate', type=float, default=0.0, help='fraction of outputs with defects')
+    parser.add_argument('--schema-unsupported', action='store_true', help='reject JSON Schema `format` values')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+    try:
+        args.model_speed = {name.strip(): float(factor) for name, _, factor in
+                            (item.partition('=') for item in args.model_speed)}
+    except ValueError:
+        parser.error('--model-speed takes NAME=FACTOR')
+    if any(factor <= 0 for factor in args.model_speed.values()):
+        parser.error('--model-speed factors must be positive')
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    server.fake = FakeOllama(args)
+    print(f"Fake Ollama on http://{args.host}:{args.port} "
+          f"({args.parallel} parallel, {args.tokens_per_second:g} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""
+Load generator for the AI endpoints.
+
+Drives `/api/brainstorm` and `/api/generate-plan` at each concurrency level
+and reports p50/p95/p99 latency, throughput and error rates per endpoint.
+Results can be saved as a baseline and later runs compared against it, so
+a performance change can be measured offline against
+`scripts/fake_ollama.py`:
+
+  python scripts/fake_ollama.py --seed 1 &
+  OLLAMA_URL=http://127.0.0.1:11435 AI_ROUTE_RATE_LIMIT=100000/minute \\
+      DEFAULT_RATE_LIMIT=100000/minute python run.py &
+  python scripts/loadtest.py --save-baseline     # before the change
+  python scripts/loadtest.py                     # after: compared to it
+
+Requests send `Cache-Control: no-store` and distinct inputs unless
+`--cache` is given, so every request reaches the model. A run fails (exit
+status 1) when any endpoint's p95 latency or throughput is worse than the
+baseline by more than `--tolerance`.
+
+When the server micro-batches brainstorms (MICROBATCH_ENABLED), each level
+also reports how many requests shared a generation, read from
+`/api/health`. Save a baseline with batching off and run again with it on
+to see the throughput gained against the latency added.
+
+Usage:
+  python scripts/loadtest.py [--base-url URL] [--concurrency 1,4,16]
+      [--requests 20] [--endpoints brainstorm,plan] [--baseline FILE]
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import requests
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_baseline.json')
+PRIORITIES = ('high', 'medium', 'low')
+
+
+def brainstorm_request(n):
+    return '/api/brainstorm', {'context': f"Prepare talk number {n} for the team offsite", 'taskType': 'project'}
+
+
+def plan_request(n, size=8):
+    today = date.today()
+    tasks = [
+        {
+            'title': f"Task {n}-{i}",
+            'priority': PRIORITIES[i % 3],
+            'dueDate': (today + timedelta(days=i % 5)).isoformat(),
+            'category': 'work'
+        }
+        for i in range(size)
+    ]
+    return '/api/generate-plan', {'tasks': tasks}
+
+
+ENDPOINTS = {'brainstorm': brainstorm_request, 'plan': plan_request}
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def batching_stats(session, args, headers):
+    """The server's micro-batching counters, or None when it does not batch"""
+    try:
+        response = session.get(args.base_url + '/api/health', headers=headers, timeout=args.timeout)
+        stats = response.json().get('micro_batching') if response.status_code == 200 else None
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    return stats if stats and stats.get('enabled') else None
+
+
+def run_level(args, endpoint, concurrency):
+    """Send args.requests requests with `concurrency` in flight; return a summary"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    headers = {}
+    if args.api_key:
+        headers['X-API-Key'] = args.api_key
+    if not args.cache:
+        headers['Cache-Control'] = 'no-store'
+    make_request = ENDPOINTS[endpoint]
+    # Distinct inputs per level so responses cannot be reused across levels
+    offset = concurrency * 100000
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def one(n):
+        path, payload = make_request(0 if args.cache else offset + n)
+        started = time.perf_counter()
+        try:
+            status = session.post(args.base_url + path, json=payload, headers=headers,
+                                  timeout=args.timeout).status_code
+        except requests.exceptions.RequestException as exc:
+            status = type(exc).__name__
+        elapsed = time.perf_counter() - started
+        with lock:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 200:
+                latencies.append(elapsed)
+
+    batching_before = batching_stats(session, args, headers) if endpoint == 'brainstorm' else None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(args.requests)))
+    wall = time.perf_counter() - started
+    batching_after = batching_stats(session, args, headers) if batching_before else None
+    session.close()
+
+    latencies.sort()
+    ok = len(latencies)
+    result = {
+        'endpoint': endpoint,
+        'concurrency': concurrency,
+        'requests': args.requests,
+        'ok': ok,
+        'error_rate': round(1 - ok / args.requests, 4),
+        'statuses': statuses,
+        'throughput_rps': round(ok / wall, 3) if wall else 0.0,
+        'p50_ms': _ms(percentile(latencies, 0.50)),
+        'p95_ms': _ms(percentile(latencies, 0.95)),
+        'p99_ms': _ms(percentile(latencies, 0.99))
+    }
+    if batching_after:
+        result['micro_batching'] = {
+            key: batching_after[key] - batching_before[key] for key in ('batches', 'batched', 'solo', 'fallbacks')
+        }
+    return result
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _key(result):
+    return f"{result['endpoint']}@{result['concurrency']}"
+
+
+def _change(value, reference):
+    if value is None or not reference:
+        return '      -'
+    return f"{(value - reference) / reference * 100:+6.1f}%"
+
+
+def print_results(results, baseline):
+    reference = {_key(entry): entry for entry in (baseline or {}).get('results', [])}
+    print(f"{'endpoint':<12}{'conc':>5}{'ok':>6}{'err%':>7}{'rps':>9}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" + ('  p95 vs base  rps vs base' if reference else ''))
+    for result in results:
+        row = (f"{result['endpoint']:<12}{result['concurrency']:>5}{result['ok']:>6}"
+               f"{result['error_rate'] * 100:>6.1f}%{result['throughput_rps']:>9.2f}"
+               + ''.join(f"{'-' if result[k] is None else result[k]:>10}" for k in ('p50_ms', 'p95_ms', 'p99_ms')))
+        base = reference.get(_key(result))
+        if base:
+            row += f"  {_change(result['p95_ms'], base['p95_ms']):>11}  {_change(result['throughput_rps'], base['throughput_rps']):>10}"
+        print(row)
+        batching = result.get('micro_batching')
+        if batching:
+            print(f"{'':<12}micro-batching: {batching['batched']} requests in {batching['batches']} shared "
+                  f"generations, {batching['solo']} alone, {batching['fallbacks']} generated again alone")
+        errors = {status: count for status, count in result['statuses'].items() if status != '200'}
+        if errors:
+            print(f"{'':<12}errors: " + ', '.join(f"{status} x{count}" for status, count in sorted(errors.items())))
+
+
+def regressions(results, baseline, tolerance):
+    """Entries whose p95 or throughput is worse than the baseline by more than `tolerance`"""
+    reference = {_key(entry): entry for entry in baseline.get('results', [])}
+    found = []
+    for result in results:
+        base = reference.get(_key(result))
+        if not base:
+            continue
+        if result['p95_ms'] and base['p95_ms'] and result['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            found.append(f"{_key(result)} p95 {base['p95_ms']} -> {result['p95_ms']} ms")
+        if base['throughput_rps'] and result['throughput_rps'] < base['throughput_rps'] * (1 - tolerance):
+            found.append(f"{_key(result)} throughput {base['throughput_rps']} -> {result['throughput_rps']} rps")
+        if result['error_rate'] > base['error_rate'] + tolerance:
+            found.append(f"{_key(result)} error rate {base['error_rate']} -> {result['error_rate']}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--base-url', default=os.getenv('BASE_URL', 'http://localhost:4001'))
+    parser.add_argument('--api-key', default=os.getenv('API_KEY'))
+    parser.add_argument('--concurrency', default='1,4,16', help='comma-separated levels')
+    parser.add_argument('--requests', type=int, default=20, help='requests per endpoint and level')
+    parser.add_argument('--endpoints', default='brainstorm,plan', help=f"any of {', '.join(ENDPOINTS)}")
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--cache', action='store_true', help='repeat one input and allow cached responses')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare with or save to')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed relative regression')
+    parser.add_argument('--label', default='', help='note stored with the results, e.g. fake server settings')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    endpoints = [name.strip() for name in args.endpoints.split(',') if name.strip()]
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(unknown)}")
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    results = []
+    for endpoint in endpoints:
+        for concurrency in levels:
+            print(f"  {endpoint} x{args.requests} at concurrency {concurrency}...", file=sys.stderr)
+            results.append(run_level(args, endpoint, concurrency))
+    run = {
+        'label': args.label,
+        'base_url': args.base_url,
+        'requests_per_level': args.requests,
+        'cache': args.cache,
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results
+    }
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print(f"baseline: {args.baseline} ({baseline.get('recorded_at')}"
+              + (f", {baseline['label']}" if baseline.get('label') else '') + ')')
+        if baseline.get('requests_per_level') != args.requests:
+            print(f"warning: baseline used {baseline.get('requests_per_level')} requests per level")
+    print_results(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(run, f, indent=2)
+            f.write('\n')
+        print(f"saved baseline to {args.baseline}")
+    elif baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import pytest
+from flask import Flask
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# The config is read from the environment when app.config is first
+# imported: keep the tests' state in a scratch directory and away from a
+# real Ollama (nothing listens on the discard port).
+_data_dir = tempfile.mkdtemp(prefix='taskmgr-tests-')
+os.environ.update({
+    'FLASK_ENV': 'development',
+    'OLLAMA_URL': 'http://127.0.0.1:9',
+    'OLLAMA_WARMUP': 'False',
+    'OLLAMA_HEALTH_MONITOR': 'False',
+    'TASK_STORE_PATH': os.path.join(_data_dir, 'tasks.db'),
+    'JOB_STORE_PATH': os.path.join(_data_dir, 'jobs.db'),
+    'AI_ROUTE_RATE_LIMIT': '1000/minute',
+    'DEFAULT_RATE_LIMIT': '1000/minute'
+})
+
+
+@pytest.fixture(scope='session')
+def app():
+    from app import create_app
+    return create_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def bare_app(tmp_path):
+    """A Flask app with just the config a single extension's init_app reads"""
+    app = Flask('tests')
+    app.config.update(
+        TASK_STORE_PATH=str(tmp_path / 'tasks.db'),
+        TASK_SYNC_PAGE_SIZE=500,
+        TASK_TOMBSTONE_TTL=30 * 86400,
+        JOB_STORE_PATH=str(tmp_path / 'jobs.db'),
+        JOB_MAX_PENDING=4,
+        JOB_RESULT_TTL=600,
+        JOB_TIMEOUT=300,
+        LLM_MAX_CONCURRENCY=2,
+        LLM_MAX_QUEUE=32
+    )
+    return app
@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.asgi import AsyncAIApp
+from app.extensions import ollama, task_store
+
+CLIENT_ADDR = '10.0.0.7'
+
+
+class _Generation:
+    status_code = 200
+
+    def json(self):
+        return {'response': json.dumps([{'title': 'Book flights', 'priority': 'high'}]), 'done': True}
+
+
+@pytest.fixture
+def asgi_post(app):
+    asgi_app = AsyncAIApp(app)
+
+    def post(path, body):
+        async def send():
+            transport = httpx.ASGITransport(app=asgi_app, client=(CLIENT_ADDR, 4000))
+            async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+                return await client.post(path, json=body, headers={'Cache-Control': 'no-store'})
+        return asyncio.run(send())
+
+    return post
+
+
+def _flask_post(client, path, body):
+    return client.post(path, json=body, headers={'Cache-Control': 'no-store'},
+                       environ_base={'REMOTE_ADDR': CLIENT_ADDR})
+
+
+def test_asgi_and_flask_routes_share_the_route_limit(app, client, asgi_post, monkeypatch):
+    monkeypatch.setitem(app.config, 'AI_ROUTE_RATE_LIMIT', '1/minute;2/hour')
+    plan = {'tasks': [{'id': 1, 'title': 'Write report'}]}
+
+    assert asgi_post('/api/generate-plan?mode=fast', plan).status_code == 200
+    assert _flask_post(client, '/api/generate-plan?mode=fast', plan).status_code == 429
+
+
+def test_asgi_and_flask_routes_share_the_token_budget(app, client, asgi_post, monkeypatch):
+    monkeypatch.setattr(ollama, 'generate', lambda payload, stream=False: _Generation())
+    # Room for one brainstorm (about 1200 tokens) but not two
+    monkeypatch.setitem(app.config, 'AI_TOKEN_BUDGET', '2000/hour')
+
+    assert _flask_post(client, '/api/brainstorm', {'context': 'Plan a trip'}).status_code == 200
+    assert asgi_post('/api/brainstorm', {'context': 'Plan a move'}).status_code == 429
+
+
+def test_asgi_plan_reads_stored_tasks_once(asgi_post, monkeypatch):
+    selects = []
+
+    def select(tenant, task_ids=None, filters=None, limit=None):
+        selects.append(task_ids)
+        return [{'id': 1, 'title': 'Write report'}]
+
+    monkeypatch.setattr(task_store, 'select', select)
+    response = asgi_post('/api/generate-plan?mode=fast', {'taskIds': [1]})
+
+    assert response.status_code == 200 and len(response.json()['tasks']) == 1
+    assert selects == [[1]]
+
+
+def test_asgi_plan_rejects_an_invalid_payload(asgi_post):
+    response = asgi_post('/api/generate-plan', {'taskIds': 'not a list'})
+    assert response.status_code == 400 and response.json() == {'error': '400 Bad Request: taskIds must be an array'}
@@ -0,0 +1,89 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import health
+from app.services.health import CircuitBreaker, OllamaUnavailableError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(health, 'time', SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def _open_breaker(clock, failure_threshold=3, reset_timeout=30.0):
+    breaker = CircuitBreaker(failure_threshold, reset_timeout)
+    for _ in range(failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record_failure()
+    breaker.record_failure()
+    clock.now += 10
+    with pytest.raises(OllamaUnavailableError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_after == pytest.approx(20.0)
+
+
+def test_half_open_lets_a_single_trial_through(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+    passed = []
+    barrier = threading.Barrier(8)
+
+    def call():
+        barrier.wait()
+        try:
+            breaker.before_call()
+            passed.append(True)
+        except OllamaUnavailableError as e:
+            assert e.retry_after == 1.0
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    assert len(passed) == 1
+
+
+def test_successful_trial_closes(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_success()
+
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.before_call()
+
+
+def test_failed_trial_reopens_for_a_full_timeout(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    with pytest.raises(OllamaUnavailableError):
+        breaker.before_call()
+    clock.now += 1
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,44 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import requests
+
+from app.services.health import OllamaHealthMonitor
+
+
+class _SlowClient:
+    """Every probe takes `delay` seconds and then fails to connect"""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.probing = threading.Event()
+        self.backends = [SimpleNamespace(url='http://ollama:11434', record_probe=lambda *args: False)]
+
+    def tags(self, backend):
+        self.probing.set()
+        time.sleep(self.delay)
+        raise requests.exceptions.ConnectionError('refused')
+
+
+def test_stop_waits_for_a_probe_in_progress():
+    client = _SlowClient(0.2)
+    monitor = OllamaHealthMonitor(client)
+    monitor.start()
+    assert client.probing.wait(2)
+
+    assert monitor.stop(timeout=2)
+
+
+def test_stop_gives_up_after_the_timeout():
+    client = _SlowClient(0.5)
+    monitor = OllamaHealthMonitor(client)
+    monitor.start()
+    assert client.probing.wait(2)
+
+    assert not monitor.stop(timeout=0.01)
+    assert monitor.stop(timeout=2)
+
+
+def test_stop_before_start():
+    assert OllamaHealthMonitor(_SlowClient(0)).stop(timeout=1)
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from app.services.jobs import (
+    FAILED, IdempotencyConflictError, JobQueueFullError, JobStore, SUCCEEDED, request_fingerprint
+)
+
+
+@pytest.fixture
+def jobs(bare_app):
+    jobs = JobStore()
+    jobs.init_app(bare_app)
+    yield jobs
+    jobs.shutdown(wait=True)
+
+
+def _wait_finished(jobs, job_id, tenant, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        job = jobs.get(job_id, tenant)
+        if job['status'] in (SUCCEEDED, FAILED):
+            return job
+        if time.monotonic() > deadline:
+            raise AssertionError(f'job still {job["status"]}')
+        time.sleep(0.005)
+
+
+def _counting_work(calls):
+    def work():
+        calls.append(1)
+        return 200, {'ok': True}, {'X-Cache': 'MISS'}
+    return work
+
+
+def test_reused_key_returns_the_existing_job(jobs):
+    calls = []
+    fingerprint = request_fingerprint('brainstorm', {'context': 'trip'})
+    job, created = jobs.submit('brainstorm', 'alice', _counting_work(calls), 'key-1', fingerprint)
+    assert created
+    finished = _wait_finished(jobs, job['id'], 'alice')
+    assert finished['result'] == {'ok': True} and finished['headers'] == {'X-Cache': 'MISS'}
+
+    again, created = jobs.submit('brainstorm', 'alice', _counting_work(calls), 'key-1', fingerprint)
+    assert not created and again['id'] == job['id']
+    assert calls == [1]
+    assert jobs.stats()['deduplicated'] == 1
+
+
+def test_reused_key_for_a_different_request_conflicts(jobs):
+    calls = []
+    jobs.submit('brainstorm', 'alice', _counting_work(calls), 'key-1', request_fingerprint({'context': 'trip'}))
+    with pytest.raises(IdempotencyConflictError):
+        jobs.submit('brainstorm', 'alice', _counting_work(calls), 'key-1', request_fingerprint({'context': 'move'}))
+
+
+def test_concurrent_retries_start_one_job(jobs):
+    calls = []
+    release = threading.Event()
+
+    def work():
+        calls.append(1)
+        release.wait(2)
+        return 200, {}, {}
+
+    results = []
+    barrier = threading.Barrier(6)
+
+    def submit():
+        barrier.wait()
+        results.append(jobs.submit('plan', 'alice', work, 'key-1', 'same'))
+
+    threads = [threading.Thread(target=submit) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(2)
+    release.set()
+
+    assert len({job['id'] for job, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    _wait_finished(jobs, results[0][0]['id'], 'alice')
+    assert calls == [1]
+
+
+def test_keys_and_jobs_are_per_tenant(jobs):
+    calls = []
+    alice, _ = jobs.submit('brainstorm', 'alice', _counting_work(calls), 'key-1', 'a')
+    bob, created = jobs.submit('brainstorm', 'bob', _counting_work(calls), 'key-1', 'b')
+
+    assert created and bob['id'] != alice['id']
+    assert jobs.get(alice['id'], 'bob') is None
+    assert jobs.get(alice['id'], 'alice') is not None
+
+
+def test_submission_after_shutdown_fails_the_job(jobs):
+    jobs.shutdown(wait=True)
+    with pytest.raises(JobQueueFullError):
+        jobs.submit('brainstorm', 'alice', _counting_work([]), 'key-1', 'a')
+
+    stats = jobs.stats()
+    assert stats['rejected'] == 1 and stats['pending'] == 0
+    # A retry with the key finds the failed job rather than starting another
+    retried, created = jobs.submit('brainstorm', 'alice', _counting_work([]), 'key-1', 'a')
+    assert not created
+    assert retried['status'] == FAILED and retried['statusCode'] == 503
+
+
+def test_route_answers_422_for_a_reused_key(client):
+    headers = {'Idempotency-Key': 'plan-1', 'X-API-Key': 'route-tests'}
+    body = {'tasks': [{'id': 1, 'title': 'Write report', 'priority': 'high'}]}
+    first = client.post('/api/generate-plan?async=1&mode=fast', json=body, headers=headers)
+    assert first.status_code == 202
+
+    retry = client.post('/api/generate-plan?async=1&mode=fast', json=body, headers=headers)
+    assert retry.status_code == 202 and retry.get_json()['id'] == first.get_json()['id']
+
+    changed = dict(body, tasks=body['tasks'] + [{'id': 2, 'title': 'Email'}])
+    conflict = client.post('/api/generate-plan?async=1&mode=fast', json=changed, headers=headers)
+    assert conflict.status_code == 422
+
+    other_tenant = client.get(first.headers['Location'], headers={'X-API-Key': 'someone-else'})
+    assert other_tenant.status_code == 404
@@ -0,0 +1,81 @@
+import json
+
+from app.services.json_stream import JSONItemStream, extract_json, repair_json
+
+
+def _chunks(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _only_objects(data):
+    return data if all(isinstance(item, dict) for item in data) else None
+
+
+def test_repair_drops_a_truncated_last_item():
+    text = '[{"title": "Book flights", "priority": "high"}, {"title": "Pack'
+    assert json.loads(repair_json(text)) == [{'title': 'Book flights', 'priority': 'high'}]
+
+
+def test_repair_closes_containers_cut_mid_list():
+    text = '{"suggestion": "Busy day", "tasks": [{"title": "a", "subtasks": ["x", "y"'
+    assert json.loads(repair_json(text)) == {
+        'suggestion': 'Busy day', 'tasks': [{'title': 'a', 'subtasks': ['x', 'y']}]
+    }
+
+
+def test_repair_fixes_bare_keys_trailing_commas_and_raw_newlines():
+    text = '[{title: "a", description: "line one\nline two",}, {title: "b"},]'
+    assert json.loads(repair_json(text)) == [
+        {'title': 'a', 'description': 'line one\nline two'}, {'title': 'b'}
+    ]
+
+
+def test_repair_corrects_a_mismatched_closer():
+    assert json.loads(repair_json('[{"title": "a"]')) == [{'title': 'a'}]
+
+
+def test_extract_json_reads_fenced_output():
+    text = 'Here you go:\n```json\n[{"title": "a"}, {"title": "b"}]\n```\nGood luck!'
+    assert extract_json(text) == [{'title': 'a'}, {'title': 'b'}]
+
+
+def test_extract_json_skips_a_bracketed_aside_the_validator_rejects():
+    text = 'Pick [1, 2, 3] of these:\n```json\n[{"title": "a"}]\n```'
+    assert extract_json(text, validate=_only_objects) == [{'title': 'a'}]
+
+
+def test_extract_json_repairs_truncated_fenced_output():
+    text = '```json\n[{"title": "a"}, {"title": "b"}, {"tit'
+    assert extract_json(text) == [{'title': 'a'}, {'title': 'b'}]
+
+
+def test_stream_emits_items_as_they_close():
+    text = '```json\n[{"title": "a", "subtasks": [{"step": 1}]}, {"title": "b \\"quoted\\" }"}]\n```'
+    stream = JSONItemStream()
+    emitted = []
+    for chunk in _chunks(text, 3):
+        emitted.append(stream.feed(chunk))
+
+    items = [item for batch in emitted for item in batch]
+    # Nested objects stay inside their item; braces in strings are text
+    assert items == [{'title': 'a', 'subtasks': [{'step': 1}]}, {'title': 'b "quoted" }'}]
+    # The first item was available before the output finished
+    first = next(index for index, batch in enumerate(emitted) if batch)
+    assert first < len(emitted) - 5
+    assert stream.value() == items
+
+
+def test_stream_handles_an_escape_split_across_chunks():
+    stream = JSONItemStream()
+    items = stream.feed('[{"title": "a\\') + stream.feed('"b"}]')
+    assert items == [{'title': 'a"b'}]
+
+
+def test_stream_value_recovers_truncated_output():
+    stream = JSONItemStream()
+    items = []
+    for chunk in _chunks('Sure! [{"title": "a"}, {"title": "b"}, {"title": "c', 4):
+        items.extend(stream.feed(chunk))
+
+    assert items == [{'title': 'a'}, {'title': 'b'}]
+    assert stream.value() == [{'title': 'a'}, {'title': 'b'}]
@@ -0,0 +1,135 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.micro_batch import AsyncMicroBatcher, MicroBatcher
+
+
+def _batcher(saturated=True, window=1.0, max_size=3):
+    batcher = MicroBatcher(SimpleNamespace(saturated=lambda: saturated))
+    batcher.enabled = True
+    batcher.window = window
+    batcher.max_size = max_size
+    return batcher
+
+
+def _submit_all(batcher, items, run):
+    """Submit `items` under one key from concurrent threads, leader first
+
+    Returns {item: result or raised exception}.
+    """
+    outcomes = {}
+
+    def submit(item):
+        try:
+            outcomes[item] = batcher.submit('key', item, run)
+        except Exception as e:
+            outcomes[item] = e
+
+    threads = []
+    for item in items:
+        threads.append(threading.Thread(target=submit, args=(item,)))
+        threads[-1].start()
+        if len(threads) == 1:
+            # Followers must find the leader's open batch
+            deadline = time.monotonic() + 2
+            while 'key' not in batcher._open:
+                assert time.monotonic() < deadline
+                time.sleep(0.001)
+    for thread in threads:
+        thread.join(3)
+    return outcomes
+
+
+def test_full_batch_runs_once_and_each_caller_gets_its_part():
+    calls = []
+
+    def run(take):
+        items = take()
+        calls.append(items)
+        return [item.upper() for item in items]
+
+    batcher = _batcher()
+    started = time.monotonic()
+    outcomes = _submit_all(batcher, ['a', 'b', 'c'], run)
+
+    assert outcomes == {'a': 'A', 'b': 'B', 'c': 'C'}
+    assert len(calls) == 1 and sorted(calls[0]) == ['a', 'b', 'c']
+    # Filling the batch ends the window early
+    assert time.monotonic() - started < 0.9
+    stats = batcher.stats()
+    assert stats['batches'] == 1 and stats['batched'] == 3 and stats['open'] == 0
+
+
+def test_follower_without_a_usable_part_gets_none():
+    outcomes = _submit_all(_batcher(max_size=2), ['a', 'b'], lambda take: [take()[0].upper(), None])
+    assert outcomes == {'a': 'A', 'b': None}
+
+
+def test_leader_error_reaches_every_follower():
+    def run(take):
+        take()
+        raise ValueError('model failed')
+
+    outcomes = _submit_all(_batcher(), ['a', 'b', 'c'], run)
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes.values())
+
+
+def test_error_before_take_still_releases_followers():
+    batcher = _batcher(window=0.05, max_size=4)
+
+    def run(take):
+        raise RuntimeError('no slot')
+
+    outcomes = _submit_all(batcher, ['a', 'b'], run)
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes.values())
+    assert batcher._open == {}
+
+
+def test_leader_runs_at_once_while_a_slot_is_free():
+    batcher = _batcher(saturated=False, window=5.0)
+    started = time.monotonic()
+    assert batcher.submit('key', 'a', lambda take: [item.upper() for item in take()]) == 'A'
+    assert time.monotonic() - started < 1.0
+    assert batcher.stats()['solo'] == 1
+
+
+def test_async_leader_error_reaches_followers():
+    batcher = AsyncMicroBatcher(_batcher(window=0.05))
+
+    async def run(take):
+        take()
+        raise ValueError('model failed')
+
+    async def main():
+        leader = asyncio.ensure_future(batcher.submit('key', 'a', run))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(batcher.submit('key', 'b', run))
+        results = await asyncio.gather(leader, follower, return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+
+    asyncio.run(main())
+
+
+def test_async_followers_generate_alone_when_the_leader_is_cancelled():
+    batcher = AsyncMicroBatcher(_batcher(window=5.0))
+
+    async def run(take):
+        take()
+        await asyncio.sleep(10)
+
+    async def main():
+        # Cancelled while its window is open
+        leader = asyncio.ensure_future(batcher.submit('key', 'a', run))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(batcher.submit('key', 'b', run))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await asyncio.wait_for(follower, 1) is None
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
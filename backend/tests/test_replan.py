@@ -0,0 +1,125 @@
+import pytest
+
+from app.services.ai_service import CACHE_DEFAULT, PLAN_AUTO, PLAN_LLM, AIService
+
+
+def _entry(title, start, end):
+    return {'title': title, 'reason': '', 'timeEstimate': '', 'startTime': start, 'endTime': end, 'subtasks': []}
+
+
+PREVIOUS = {
+    'suggestion': 'Deep work first.',
+    'tasks': [
+        _entry('Write report', '08:00', '09:30'),
+        _entry('Email', '09:45', '10:45'),
+        _entry('Review', '13:00', '14:00'),
+        _entry('Call', '14:15', '14:45')
+    ]
+}
+
+
+@pytest.fixture
+def service():
+    return AIService(replan_max_changes=5, replan_max_ratio=0.5)
+
+
+def _times(plan):
+    return [(entry['title'], entry['startTime'], entry['endTime']) for entry in plan['tasks']]
+
+
+def test_scope_keeps_unchanged_entries_and_places_added_tasks_in_free_time(service):
+    scope = service._replan_scope(PREVIOUS, {'added': [{'title': 'Pay bills', 'priority': 'low'}],
+                                             'removed': ['Email']})
+
+    assert [entry['title'] for entry in scope['kept']] == ['Write report', 'Review', 'Call']
+    # First free time after the kept 08:00-09:30 entry and its break
+    assert [(entry['title'], entry['startTime'], entry['endTime']) for entry in scope['entries']] == [
+        ('Pay bills', '09:45', '10:15')
+    ]
+    assert scope['suggestion'] == 'Deep work first.'
+    assert scope['chunk'] is not None
+
+
+def test_scope_replaces_an_edited_task(service):
+    scope = service._replan_scope(PREVIOUS, {'added': [{'title': 'Call', 'priority': 'high'}],
+                                             'removed': ['Call']})
+
+    assert [entry['title'] for entry in scope['kept']] == ['Write report', 'Email', 'Review']
+    assert [entry['title'] for entry in scope['entries']] == ['Call']
+
+
+@pytest.mark.parametrize('changes', [
+    # Over REPLAN_MAX_CHANGE_RATIO of the four entries
+    {'added': [{'title': 'a'}, {'title': 'b'}, {'title': 'c'}]},
+    {'added': [{'title': 'a'}], 'removed': ['Email', 'Review']}
+])
+def test_scope_plans_from_scratch_for_large_diffs(service, changes):
+    assert service._replan_scope(PREVIOUS, changes) is None
+
+
+def test_scope_plans_from_scratch_over_max_changes():
+    service = AIService(replan_max_changes=1, replan_max_ratio=1.0)
+    assert service._replan_scope(PREVIOUS, {'added': [{'title': 'a'}], 'removed': ['Email']}) is None
+
+
+def test_scope_plans_from_scratch_without_usable_times(service):
+    previous = {'suggestion': '', 'tasks': PREVIOUS['tasks'][:3] + [_entry('Call', 'later', '')]}
+    assert service._replan_scope(previous, {'added': [{'title': 'a'}]}) is None
+
+
+def test_scope_plans_from_scratch_when_added_tasks_do_not_fit():
+    service = AIService(replan_max_changes=20, replan_max_ratio=5.0)
+    added = [{'title': f'Task {i}', 'priority': 'high'} for i in range(8)]
+    assert service._replan_scope(PREVIOUS, {'added': added}) is None
+
+
+def test_scope_plans_from_scratch_without_a_previous_plan(service):
+    assert service._replan_scope({'suggestion': 'x', 'tasks': []}, {'added': [{'title': 'a'}]}) is None
+
+
+def _scope(service, *titles):
+    return service._replan_scope(PREVIOUS, {'added': [{'title': title, 'priority': 'low'} for title in titles]})
+
+
+def test_merge_keeps_llm_entries_that_fit(service):
+    update = _scope(service, 'Pay bills')
+    plan = service._merge_replan(update, ({'tasks': [_entry('Pay bills', '11:15', '11:45')]}, False),
+                                 CACHE_DEFAULT, PLAN_AUTO)
+
+    assert service.plan_mode == 'llm' and service.cache_status == 'MISS'
+    assert _times(plan) == [
+        ('Write report', '08:00', '09:30'), ('Email', '09:45', '10:45'), ('Pay bills', '11:15', '11:45'),
+        ('Review', '13:00', '14:00'), ('Call', '14:15', '14:45')
+    ]
+    assert plan['suggestion'] == 'Deep work first.'
+
+
+def test_merge_falls_back_when_the_llm_overlaps_kept_entries(service):
+    update = _scope(service, 'Pay bills')
+    plan = service._merge_replan(update, ({'tasks': [_entry('Pay bills', '08:30', '09:00')]}, True),
+                                 CACHE_DEFAULT, PLAN_AUTO)
+
+    assert service.plan_mode == 'fallback'
+    assert ('Pay bills', '11:00', '11:30') in _times(plan)
+    assert ('Pay bills', '08:30', '09:00') not in _times(plan)
+
+
+def test_merge_fills_tasks_the_llm_skipped(service):
+    update = _scope(service, 'Pay bills', 'Water plants')
+    plan = service._merge_replan(update, ({'tasks': [_entry('Pay bills', '15:00', '15:30')]}, True),
+                                 CACHE_DEFAULT, PLAN_AUTO)
+
+    assert service.plan_mode == 'partial' and service.cache_status == 'HIT'
+    titles = [title for title, _, _ in _times(plan)]
+    assert titles.count('Pay bills') == 1 and titles.count('Water plants') == 1
+    assert len(plan['tasks']) == 6
+
+
+def test_merge_in_llm_mode_reports_skipped_tasks_as_deferred(service):
+    update = _scope(service, 'Pay bills', 'Water plants')
+    plan = service._merge_replan(update, ({'tasks': [_entry('Pay bills', '15:00', '15:30')]}, False),
+                                 CACHE_DEFAULT, PLAN_LLM)
+
+    assert service.plan_mode == 'llm'
+    assert 'Water plants' not in [title for title, _, _ in _times(plan)]
+    assert plan['suggestion'] == 'Deep work first. 1 lower-priority task did not fit today and can wait.'
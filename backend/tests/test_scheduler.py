@@ -0,0 +1,201 @@
+import asyncio
+import random
+import threading
+import time
+
+import pytest
+
+from app.services.scheduler import LLMScheduler, SchedulerOverloadedError
+
+
+def _scheduler(max_concurrency=1, max_queue=32, max_wait=5.0):
+    scheduler = LLMScheduler()
+    scheduler.max_concurrency = max_concurrency
+    scheduler.max_queue = max_queue
+    scheduler.max_wait = max_wait
+    return scheduler
+
+
+def _wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError('condition not reached')
+        time.sleep(0.001)
+
+
+def _queue(scheduler, tenant, label, order):
+    """Start a thread that acquires for `tenant` and records `label` once granted"""
+    depth = scheduler.queue_depth()
+    thread = threading.Thread(target=lambda: (scheduler.acquire(tenant), order.append(label)), daemon=True)
+    thread.start()
+    _wait_until(lambda: scheduler.queue_depth() == depth + 1)
+    return thread
+
+
+def test_admits_up_to_max_concurrency_then_queues():
+    scheduler = _scheduler(max_concurrency=2)
+    scheduler.acquire('a')
+    scheduler.acquire('a')
+    order = []
+    thread = _queue(scheduler, 'a', 'third', order)
+    assert order == [] and scheduler.stats()['active'] == 2
+
+    scheduler.release(1.0)
+    thread.join(2)
+    # The slot was handed over, not freed and retaken
+    assert order == ['third']
+    assert scheduler.stats()['active'] == 2
+    assert scheduler.queue_depth() == 0
+
+
+def test_tenants_are_served_round_robin():
+    scheduler = _scheduler()
+    scheduler.acquire('holder')
+    order = []
+    threads = [_queue(scheduler, tenant, label, order)
+               for tenant, label in [('a', 'a1'), ('a', 'a2'), ('a', 'a3'), ('b', 'b1')]]
+
+    for granted in range(1, len(threads) + 1):
+        scheduler.release(1.0)
+        _wait_until(lambda: len(order) == granted)
+    for thread in threads:
+        thread.join(2)
+
+    # b's single request does not wait behind all of a's
+    assert order == ['a1', 'b1', 'a2', 'a3']
+
+
+def test_sheds_when_the_queue_is_full():
+    scheduler = _scheduler(max_queue=1)
+    scheduler.acquire('a')
+    order = []
+    thread = _queue(scheduler, 'a', 'queued', order)
+
+    with pytest.raises(SchedulerOverloadedError) as excinfo:
+        scheduler.acquire('b')
+    assert excinfo.value.retry_after > 0
+    assert scheduler.stats()['shed'] == 1
+
+    scheduler.release()
+    thread.join(2)
+    assert order == ['queued']
+
+
+def test_sheds_when_the_estimated_wait_exceeds_max_wait():
+    scheduler = _scheduler(max_wait=5.0)
+    # Observed generations take 30s, so a queued request would wait too long
+    scheduler.acquire('a')
+    scheduler.release(30.0)
+    scheduler.acquire('a')
+
+    started = time.monotonic()
+    with pytest.raises(SchedulerOverloadedError) as excinfo:
+        scheduler.acquire('b')
+    assert time.monotonic() - started < 1.0
+    assert excinfo.value.retry_after >= 30.0
+    assert scheduler.queue_depth() == 0
+
+
+def test_failed_generations_stay_out_of_the_service_time():
+    scheduler = _scheduler()
+    with scheduler.slot('a'):
+        time.sleep(0.01)
+
+    with pytest.raises(RuntimeError):
+        with scheduler.slot('a'):
+            time.sleep(0.6)
+            raise RuntimeError('Ollama timed out')
+    stats = scheduler.stats()
+    assert 0.005 < stats['avg_service_s'] < 0.1
+    assert stats['active'] == 0
+
+
+def test_times_out_after_max_wait():
+    scheduler = _scheduler(max_wait=0.05)
+    scheduler.acquire('a')
+
+    with pytest.raises(SchedulerOverloadedError):
+        scheduler.acquire('b')
+    stats = scheduler.stats()
+    assert stats['timeouts'] == 1 and stats['queued'] == 0 and stats['active'] == 1
+
+
+def test_timeout_racing_a_grant_never_loses_a_slot():
+    scheduler = _scheduler(max_wait=0.01)
+    rng = random.Random(7)
+    outcomes = {'granted': 0, 'timed_out': 0}
+    for _ in range(200):
+        scheduler.acquire('holder')
+        result = []
+
+        def waiter():
+            try:
+                scheduler.acquire('racer')
+                result.append('granted')
+            except SchedulerOverloadedError:
+                result.append('timed_out')
+
+        thread = threading.Thread(target=waiter)
+        thread.start()
+        # Release around the moment the waiter gives up
+        time.sleep(rng.uniform(0.005, 0.015))
+        scheduler.release()
+        thread.join(2)
+
+        outcomes[result[0]] += 1
+        if result[0] == 'granted':
+            scheduler.release()
+        stats = scheduler.stats()
+        assert stats['active'] == 0 and stats['queued'] == 0, result
+    assert outcomes['granted'] and outcomes['timed_out']
+
+
+def test_async_waiter_is_granted_from_another_thread():
+    scheduler = _scheduler()
+
+    async def main():
+        scheduler.acquire('holder')
+        waiter = asyncio.ensure_future(scheduler.acquire_async('a'))
+        await asyncio.sleep(0.01)
+        assert scheduler.queue_depth() == 1 and not waiter.done()
+        threading.Thread(target=scheduler.release, args=(1.0,)).start()
+        await asyncio.wait_for(waiter, 2)
+
+    asyncio.run(main())
+    assert scheduler.stats()['active'] == 1
+
+
+def test_async_waiters_share_the_queue_limit_and_max_wait():
+    scheduler = _scheduler(max_queue=1, max_wait=0.05)
+
+    async def main():
+        scheduler.acquire('holder')
+        waiter = asyncio.ensure_future(scheduler.acquire_async('a'))
+        await asyncio.sleep(0.01)
+        with pytest.raises(SchedulerOverloadedError):
+            await scheduler.acquire_async('b')
+        with pytest.raises(SchedulerOverloadedError):
+            await waiter
+
+    asyncio.run(main())
+    stats = scheduler.stats()
+    assert stats['shed'] == 1 and stats['timeouts'] == 1
+    assert stats['queued'] == 0 and stats['active'] == 1
+
+
+def test_cancelled_async_waiter_returns_a_granted_slot():
+    scheduler = _scheduler()
+
+    async def main():
+        scheduler.acquire('holder')
+        waiter = asyncio.ensure_future(scheduler.acquire_async('a'))
+        await asyncio.sleep(0.01)
+        # Cancelled after release() handed it the slot, before it resumed
+        waiter.cancel()
+        scheduler.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+    asyncio.run(main())
+    assert scheduler.stats()['active'] == 0
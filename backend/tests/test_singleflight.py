@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.services.singleflight import AsyncSingleFlight
+
+
+def test_async_followers_share_the_leaders_result():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'tasks': []}
+
+    async def main():
+        results = await asyncio.gather(*(flight.do('key', fn) for _ in range(3)))
+        assert results == [{'tasks': []}] * 3
+        # Followers get copies
+        assert results[0] is not results[1]
+
+    asyncio.run(main())
+    assert calls == [1]
+    assert flight.stats() == {'executions': 1, 'coalesced': 2, 'in_flight': 0}
+
+
+def test_async_followers_run_the_call_when_the_leader_is_cancelled():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('key', fn))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do('key', fn)) for _ in range(2)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        # One follower takes over and the other waits on it
+        assert await asyncio.wait_for(asyncio.gather(*followers), 1) == [2, 2]
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+
+    asyncio.run(main())
+    assert calls == [1, 1]
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_async_cancelled_follower_leaves_the_leader_running():
+    flight = AsyncSingleFlight()
+
+    async def fn():
+        await asyncio.sleep(0.01)
+        return 'done'
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do('key', fn))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('key', fn))
+        await asyncio.sleep(0)
+        follower.cancel()
+        assert await leader == 'done'
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+
+    asyncio.run(main())
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+from werkzeug.test import EnvironBuilder
+
+from app.extensions import llm_scheduler, ollama
+
+
+class _StreamedGeneration:
+    """A 200 streaming /api/generate response that records close()"""
+
+    status_code = 200
+
+    def __init__(self, text):
+        self.lines = [json.dumps({'response': text}).encode(), json.dumps({'done': True}).encode()]
+        self.closed = False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def generation(monkeypatch):
+    generation = _StreamedGeneration('[{"title": "Book flights", "priority": "high"}]')
+    monkeypatch.setattr(ollama, 'generate', lambda payload, stream=False: generation)
+    return generation
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/api/brainstorm/stream', {'context': 'Plan a trip'}),
+    ('/api/generate-plan/stream?mode=llm', {'tasks': [{'id': 1, 'title': 'Write report'}]})
+])
+def test_stream_closed_unread_frees_its_slot(app, generation, path, body):
+    environ = EnvironBuilder(path, method='POST', json=body, headers={'Cache-Control': 'no-store'}).get_environ()
+    # The server closes the body without pulling a chunk: the client left
+    app_iter = app.wsgi_app(environ, lambda status, headers, exc_info=None: None)
+    assert llm_scheduler.stats()['active'] == 1
+
+    app_iter.close()
+    assert llm_scheduler.stats()['active'] == 0
+    assert generation.closed
+
+
+def test_stream_read_to_the_end_frees_its_slot(client, generation):
+    response = client.post('/api/brainstorm/stream', json={'context': 'Plan a trip'},
+                           headers={'Cache-Control': 'no-store'})
+    assert 'event: suggestion' in response.get_data(as_text=True)
+    response.close()
+    assert llm_scheduler.stats()['active'] == 0
@@ -0,0 +1,138 @@
+import sqlite3
+
+import pytest
+
+from app.services.task_store import TaskConflictError, TaskStore, UnknownCursorError
+
+
+@pytest.fixture
+def store(bare_app):
+    store = TaskStore()
+    store.init_app(bare_app)
+    return store
+
+
+def _task(task_id, **fields):
+    return dict({'id': task_id, 'title': f'Task {task_id}'}, **fields)
+
+
+def test_first_sync_is_a_snapshot_and_later_ones_are_deltas(store):
+    store.apply('alice', upserts=[_task(1), _task(2), _task(3)])
+    snapshot = store.changes('alice')
+    assert snapshot['reset'] and not snapshot['hasMore']
+    assert [task['id'] for task in snapshot['tasks']] == [1, 2, 3]
+
+    store.apply('alice', upserts=[_task(2, status='done')], deletes=[3])
+    delta = store.changes('alice', snapshot['cursor'])
+    assert not delta['reset']
+    assert delta['tasks'] == [_task(2, status='done')]
+    # Tombstones keep the client's id type
+    assert delta['deleted'] == [3]
+    assert store.changes('alice', delta['cursor'])['tasks'] == []
+
+
+def test_snapshots_leave_out_deleted_tasks(store):
+    store.apply('alice', upserts=[_task(1), _task(2)])
+    store.apply('alice', deletes=[1])
+    snapshot = store.changes('alice')
+    assert [task['id'] for task in snapshot['tasks']] == [2]
+    assert snapshot['deleted'] == []
+
+
+def test_deltas_page_through_changes(store):
+    store.apply('alice', upserts=[_task(i) for i in range(5)])
+    seen, cursor, pages = [], 0, 0
+    while True:
+        page = store.changes('alice', cursor, limit=2)
+        seen.extend(task['id'] for task in page['tasks'])
+        cursor = page['cursor']
+        pages += 1
+        if not page['hasMore']:
+            break
+    assert seen == [0, 1, 2, 3, 4] and pages == 3
+    assert cursor == store.version('alice')
+
+
+def test_cursor_older_than_purged_tombstones_gets_a_snapshot(store):
+    store.tombstone_ttl = 0
+    store.apply('alice', upserts=[_task(1), _task(2)])
+    old_cursor = store.version('alice')
+    store.apply('alice', deletes=[1])
+    # The next write purges the expired tombstone
+    store.apply('alice', upserts=[_task(3)])
+
+    stale = store.changes('alice', old_cursor)
+    assert stale['reset']
+    assert [task['id'] for task in stale['tasks']] == [2, 3]
+    current = store.changes('alice', store.version('alice') - 1)
+    assert not current['reset'] and [task['id'] for task in current['tasks']] == [3]
+
+
+def test_cursor_the_store_never_issued_is_rejected(store):
+    store.apply('alice', upserts=[_task(1)])
+    with pytest.raises(UnknownCursorError):
+        store.changes('alice', store.version('alice') + 1)
+
+
+def test_conflicting_write_changes_nothing(store):
+    version = store.apply('alice', upserts=[_task(1)])
+    store.apply('alice', upserts=[_task(1, title='Edited elsewhere')])
+
+    with pytest.raises(TaskConflictError) as excinfo:
+        store.apply('alice', upserts=[_task(1, title='Mine'), _task(2)], expected={'1': version})
+    assert excinfo.value.version == version + 1
+    assert store.get('alice', 1) == (_task(1, title='Edited elsewhere'), version + 1)
+    assert store.get('alice', 2) is None
+
+
+def test_tenants_have_their_own_tasks_and_versions(store):
+    store.apply('alice', upserts=[_task(1, status='todo'), _task(2)])
+    store.apply('bob', upserts=[_task(1, title='Bob')], deletes=[2])
+
+    assert store.version('alice') == 2 and store.version('bob') == 2
+    assert store.get('alice', 1)[0]['title'] == 'Task 1'
+    assert store.get('alice', 2) is not None
+    assert store.changes('bob')['tasks'] == [_task(1, title='Bob')]
+    assert store.select('alice', filters={'status': ['todo']}) == [_task(1, status='todo')]
+    assert store.select('bob', filters={'status': ['todo']}) == []
+    assert store.version('carol') == 0 and store.changes('carol')['tasks'] == []
+
+
+def test_select_filters_and_orders_by_due_date(store):
+    store.apply('alice', upserts=[
+        _task(1, status='todo', dueDate='2024-03-02', category='Work'),
+        _task(2, status='done', dueDate='2024-03-01', category='Work'),
+        _task(3, status='todo', dueDate='2024-02-28', category='Home'),
+        _task(4, status='todo')
+    ])
+
+    def ids(**filters):
+        return [task['id'] for task in store.select('alice', filters=filters)]
+
+    assert ids(excludeStatus=['done']) == [3, 1, 4]
+    assert ids(category='Work') == [2, 1]
+    assert ids(dueAfter='2024-03-01', dueBefore='2024-03-02') == [2, 1]
+    assert [task['id'] for task in store.select('alice', task_ids=[4, '1'])] == [1, 4]
+
+
+def test_unscoped_store_is_set_aside(bare_app):
+    conn = sqlite3.connect(bare_app.config['TASK_STORE_PATH'])
+    conn.execute(
+        "CREATE TABLE tasks (id TEXT PRIMARY KEY, data TEXT NOT NULL, status TEXT, category TEXT, "
+        "due_date TEXT, version INTEGER NOT NULL, updated_at REAL NOT NULL, deleted INTEGER NOT NULL DEFAULT 0)"
+    )
+    conn.execute("CREATE UNIQUE INDEX idx_tasks_version ON tasks (version)")
+    conn.execute("INSERT INTO tasks VALUES ('1', '{\"id\": 1}', NULL, NULL, NULL, 7, 0, 0)")
+    conn.commit()
+    conn.close()
+
+    store = TaskStore()
+    store.init_app(bare_app)
+    # Old cursors are unknown, so clients push their tasks again
+    with pytest.raises(UnknownCursorError):
+        store.changes('alice', 7)
+    store.apply('alice', upserts=[_task(1)])
+    assert store.changes('alice')['tasks'] == [_task(1)]
+    conn = sqlite3.connect(bare_app.config['TASK_STORE_PATH'])
+    assert conn.execute("SELECT COUNT(*) FROM tasks_unscoped").fetchone()[0] == 1
+    conn.close()
@@ -15,7 +15,7 @@ function App() {
   const [notificationsEnabled, setNotificationsEnabled] = useState(() => {
     return localStorage.getItem('taskManager_notifications') === 'true';
   });
-  const { tasks, addTask, updateTask, deleteTask, undoDelete } = useTasks();
+  const { tasks, synced, addTask, updateTask, deleteTask, undoDelete } = useTasks();
   const { categories, addCategory } = useCategories();
 
   // Initialize notifications when enabled
@@ -75,6 +75,7 @@ function App() {
         return (
           <DailyPlanner
             tasks={tasks}
+            synced={synced}
             onUpdateTask={handleUpdateTask}
             onAddTask={addTask}
           />
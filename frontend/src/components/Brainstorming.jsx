@@ -20,9 +20,17 @@ const Brainstorming = ({ categories, onAddTask }) => {
     setError(null);
     setSuggestions([]);
 
+    let received = 0;
     try {
-      const result = await apiService.brainstorm(context, taskType);
-      setSuggestions(result.suggestions || []);
+      await apiService.brainstormStream(context, taskType, (suggestion) => {
+        received += 1;
+        setSuggestions(prev => [...prev, suggestion]);
+      });
+      if (received === 0) {
+        // Nothing streamed back; fall back to the buffered endpoint
+        const result = await apiService.brainstorm(context, taskType);
+        setSuggestions(result.suggestions || []);
+      }
       toast.success('Ideas generated');
     } catch (err) {
       setError(err.message);
@@ -89,7 +97,7 @@ const Brainstorming = ({ categories, onAddTask }) => {
         </button>
       </form>
 
-      {loading && (
+      {loading && suggestions.length === 0 && (
         <div className="loading-state" role="status" aria-live="polite">
           Thinking up suggestions...
         </div>
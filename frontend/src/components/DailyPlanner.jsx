@@ -1,14 +1,16 @@
-import React, { useState } from 'react';
+import React, { useState, useRef } from 'react';
 import { apiService } from '../services/apiService';
 import { formatRelativeDate } from '../utils/dateUtils';
-import { sortByPriority } from '../utils/taskUtils';
+import { diffPlanTasks, sortByPriority } from '../utils/taskUtils';
 import { toast } from 'react-hot-toast';
 
-const DailyPlanner = ({ tasks, onUpdateTask, onAddTask }) => {
+const DailyPlanner = ({ tasks, synced, onUpdateTask, onAddTask }) => {
   const [loading, setLoading] = useState(false);
   const [plan, setPlan] = useState(null);
   const [error, setError] = useState(null);
   const [selectedTasks, setSelectedTasks] = useState(new Set());
+  // Tasks the current plan was generated from, to send only what changed
+  const plannedTasksRef = useRef(null);
 
   const incompleteTasks = tasks.filter(t => t.status !== 'done');
 
@@ -17,7 +19,21 @@ const DailyPlanner = ({ tasks, onUpdateTask, onAddTask }) => {
     setError(null);
     setSelectedTasks(new Set()); // Reset selections
     try {
-      const result = await apiService.generateDailyPlan(incompleteTasks);
+      // With a plan already on screen, send it with the task changes since;
+      // unchanged tasks keep their slots. No changes asks for a fresh plan.
+      const changes = plan && plannedTasksRef.current
+        ? diffPlanTasks(plannedTasksRef.current, incompleteTasks)
+        : null;
+      const update = changes && (changes.added.length || changes.removed.length)
+        ? { previousPlan: plan, changes }
+        : null;
+      // Once the server holds the same tasks, send a filter instead of the list
+      const result = await apiService.generateDailyPlan(
+        incompleteTasks,
+        synced ? { excludeStatus: 'done' } : null,
+        update
+      );
+      plannedTasksRef.current = incompleteTasks;
       setPlan(result);
     } catch (err) {
       setError(err.message);
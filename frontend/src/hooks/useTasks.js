@@ -1,17 +1,154 @@
-import { useState, useEffect, useRef } from 'react';
+import { useState, useEffect, useRef, useCallback } from 'react';
 import { storageService } from '../services/storageService';
+import { apiService } from '../services/apiService';
 import { toast } from 'react-hot-toast';
 
+const SYNC_DELAY = 1000;
+// Changes pushed per sync request (the server accepts TASK_SYNC_PAGE_SIZE)
+const SYNC_BATCH = 200;
+
+/**
+ * Merge a server delta into the local task list. Tasks with unsynced local
+ * changes keep their local version.
+ */
+const applyDelta = (tasks, delta, pending) => {
+  const incoming = delta.tasks.filter(task => !pending.has(task.id));
+  if (delta.reset) {
+    // Server snapshot plus local tasks it has not received yet
+    return [...incoming, ...tasks.filter(task => pending.get(task.id) === 'upsert')];
+  }
+  const deleted = new Set(delta.deleted.filter(id => !pending.has(id)));
+  const updates = new Map(incoming.map(task => [task.id, task]));
+  const merged = tasks
+    .filter(task => !deleted.has(task.id))
+    .map(task => {
+      const update = updates.get(task.id);
+      updates.delete(task.id);
+      return update || task;
+    });
+  return [...merged, ...updates.values()];
+};
+
+const saveSyncState = (cursor, pending) => {
+  storageService.saveSyncState({ cursor, pending: Array.from(pending) });
+};
+
 export const useTasks = () => {
   const [tasks, setTasks] = useState([]);
+  const [synced, setSynced] = useState(false);
   const isInitialLoad = useRef(true);
   const lastDeletedRef = useRef(null);
+  const tasksRef = useRef([]);
+  const cursorRef = useRef(null);
+  // Task id -> 'upsert' | 'delete' for changes the server has not seen
+  const pendingRef = useRef(new Map());
+  const syncTimerRef = useRef(null);
+  const syncingRef = useRef(false);
+  const resyncRef = useRef(false);
+
+  /**
+   * Push pending changes and pull the server's changes since the last
+   * cursor. Only changed tasks travel in either direction; failures keep
+   * the changes pending and the app keeps working from localStorage.
+   */
+  const syncNow = useCallback(async () => {
+    if (syncingRef.current) {
+      resyncRef.current = true;
+      return;
+    }
+    syncingRef.current = true;
+    const pending = pendingRef.current;
+    try {
+      if (cursorRef.current === null) {
+        // First sync: the server has none of the local tasks yet
+        tasksRef.current.forEach(task => {
+          if (!pending.has(task.id)) pending.set(task.id, 'upsert');
+        });
+      }
+      let more = true;
+      while (more) {
+        const batch = Array.from(pending).slice(0, SYNC_BATCH);
+        const upserts = batch
+          .filter(([, op]) => op === 'upsert')
+          .map(([id]) => tasksRef.current.find(task => task.id === id))
+          .filter(Boolean);
+        const deletes = batch.filter(([, op]) => op === 'delete').map(([id]) => id);
+        batch.forEach(([id]) => pending.delete(id));
 
-  // Load tasks from localStorage on mount
+        let delta;
+        try {
+          delta = await apiService.syncTasks({ since: cursorRef.current, upserts, deletes });
+        } catch (error) {
+          // Newer local changes made during the request take precedence
+          batch.forEach(([id, op]) => {
+            if (!pending.has(id)) pending.set(id, op);
+          });
+          if (error.response?.status === 409) {
+            // The server's store was recreated: start over with a full push
+            cursorRef.current = null;
+            resyncRef.current = true;
+          }
+          throw error;
+        }
+        cursorRef.current = delta.cursor;
+        if (delta.reset || delta.tasks.length > 0 || delta.deleted.length > 0) {
+          setTasks(prev => applyDelta(prev, delta, pending));
+        }
+        more = delta.hasMore || batch.length === SYNC_BATCH;
+      }
+      setSynced(pending.size === 0);
+    } catch (error) {
+      console.warn('Task sync failed; changes stay queued locally', error);
+      setSynced(false);
+    } finally {
+      saveSyncState(cursorRef.current, pending);
+      syncingRef.current = false;
+      if (resyncRef.current) {
+        resyncRef.current = false;
+        syncNow();
+      }
+    }
+  }, []);
+
+  const scheduleSync = () => {
+    if (syncTimerRef.current) {
+      clearTimeout(syncTimerRef.current);
+    }
+    syncTimerRef.current = setTimeout(() => {
+      syncTimerRef.current = null;
+      syncNow();
+    }, SYNC_DELAY);
+  };
+
+  const markChanged = (id, op) => {
+    pendingRef.current.set(id, op);
+    setSynced(false);
+    saveSyncState(cursorRef.current, pendingRef.current);
+    scheduleSync();
+  };
+
+  // Load tasks from localStorage on mount, then sync with the server
   useEffect(() => {
     const loadedTasks = storageService.getTasks();
+    const syncState = storageService.getSyncState();
+    tasksRef.current = loadedTasks;
+    cursorRef.current = syncState.cursor;
+    pendingRef.current = new Map(syncState.pending);
     setTasks(loadedTasks);
-  }, []);
+    syncNow();
+
+    window.addEventListener('focus', syncNow);
+    return () => {
+      window.removeEventListener('focus', syncNow);
+      if (syncTimerRef.current) {
+        clearTimeout(syncTimerRef.current);
+      }
+    };
+  }, [syncNow]);
+
+  useEffect(() => {
+    tasksRef.current = tasks;
+  }, [tasks]);
 
   // Persist tasks with debounce to avoid excessive writes
   useEffect(() => {
@@ -42,6 +179,7 @@ export const useTasks = () => {
       status: task.status || 'todo'
     };
     setTasks(prev => [...prev, newTask]);
+    markChanged(newTask.id, 'upsert');
     return newTask;
   };
 
@@ -54,6 +192,7 @@ export const useTasks = () => {
     setTasks(prev => prev.map(task =>
       task.id === id ? { ...task, ...updates } : task
     ));
+    markChanged(id, 'upsert');
   };
 
   /**
@@ -68,6 +207,7 @@ export const useTasks = () => {
       }
       return prev.filter(task => task.id !== id);
     });
+    markChanged(id, 'delete');
   };
 
   const undoDelete = () => {
@@ -75,6 +215,7 @@ export const useTasks = () => {
     const restored = lastDeletedRef.current;
     lastDeletedRef.current = null;
     setTasks(prev => [...prev, restored]);
+    markChanged(restored.id, 'upsert');
   };
 
   /**
@@ -106,6 +247,7 @@ export const useTasks = () => {
 
   return {
     tasks,
+    synced,
     addTask,
     updateTask,
     deleteTask,
@@ -20,6 +20,96 @@ const withRetry = async (requestFn, retries = 2, baseDelay = 500) => {
   }
 };
 
+const newIdempotencyKey = () => (
+  window.crypto && window.crypto.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+);
+
+/**
+ * Run an AI request as a background job: submit it with ?async=1, then poll
+ * /jobs/<id> until it finishes. Every submission retry carries the same
+ * Idempotency-Key, so a dropped connection never restarts the generation.
+ * @returns {Promise<Object>} The body the synchronous route would return
+ */
+const runJob = async (path, body, timeoutMs = 180000) => {
+  const authHeaders = API_KEY ? { 'X-API-Key': API_KEY } : {};
+  const submitHeaders = { ...authHeaders, 'Idempotency-Key': newIdempotencyKey() };
+  let response = await withRetry(() => axios.post(`${API_BASE}${path}?async=1`, body, {
+    timeout: 30000,
+    headers: submitHeaders
+  }));
+  let job = response.data;
+  const jobId = job.id;
+  const poll = () => axios.get(`${API_BASE}/jobs/${jobId}`, {
+    timeout: 10000,
+    headers: authHeaders
+  });
+  const deadline = Date.now() + timeoutMs;
+  while (job.status === 'queued' || job.status === 'running') {
+    if (Date.now() > deadline) throw new Error('Timed out waiting for the AI result');
+    await sleep((Number(response.headers['retry-after']) || 1) * 1000);
+    response = await withRetry(poll);
+    job = response.data;
+  }
+  if (job.status === 'failed') {
+    const error = new Error(job.error || 'Request failed');
+    error.response = { status: job.statusCode, data: { error: job.error } };
+    throw error;
+  }
+  return job.result;
+};
+
+/**
+ * POST a JSON body and dispatch each Server-Sent Event to onEvent as it arrives.
+ * Resolves once the stream closes.
+ */
+const streamEvents = async (path, body, onEvent) => {
+  const response = await fetch(`${API_BASE}${path}`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      ...(API_KEY ? { 'X-API-Key': API_KEY } : {})
+    },
+    body: JSON.stringify(body)
+  });
+
+  if (!response.ok || !response.body) {
+    let message = `Request failed with status ${response.status}`;
+    try {
+      message = (await response.json()).error || message;
+    } catch (e) {
+      // Non-JSON error body
+    }
+    throw new Error(message);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  // eslint-disable-next-line no-constant-condition
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      block.split('\n').forEach(line => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+};
+
 export const apiService = {
   /**
    * Get AI-powered brainstorming suggestions
@@ -28,42 +118,65 @@ export const apiService = {
    * @returns {Promise<Array>} Array of suggested tasks
    */
   brainstorm: async (context, taskType = 'general') => {
-    const request = () => axios.post(`${API_BASE}/brainstorm`, {
-      context,
-      taskType
-    }, {
-      timeout: 120000, // 2 minutes timeout for AI processing
-      headers: API_KEY ? { 'X-API-Key': API_KEY } : undefined
-    });
-
     try {
-      const response = await withRetry(request);
-      return response.data;
+      return await runJob('/brainstorm', { context, taskType });
     } catch (error) {
       console.error('Brainstorm API error:', error);
       throw new Error(error.response?.data?.error || 'Failed to generate brainstorming suggestions');
     }
   },
 
+  /**
+   * Stream brainstorming suggestions as the model produces them
+   * @param {string} context - User's context or goal
+   * @param {string} taskType - Type of tasks to generate
+   * @param {Function} onSuggestion - Called with each suggestion as it arrives
+   * @returns {Promise<void>} Resolves when the stream completes
+   */
+  brainstormStream: async (context, taskType = 'general', onSuggestion) => {
+    let streamError = null;
+    await streamEvents('/brainstorm/stream', { context, taskType }, (event, data) => {
+      if (event === 'suggestion') onSuggestion(data);
+      else if (event === 'error') streamError = data.error;
+    });
+    if (streamError) throw new Error(streamError);
+  },
+
   /**
    * Generate an optimized daily plan from tasks
    * @param {Array} tasks - Array of task objects
+   * @param {Object} [filter] - Task store filter sent instead of the tasks
+   *   when they are already synced to the server
+   * @param {Object} [update] - { previousPlan, changes: { added, removed } }
+   *   to update an earlier plan; only the changed tasks are re-scheduled
    * @returns {Promise<Object>} Daily plan with prioritized tasks
    */
-  generateDailyPlan: async (tasks) => {
-    const request = () => axios.post(`${API_BASE}/generate-plan`, {
-      tasks
-    }, {
-      timeout: 120000, // 2 minutes timeout for AI processing
-      headers: API_KEY ? { 'X-API-Key': API_KEY } : undefined
-    });
-
+  generateDailyPlan: async (tasks, filter = null, update = null) => {
     try {
-      const response = await withRetry(request);
-      return response.data;
+      return await runJob('/generate-plan', {
+        ...(filter ? { filter } : { tasks }),
+        ...update
+      });
     } catch (error) {
       console.error('Daily plan API error:', error);
       throw new Error(error.response?.data?.error || 'Failed to generate daily plan');
     }
+  },
+
+  /**
+   * Push local task changes and pull the changes made since a cursor
+   * @param {Object} changes - { since, upserts, deletes }
+   * @returns {Promise<Object>} { tasks, deleted, cursor, hasMore, reset }
+   */
+  syncTasks: async ({ since = null, upserts = [], deletes = [] }) => {
+    const response = await axios.post(`${API_BASE}/tasks/sync`, {
+      since,
+      upserts,
+      deletes
+    }, {
+      timeout: 30000,
+      headers: API_KEY ? { 'X-API-Key': API_KEY } : undefined
+    });
+    return response.data;
   }
 };
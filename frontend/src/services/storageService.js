@@ -1,6 +1,7 @@
 const STORAGE_KEYS = {
   TASKS: 'taskManager_tasks',
-  CATEGORIES: 'taskManager_categories'
+  CATEGORIES: 'taskManager_categories',
+  TASK_SYNC: 'taskManager_taskSync'
 };
 
 const SAVE_DELAY = 300;
@@ -47,6 +48,27 @@ export const storageService = {
     }, SAVE_DELAY);
   },
 
+  // Server sync state: last cursor and unsynced changes as [id, 'upsert' | 'delete'] pairs
+  getSyncState: () => {
+    try {
+      const state = JSON.parse(localStorage.getItem(STORAGE_KEYS.TASK_SYNC) || '{}');
+      return { cursor: state.cursor ?? null, pending: state.pending || [] };
+    } catch (error) {
+      console.error('Error loading sync state:', error);
+      return { cursor: null, pending: [] };
+    }
+  },
+
+  saveSyncState: (state) => {
+    try {
+      localStorage.setItem(STORAGE_KEYS.TASK_SYNC, JSON.stringify(state));
+      return true;
+    } catch (error) {
+      console.error('Error saving sync state:', error);
+      return false;
+    }
+  },
+
   // Categories
   getCategories: () => {
     try {
@@ -78,5 +100,6 @@ export const storageService = {
   clearAll: () => {
     localStorage.removeItem(STORAGE_KEYS.TASKS);
     localStorage.removeItem(STORAGE_KEYS.CATEGORIES);
+    localStorage.removeItem(STORAGE_KEYS.TASK_SYNC);
   }
 };
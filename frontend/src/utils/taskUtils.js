@@ -81,3 +81,30 @@ export const getStatusColor = (status) => {
   };
   return colors[status] || 'status-todo';
 };
+
+// Fields the planner reads; a change to any of them re-plans the task
+const PLAN_FIELDS = ['title', 'priority', 'dueDate', 'category'];
+
+/**
+ * Diff the tasks a plan was made from against the current tasks
+ * @param {Array} planned - Tasks the previous plan was generated from
+ * @param {Array} tasks - Current tasks
+ * @returns {Object} { added: tasks new or changed since, removed: old titles }
+ */
+export const diffPlanTasks = (planned, tasks) => {
+  const before = new Map(planned.map(task => [task.id, task]));
+  const added = [];
+  const removed = [];
+  tasks.forEach(task => {
+    const old = before.get(task.id);
+    before.delete(task.id);
+    if (!old) {
+      added.push(task);
+    } else if (PLAN_FIELDS.some(field => old[field] !== task[field])) {
+      removed.push(old.title);
+      added.push(task);
+    }
+  });
+  before.forEach(task => removed.push(task.title));
+  return { added, removed };
+};